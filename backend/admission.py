@@ -0,0 +1,218 @@
+"""
+Memory-aware admission control for uploads and cleaning requests.
+
+Before a request loads or transforms data it reserves the memory it is expected
+to need; it is admitted only while the process's resident memory plus all
+outstanding reservations stay within MEMORY_BUDGET. Requests that do not fit
+wait in a bounded queue until memory is released, otherwise they are rejected
+with a Retry-After hint, so overload degrades into 429/503 responses instead of
+the process being OOM-killed:
+- 413 if the request alone exceeds the budget (retrying cannot help);
+- 429 if MAX_QUEUED requests are already waiting;
+- 503 if memory did not free up within QUEUE_TIMEOUT seconds.
+
+Estimates come from the upload size, a parse of the first SAMPLE_BYTES (the
+resulting dtypes give bytes per row, object columns measured deeply) and fixed
+expansion factors where no cheap sample exists (Excel, compressed input).
+Reservations are held until the request finishes, even once its memory shows
+up in the resident size, which errs on the side of admitting too little.
+The budget applies per process (each uvicorn worker has its own).
+"""
+import asyncio
+import functools
+import io
+import os
+import time
+
+from fastapi import HTTPException
+
+from cleaning import file_format
+from decompression import detect_compression
+from metrics import counter, gauge, histogram
+
+
+def _default_budget():
+    """80% of the cgroup memory limit, or of physical memory when there is none"""
+    limit = None
+    try:
+        with open("/sys/fs/cgroup/memory.max") as f:
+            value = f.read().strip()
+        if value.isdigit():
+            limit = int(value)
+    except OSError:
+        pass
+    try:
+        physical = os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+    except (ValueError, OSError, AttributeError):
+        physical = None
+    candidates = [value for value in (limit, physical) if value]
+    return int(min(candidates) * 0.8) if candidates else 0
+
+
+# Process memory budget in bytes; 0 disables admission control
+MEMORY_BUDGET = int(os.environ.get("DATACLEANR_MEMORY_BUDGET", str(_default_budget())))
+# Requests allowed to wait for memory at once, and how long each may wait
+MAX_QUEUED = int(os.environ.get("DATACLEANR_ADMISSION_MAX_QUEUE", "32"))
+QUEUE_TIMEOUT = float(os.environ.get("DATACLEANR_ADMISSION_TIMEOUT", "30"))
+# Seconds clients are asked to wait before retrying a rejected request
+RETRY_AFTER = int(os.environ.get("DATACLEANR_ADMISSION_RETRY_AFTER", "10"))
+# Working memory of a cleaning request as a multiple of the data it starts from
+# (the copy being cleaned, intermediate column results and the stored result)
+WORK_FACTOR = float(os.environ.get("DATACLEANR_ADMISSION_WORK_FACTOR", "3"))
+# Parsed size per input byte for formats that cannot be sampled cheaply (Excel, compressed)
+UNSAMPLED_EXPANSION = float(os.environ.get("DATACLEANR_ADMISSION_EXPANSION", "20"))
+SAMPLE_BYTES = 1024 * 1024
+# Rows used to measure the deep per-row size of an in-memory DataFrame
+SAMPLE_ROWS = 1000
+POLL_INTERVAL = 0.1
+
+ADMISSIONS = counter(
+    "datacleanr_admission_requests_total",
+    "Admission decisions by operation and result",
+    ("operation", "result"))
+ADMISSION_WAIT = histogram(
+    "datacleanr_admission_wait_seconds",
+    "Time requests spent queued for memory before being admitted or rejected",
+    ("operation",))
+
+
+class AdmissionError(HTTPException):
+    """Raised when a request cannot be admitted, with a Retry-After header when retrying can help"""
+
+    def __init__(self, status_code, detail, retry_after=None):
+        super().__init__(status_code=status_code, detail=detail,
+                         headers={"Retry-After": str(retry_after)} if retry_after is not None else None)
+
+
+def process_rss():
+    """Resident set size of this process (0 where /proc is unavailable)"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+def frame_nbytes(df):
+    """Deep in-memory size of a DataFrame, measured on a row sample for object columns"""
+    if len(df) <= SAMPLE_ROWS:
+        return int(df.memory_usage(index=True, deep=True).sum())
+    sample = df.sample(n=SAMPLE_ROWS, random_state=0)
+    per_row = sample.memory_usage(index=True, deep=True).sum() / SAMPLE_ROWS
+    return int(per_row * len(df))
+
+
+def _sampled_csv_bytes(head, size):
+    """Parsed DataFrame size extrapolated from the first SAMPLE_BYTES of a CSV"""
+    import pandas as pd
+
+    complete = head if len(head) >= size else head[:head.rfind(b"\n") + 1]
+    if not complete:
+        return None
+    for encoding in ("utf-8", "latin-1"):
+        try:
+            sample = pd.read_csv(io.BytesIO(complete), encoding=encoding)
+            break
+        except UnicodeDecodeError:
+            continue
+        except Exception:
+            return None
+    else:
+        return None
+    if sample.empty:
+        return None
+    per_byte = sample.memory_usage(index=True, deep=True).sum() / len(complete)
+    return int(per_byte * size)
+
+
+def estimate_upload_bytes(filename, size, head, spooled=False):
+    """
+    Peak memory to ingest an upload of `size` bytes whose first bytes are `head`:
+    the raw chunks and their joined copy, decoded text for plain CSV, and the
+    parsed DataFrame. A `spooled` upload is parsed from its file on disk, so only
+    the parsed DataFrame counts.
+    """
+    if detect_compression(filename, head[:8]) is None and file_format(filename) == 'csv':
+        parsed = _sampled_csv_bytes(head, size)
+        if parsed is not None:
+            # chunks + joined bytes + decoded str + StringIO buffer
+            return parsed if spooled else 4 * size + parsed
+    return (0 if spooled else 2 * size) + int(UNSAMPLED_EXPANSION * size)
+
+
+def estimate_work_bytes(df):
+    return int(WORK_FACTOR * frame_nbytes(df))
+
+
+class AdmissionController:
+    def __init__(self, budget=MEMORY_BUDGET, max_queued=MAX_QUEUED, timeout=QUEUE_TIMEOUT,
+                 retry_after=RETRY_AFTER, usage=process_rss):
+        self.budget = budget
+        self.max_queued = max_queued
+        self.timeout = timeout
+        self.retry_after = retry_after
+        self.usage = usage
+        self.reserved = 0
+        self.queued = 0
+
+    def fits(self, nbytes):
+        return self.usage() + self.reserved + nbytes <= self.budget
+
+    async def acquire(self, nbytes, operation):
+        """Reserve nbytes, waiting in the queue if needed; raises AdmissionError"""
+        if self.budget <= 0 or nbytes <= 0:
+            return 0
+        if nbytes > self.budget:
+            ADMISSIONS.inc(operation=operation, result="rejected_too_large")
+            raise AdmissionError(413, f"Request needs an estimated {nbytes / 1024 ** 2:.0f} MB, more than "
+                                      f"the server's {self.budget / 1024 ** 2:.0f} MB memory budget")
+        if not self.fits(nbytes):
+            if self.queued >= self.max_queued:
+                ADMISSIONS.inc(operation=operation, result="rejected_queue_full")
+                raise AdmissionError(429, "Too many requests are waiting for memory; retry later",
+                                     self.retry_after)
+            self.queued += 1
+            start = time.perf_counter()
+            try:
+                deadline = start + self.timeout
+                while not self.fits(nbytes):
+                    if time.perf_counter() >= deadline:
+                        ADMISSIONS.inc(operation=operation, result="rejected_timeout")
+                        raise AdmissionError(503, "Server is out of memory for new work; retry later",
+                                             self.retry_after)
+                    await asyncio.sleep(POLL_INTERVAL)
+            finally:
+                self.queued -= 1
+                ADMISSION_WAIT.observe(time.perf_counter() - start, operation=operation)
+            ADMISSIONS.inc(operation=operation, result="admitted_after_wait")
+        else:
+            ADMISSIONS.inc(operation=operation, result="admitted")
+        self.reserved += nbytes
+        return nbytes
+
+    def release(self, nbytes):
+        self.reserved -= nbytes
+
+
+controller = AdmissionController()
+
+gauge("datacleanr_admission_reserved_bytes", "Memory reserved by admitted in-flight requests",
+      callback=lambda: controller.reserved)
+gauge("datacleanr_admission_queued_requests", "Requests waiting for memory", callback=lambda: controller.queued)
+
+
+def admitted(operation, estimate):
+    """
+    Decorator for async handlers: reserve `await estimate(**kwargs)` bytes before
+    the handler runs and release them when it returns.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            nbytes = await controller.acquire(await estimate(**kwargs), operation)
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                controller.release(nbytes)
+        return wrapper
+    return decorator
@@ -0,0 +1,454 @@
+"""
+Data quality analysis, cleaning suggestions and industry detection.
+
+These work on a plain DataFrame (plus the original filename for industry
+detection) and are shared by the HTTP API and the headless library / CLI
+(datacleanr.py), so they must not depend on FastAPI or on request state.
+"""
+import pandas as pd
+
+from catalog import catalog_for
+from columnar import map_columns
+from metrics import track_operation
+
+# Severity order used to sort analysis reports
+SEVERITY_ORDER = {"critical": 0, "high": 1, "medium": 2, "low": 3, "info": 4}
+
+
+def issue_id(issue):
+    """Stable id from the issue type and the column it concerns, e.g. 'outliers:amount'"""
+    return issue["type"] if issue.get("column") is None else f"{issue['type']}:{issue['column']}"
+
+
+def suggest_cleaning_steps(df, catalog=None):
+    """Basic clean_dataframe flags worth enabling for this data"""
+    suggestions = []
+    
+    # Check for duplicates
+    if df.duplicated().any():
+        suggestions.append("remove_duplicates")
+    
+    # Check for columns with spaces or uppercase
+    if any(col != col.lower() or ' ' in col for col in df.columns):
+        suggestions.append("harmonize_columns")
+    
+    # Check for missing values
+    if df.isnull().any().any():
+        suggestions.append("handle_missing")
+    
+    # Check for string columns with leading/trailing whitespace
+    string_cols = df.select_dtypes(include=['object']).columns
+    if any(df[col].astype(str).str.strip().ne(df[col]).any() for col in string_cols):
+        suggestions.append("trim_whitespace")
+    
+    # Date columns from the column catalog
+    if catalog_for(df, catalog).columns(df, role='date'):
+        suggestions.append("standardize_dates")
+    
+    return suggestions
+
+
+def detect_industry(df, filename):
+    """Guess the industry from column names, sample values and the filename"""
+    # Analyze column names and data for industry patterns
+    column_names = [col.lower() for col in df.columns]
+    industry_scores = {
+        "retail_ecommerce": 0,
+        "finance_banking": 0,
+        "healthcare": 0,
+        "manufacturing": 0,
+        "demand_planning": 0,
+        "education": 0,
+        "law_enforcement": 0
+    }
+    
+    # Check for industry-specific column patterns
+    # Retail/E-commerce indicators
+    retail_keywords = ['product', 'customer', 'order', 'sku', 'price', 'sales', 'purchase', 'cart', 'inventory', 'transaction', 'shipping', 'delivery', 'benefit', 'segment']
+    for keyword in retail_keywords:
+        if any(keyword in col for col in column_names):
+            industry_scores["retail_ecommerce"] += 1
+    
+    # Finance/Banking indicators
+    finance_keywords = ['account', 'transaction', 'balance', 'credit', 'debit', 'loan', 'interest', 'currency', 'benefit']
+    for keyword in finance_keywords:
+        if any(keyword in col for col in column_names):
+            industry_scores["finance_banking"] += 1
+    
+    # Healthcare indicators
+    healthcare_keywords = ['patient', 'doctor', 'diagnosis', 'treatment', 'medical', 'hospital', 'clinic', 'insurance', 'claim']
+    for keyword in healthcare_keywords:
+        if any(keyword in col for col in column_names):
+            industry_scores["healthcare"] += 1
+    
+    # Manufacturing indicators
+    manufacturing_keywords = ['production', 'machine', 'sensor', 'equipment', 'maintenance', 'quality', 'defect']
+    for keyword in manufacturing_keywords:
+        if any(keyword in col for col in column_names):
+            industry_scores["manufacturing"] += 1
+    
+    # Demand Planning indicators
+    demand_keywords = ['demand', 'forecast', 'planning', 'inventory', 'supply', 'chain', 'stock', 'reorder']
+    for keyword in demand_keywords:
+        if any(keyword in col for col in column_names):
+            industry_scores["demand_planning"] += 1
+    
+    # Education indicators
+    education_keywords = ['student', 'course', 'grade', 'score', 'exam', 'assignment', 'gpa', 'degree', 'major', 'faculty', 'department', 'enrollment', 'academic', 'semester', 'tuition']
+    for keyword in education_keywords:
+        if any(keyword in col for col in column_names):
+            industry_scores["education"] += 1
+    
+    # Law Enforcement indicators
+    law_enforcement_keywords = ['crime', 'offense', 'incident', 'case', 'arrest', 'charge', 'violation', 
+                               'weapon', 'battery', 'assault', 'robbery', 'theft', 'trespass', 
+                               'domestic', 'location', 'date', 'primary_type', 'description', 'updated_on']
+    for keyword in law_enforcement_keywords:
+        if any(keyword in col for col in column_names):
+            industry_scores["law_enforcement"] += 1
+    
+    # Additional data content analysis
+    if not df.empty:
+        # Sample a few rows to analyze actual data content
+        sample_data = df.head(min(5, len(df)))
+        
+        # Check for retail/ecommerce-specific values
+        retail_data_indicators = ['shipping', 'delivery', 'customer', 'sales', 'benefit']
+        for col in df.columns:
+            col_lower = col.lower()
+            # Check column values for retail indicators
+            if any(indicator in col_lower for indicator in ['delivery', 'shipping']):
+                values = sample_data[col].dropna().astype(str).str.lower()
+                if any('shipping' in val or 'delivery' in val for val in values):
+                    industry_scores["retail_ecommerce"] += 1
+            
+            # Check for customer-related data
+            if 'customer' in col_lower:
+                if sample_data[col].notna().any():
+                    industry_scores["retail_ecommerce"] += 1
+                    
+            # Check for sales/benefit related data
+            if any(indicator in col_lower for indicator in ['sales', 'benefit', 'price']):
+                if sample_data[col].notna().any():
+                    industry_scores["retail_ecommerce"] += 1
+        
+        # Check for finance-specific values
+        finance_data_indicators = ['account', 'balance', 'credit', 'debit', 'loan', 'interest']
+        for col in df.columns:
+            col_lower = col.lower()
+            if any(indicator in col_lower for indicator in finance_data_indicators):
+                if sample_data[col].notna().any():
+                    industry_scores["finance_banking"] += 1
+        
+        # Check for healthcare-specific values
+        healthcare_data_indicators = ['patient', 'doctor', 'diagnosis', 'treatment', 'medical']
+        for col in df.columns:
+            col_lower = col.lower()
+            if any(indicator in col_lower for indicator in healthcare_data_indicators):
+                if sample_data[col].notna().any():
+                    industry_scores["healthcare"] += 1
+        
+        # Check for education-specific values
+        education_data_indicators = ['student', 'course', 'grade', 'score', 'exam']
+        for col in df.columns:
+            col_lower = col.lower()
+            if any(indicator in col_lower for indicator in education_data_indicators):
+                if sample_data[col].notna().any():
+                    industry_scores["education"] += 1
+    
+    # Additional education detection based on file name
+    education_file_indicators = ['course', 'class', 'education', 'school', 'university', 'student', 'academy']
+    filename_lower = filename.lower()
+    if any(indicator in filename_lower for indicator in education_file_indicators):
+        industry_scores["education"] += 2
+    
+    # Course-related column matching (made more specific)
+    course_related_columns = ['название курса', 'course', 'название', 'title', 'price', 'цена', 'кол-во', 'quantity', 'total', 'всего', 'sale', 'дата']
+    course_matches = sum(1 for col in column_names if any(keyword in col for keyword in course_related_columns))
+    
+    # Increased threshold to avoid false positives
+    if course_matches >= 5:
+        industry_scores["education"] += 2
+    
+    # Determine the industry with highest score
+    detected_industry = max(industry_scores, key=industry_scores.get)
+    max_score = industry_scores[detected_industry]
+    
+    # Calculate confidence based on matched keywords vs. total possible for that industry
+    if max_score > 0:
+        if detected_industry == "retail_ecommerce":
+            max_possible = len(retail_keywords) + 5  # +5 for potential data content matches
+        elif detected_industry == "finance_banking":
+            max_possible = len(finance_keywords) + 5
+        elif detected_industry == "healthcare":
+            max_possible = len(healthcare_keywords) + 5
+        elif detected_industry == "manufacturing":
+            max_possible = len(manufacturing_keywords) + 5
+        elif detected_industry == "demand_planning":
+            max_possible = len(demand_keywords) + 5
+        elif detected_industry == "education":
+            max_possible = len(education_keywords) + 2  # +2 for filename boost
+        elif detected_industry == "law_enforcement":
+            max_possible = len(law_enforcement_keywords) + 5
+        else:
+            max_possible = max_score
+        
+        confidence = min(max_score / max_possible, 1.0) if max_possible > 0 else 0.0
+    else:
+        confidence = 0.0
+    
+    # Only classify if confidence meets minimum threshold
+    MIN_CONFIDENCE_THRESHOLD = 0.1
+    if confidence < MIN_CONFIDENCE_THRESHOLD:
+        final_industry = "General"
+        confidence = 0.0
+        features = []
+    else:
+        # Generate features list for the response
+        features = []
+        if detected_industry == "retail_ecommerce":
+            features = [kw for kw in retail_keywords if any(kw in col for col in column_names)]
+        elif detected_industry == "finance_banking":
+            features = [kw for kw in finance_keywords if any(kw in col for col in column_names)]
+        elif detected_industry == "healthcare":
+            features = [kw for kw in healthcare_keywords if any(kw in col for col in column_names)]
+        elif detected_industry == "manufacturing":
+            features = [kw for kw in manufacturing_keywords if any(kw in col for col in column_names)]
+        elif detected_industry == "demand_planning":
+            features = [kw for kw in demand_keywords if any(kw in col for col in column_names)]
+        elif detected_industry == "education":
+            features = [kw for kw in education_keywords if any(kw in col for col in column_names)]
+        elif detected_industry == "law_enforcement":
+            features = [kw for kw in law_enforcement_keywords if any(kw in col for col in column_names)]
+
+        # Convert industry code to readable format
+        industry_mapping = {
+            "retail_ecommerce": "Retail/E-commerce",
+            "finance_banking": "Finance/Banking",
+            "healthcare": "Healthcare",
+            "manufacturing": "Manufacturing",
+            "demand_planning": "Demand Planning/Business Forecasting",
+            "education": "Education",
+            "law_enforcement": "Law Enforcement"
+        }
+        
+        final_industry = industry_mapping.get(detected_industry, "General")
+    
+    return {
+        "industry": final_industry,
+        "confidence": round(confidence, 2),
+        "features": features[:5]  # Top 5 matching features
+    }
+
+
+def industry_cleaning_suggestions(industry):
+    """(industry-specific clean_dataframe flags, description) for a detected industry"""
+    suggestions = []
+    description = ""
+    
+    if industry == "Retail/E-commerce":
+        suggestions = ["deduplicate_customers", "standardize_addresses", "normalize_phone_numbers"]
+        description = "Retail data often contains duplicate customer records, inconsistent addresses, and varied phone number formats."
+    elif industry == "Finance/Banking":
+        suggestions = ["validate_accounts", "detect_fraud_patterns", "standardize_transactions"]
+        description = "Financial data requires account validation, fraud pattern detection, and transaction standardization."
+    elif industry == "Healthcare":
+        suggestions = ["anonymize_data", "standardize_medical_codes", "validate_demographics"]
+        description = "Healthcare data needs anonymization for HIPAA compliance, medical code standardization, and demographic validation."
+    elif industry == "Manufacturing":
+        suggestions = ["smooth_sensor_data", "standardize_units", "interpolate_downtime"]
+        description = "Manufacturing data often has sensor noise, unit inconsistencies, and equipment downtime gaps."
+    elif industry == "Demand Planning/Business Forecasting":
+        suggestions = ["fill_time_gaps", "adjust_seasonality", "normalize_promotions"]
+        description = "Demand planning data requires time series gap filling, seasonal adjustments, and promotion impact normalization."
+    elif industry == "Education":
+        suggestions = ["standardize_grades", "validate_student_ids", "harmonize_course_codes"]
+        description = "Educational data often contains student records, course information, and grade data that needs standardization."
+    else:
+        suggestions = []
+        description = "General data cleaning suggestions based on detected data quality issues."
+    return suggestions, description
+
+
+# Per-column profiling kernels; module-level so the column executor can run them in worker processes
+def mostly_numeric_strings(series):
+    """Mostly numeric values stored as strings (but not all of them)"""
+    non_null_series = series.dropna()
+    if len(non_null_series) == 0:
+        return False
+    # Try to convert to numeric and see if it works for most values
+    numeric_count = pd.to_numeric(non_null_series, errors='coerce').notna().sum()
+    return bool(numeric_count > len(non_null_series) * 0.8 and numeric_count < len(non_null_series))
+
+
+def is_single_valued(series):
+    return bool(series.nunique() <= 1 and len(series.dropna()) > 0)
+
+
+def count_iqr_outliers(series):
+    """(outlier count, lower bound, upper bound) using the 1.5 * IQR rule"""
+    if len(series.dropna()) == 0:
+        return 0, None, None
+    Q1 = series.quantile(0.25)
+    Q3 = series.quantile(0.75)
+    IQR = Q3 - Q1
+    lower_bound = Q1 - 1.5 * IQR
+    upper_bound = Q3 + 1.5 * IQR
+    return int(((series < lower_bound) | (series > upper_bound)).sum()), float(lower_bound), float(upper_bound)
+
+
+def has_outer_whitespace(series):
+    return bool(series.astype(str).str.strip().ne(series).any())
+
+
+def has_unparseable_dates(series):
+    # Try to parse dates and see if there are parsing errors
+    try:
+        pd.to_datetime(series.head(100), errors='raise')
+        return False
+    except:
+        return True
+
+
+def analyze_dataframe(df, catalog=None):
+    """Data quality issues found in df, most severe first; every issue carries its id"""
+    catalog = catalog_for(df, catalog)
+    analysis_report = []
+    
+    # 1. Check for duplicates
+    with track_operation("analyze_duplicates", len(df)):
+        duplicate_count = df.duplicated().sum()
+        if duplicate_count > 0:
+            analysis_report.append({
+                "type": "duplicate_rows",
+                "severity": "medium",
+                "description": f"Found {duplicate_count} duplicate rows",
+                "recommendation": "Remove duplicates to ensure data integrity"
+            })
+    
+    # 2. Check for missing values
+    with track_operation("analyze_missing_values", len(df)):
+        missing_data = df.isnull().sum()
+        total_cells = df.size
+        total_missing = missing_data.sum()
+    
+        if total_missing > 0:
+            missing_percentage = (total_missing / total_cells) * 100
+            analysis_report.append({
+                "type": "missing_values",
+                "severity": "high" if missing_percentage > 10 else "medium" if missing_percentage > 5 else "low",
+                "description": f"Missing values detected: {total_missing} out of {total_cells} ({missing_percentage:.2f}%)",
+                "recommendation": "Handle missing values using appropriate strategy (drop, fill with mean/median, etc.)"
+            })
+        
+            # Detailed missing values by column
+            for column, missing_count in missing_data.items():
+                if missing_count > 0:
+                    column_missing_percentage = (missing_count / len(df)) * 100
+                    analysis_report.append({
+                        "type": "missing_values_column",
+                        "column": column,
+                        "severity": "high" if column_missing_percentage > 30 else "medium" if column_missing_percentage > 10 else "low",
+                        "description": f"Column '{column}' has {missing_count} missing values ({column_missing_percentage:.2f}%)",
+                        "recommendation": f"Consider handling missing values in '{column}' specifically"
+                    })
+    
+    # 3. Check for data type inconsistencies
+    with track_operation("analyze_data_types", len(df)):
+        # Check if numeric values are stored as strings
+        object_columns = [col for col in df.columns if df[col].dtype == 'object']
+        for column, mixed in zip(object_columns, map_columns(df, object_columns, mostly_numeric_strings, processes=True)):
+            if mixed:
+                analysis_report.append({
+                    "type": "data_type_inconsistency",
+                    "column": column,
+                    "severity": "medium",
+                    "description": f"Column '{column}' contains mixed data types (mostly numeric but stored as strings)",
+                    "recommendation": f"Convert '{column}' to numeric data type for better analysis"
+                })
+    
+    # 4. Check for columns with spaces or special characters in names
+    with track_operation("analyze_column_naming", len(df)):
+        problematic_columns = [col for col in df.columns if any(c in col for c in [' ', '-', '.', '/', '\\', '(', ')'])]
+        if problematic_columns:
+            analysis_report.append({
+                "type": "column_naming",
+                "severity": "low",
+                "description": f"Columns with special characters detected: {', '.join(problematic_columns)}",
+                "recommendation": "Standardize column names to use only alphanumeric characters and underscores"
+            })
+    
+    # 5. Check for columns with only one unique value (potential redundant columns)
+    with track_operation("analyze_single_value_columns", len(df)):
+        single_value_columns = [col for col, single in zip(df.columns, map_columns(df, df.columns, is_single_valued)) if single]
+        if single_value_columns:
+            analysis_report.append({
+                "type": "single_value_columns",
+                "severity": "low",
+                "description": f"Columns with only one unique value: {', '.join(single_value_columns)}",
+                "recommendation": "Consider removing columns with only one value as they provide no analytical value"
+            })
+    
+    # 6. Check for outliers in numeric columns
+    with track_operation("analyze_outliers", len(df)):
+        numeric_columns = df.select_dtypes(include=['number']).columns
+        for column, (outlier_count, lower_bound, upper_bound) in zip(numeric_columns, map_columns(df, numeric_columns, count_iqr_outliers)):
+            if outlier_count > 0:
+                outlier_percentage = (outlier_count / len(df)) * 100
+                analysis_report.append({
+                    "type": "outliers",
+                    "column": column,
+                    "params": {"lower_bound": lower_bound, "upper_bound": upper_bound},
+                    "severity": "high" if outlier_percentage > 5 else "medium",
+                    "description": f"Column '{column}' contains {outlier_count} outliers ({outlier_percentage:.2f}%)",
+                    "recommendation": f"Investigate outliers in '{column}' using visualization or statistical methods"
+                })
+    
+    # 7. Check for string columns with leading/trailing whitespace
+    with track_operation("analyze_whitespace", len(df)):
+        string_columns = df.select_dtypes(include=['object']).columns
+        for column, padded in zip(string_columns, map_columns(df, string_columns, has_outer_whitespace, processes=True)):
+            if padded:
+                analysis_report.append({
+                    "type": "whitespace_issues",
+                    "column": column,
+                    "severity": "low",
+                    "description": f"Column '{column}' contains leading/trailing whitespace",
+                    "recommendation": f"Trim whitespace in '{column}' for consistency"
+                })
+    
+    # 8. Check for inconsistent date formats
+    with track_operation("analyze_date_formats", len(df)):
+        date_columns = [col for col in catalog.columns(df, role='date') if df[col].dtype == 'object']
+        for column, inconsistent in zip(date_columns, map_columns(df, date_columns, has_unparseable_dates)):
+            if inconsistent:
+                analysis_report.append({
+                    "type": "date_format_inconsistency",
+                    "column": column,
+                    "severity": "medium",
+                    "description": f"Column '{column}' has inconsistent date formats",
+                    "recommendation": f"Standardize date formats in '{column}'"
+                })
+    
+    # 9. Check for data size issues
+    with track_operation("analyze_dataset_size", len(df)):
+        if len(df) == 0:
+            analysis_report.append({
+                "type": "empty_dataset",
+                "severity": "critical",
+                "description": "Dataset is empty",
+                "recommendation": "Upload a non-empty dataset"
+            })
+        elif len(df) > 100000:
+            analysis_report.append({
+                "type": "large_dataset",
+                "severity": "info",
+                "description": f"Large dataset detected ({len(df)} rows)",
+                "recommendation": "Processing may take longer for large datasets"
+            })
+    
+    # Sort by severity (critical, high, medium, low, info)
+    analysis_report.sort(key=lambda x: SEVERITY_ORDER.get(x["severity"], 5))
+    for issue in analysis_report:
+        issue["id"] = issue_id(issue)
+    return analysis_report
@@ -0,0 +1,133 @@
+"""
+Batch cleaning: apply one set of cleaning options to many files in parallel.
+
+Each file is parsed, cleaned and written by a worker process so wide batches
+use every core instead of serialising on the event loop. Outputs are bundled
+into a single zip archive together with a manifest of per-file results.
+"""
+import json
+import multiprocessing
+import os
+import threading
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+
+from catalog import build_catalog
+from cleaning import SUPPORTED_EXTENSIONS, clean_dataframe, read_dataframe
+from recipes import apply_recipe
+
+# Upper bound on worker processes shared by all batches
+MAX_BATCH_WORKERS = int(os.environ.get("DATACLEANR_BATCH_MAX_WORKERS", str(os.cpu_count() or 1)))
+# Server-side directories may only be read from below this root
+BATCH_ROOT = os.environ.get("DATACLEANR_BATCH_ROOT")
+BATCH_TMP_DIR = "/tmp"
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # Spawned rather than forked from the threaded server (see columnar.get_executor)
+            _executor = ProcessPoolExecutor(max_workers=MAX_BATCH_WORKERS,
+                                            mp_context=multiprocessing.get_context("spawn"))
+        return _executor
+
+
+def shutdown_executor():
+    """Stop the batch worker pool; called when the server shuts down"""
+    global _executor
+    with _executor_lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def batch_dir(batch_id):
+    return os.path.join(BATCH_TMP_DIR, f"datacleanr_batch_{batch_id}")
+
+
+def resolve_server_directory(directory):
+    """
+    Validate a server-side input directory and list its supported files.
+    Raises PermissionError when batch directories are disabled or the path escapes BATCH_ROOT.
+    """
+    if not BATCH_ROOT:
+        raise PermissionError("Server-side batch directories are disabled (DATACLEANR_BATCH_ROOT is not set)")
+    root = os.path.realpath(BATCH_ROOT)
+    path = os.path.realpath(os.path.join(root, directory))
+    if path != root and not path.startswith(root + os.sep):
+        raise PermissionError("Directory is outside the configured batch root")
+    if not os.path.isdir(path):
+        raise FileNotFoundError(f"Directory not found: {directory}")
+    return [(name, os.path.join(path, name)) for name in sorted(os.listdir(path))
+            if name.lower().endswith(SUPPORTED_EXTENSIONS) and os.path.isfile(os.path.join(path, name))]
+
+
+def clean_file_job(name, input_path, output_path, options, output_format="csv", recipe=None):
+    """Worker entry point: parse, clean (with options, or a recipe when given) and export one file. Never raises."""
+    start = time.perf_counter()
+    try:
+        with open(input_path, "rb") as f:
+            content = f.read()
+        df = read_dataframe(name, content)
+        if df.empty:
+            raise ValueError("File is empty or contains no data.")
+        input_rows = len(df)
+        catalog = build_catalog(df)
+        df = apply_recipe(recipe, df, catalog) if recipe is not None else clean_dataframe(df, catalog=catalog, **options)
+        if output_format == "xlsx":
+            df.to_excel(output_path, index=False)
+        else:
+            df.to_csv(output_path, index=False)
+        return {
+            "filename": name,
+            "status": "success",
+            "input_rows": input_rows,
+            "rows": len(df),
+            "columns": [str(col) for col in df.columns],
+            "output": os.path.basename(output_path),
+            "seconds": round(time.perf_counter() - start, 4),
+        }
+    except Exception as e:
+        return {
+            "filename": name,
+            "status": "error",
+            "error": str(e),
+            "seconds": round(time.perf_counter() - start, 4),
+        }
+
+
+async def run_batch(batch_id, inputs, options, concurrency=4, output_format="csv"):
+    """
+    Clean every (name, path) in inputs with at most `concurrency` files in flight,
+    then build the combined archive. Returns (results, archive_path).
+    """
+    # Imported here so CLI runs that only use clean_file_job skip loading asyncio
+    import asyncio
+
+    out_dir = os.path.join(batch_dir(batch_id), "output")
+    os.makedirs(out_dir, exist_ok=True)
+    loop = asyncio.get_running_loop()
+    executor = get_executor()
+    semaphore = asyncio.Semaphore(max(1, min(concurrency, MAX_BATCH_WORKERS)))
+
+    async def run_one(index, name, path):
+        base = os.path.splitext(os.path.basename(name))[0]
+        output_path = os.path.join(out_dir, f"{index:04d}_cleaned_{base}.{output_format}")
+        async with semaphore:
+            return await loop.run_in_executor(executor, clean_file_job, name, path,
+                                              output_path, options, output_format)
+
+    results = await asyncio.gather(*(run_one(i, name, path) for i, (name, path) in enumerate(inputs)))
+
+    archive_path = os.path.join(batch_dir(batch_id), f"{batch_id}_batch.zip")
+    with zipfile.ZipFile(archive_path, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for result in results:
+            if result["status"] == "success":
+                archive.write(os.path.join(out_dir, result["output"]), arcname=result["output"])
+        archive.writestr("manifest.json", json.dumps({"batch_id": batch_id, "results": results}, indent=2))
+    return list(results), archive_path
@@ -0,0 +1,192 @@
+"""
+Semantic column catalog: what each column of a dataset holds.
+
+Built once per dataset at ingest from the column names plus a stride sample of
+the values, stored with the dataset, and read by every analysis and cleaning
+operation instead of each one scanning names with its own keyword list. Each
+column gets:
+- a role: date, phone, id, currency, numeric, category, text (short,
+  high-cardinality strings such as names or emails) or free_text;
+- name tags: the keyword families industry operations select columns by
+  (address, account, sensitive, medical_code, unit, grade, student_id, course,
+  customer_identifier, entity).
+
+Lookups tolerate harmonize_columns renames (e.g. 'Order Date' -> 'order_date'),
+so a catalog built on the raw upload also serves its cleaned versions; columns
+it does not know are profiled on the fly from the frame at hand.
+"""
+import re
+
+import numpy as np
+import pandas as pd
+
+# Non-null values sampled per column (evenly spaced over the whole column)
+SAMPLE_SIZE = 2000
+# Values parsed with the (slow, per-value) date parser when confirming a date column
+DATE_PARSE_SAMPLE = 500
+
+DATE_KEYWORDS = ['date', 'time', 'timestamp', 'дата']
+PHONE_KEYWORDS = ['phone', 'mobile', 'tel']
+ID_TOKENS = {'id', 'uuid', 'guid', 'key', 'sku', 'code', 'no', 'number', 'num'}
+CURRENCY_KEYWORDS = ['price', 'amount', 'cost', 'revenue', 'salary', 'balance', 'fee', 'payment',
+                     'income', 'profit', 'цена']
+TAG_KEYWORDS = {
+    'address': ['address'],
+    'account': ['account', 'acct'],
+    'sensitive': ['name', 'address', 'phone', 'ssn', 'social'],
+    'medical_code': ['code', 'icd', 'cpt'],
+    'unit': ['temp', 'temperature', 'pressure', 'weight', 'length'],
+    'grade': ['grade', 'score', 'gpa'],
+    'student_id': ['student', 'id', 'sid'],
+    'course': ['course', 'class'],
+    'customer_identifier': ['customer', 'client', 'user', 'name', 'email'],
+}
+# Entity keys (machine, store, SKU...) match on token prefixes: 'store_no', 'machines'
+ENTITY_KEYWORDS = ['machine', 'device', 'equipment', 'asset', 'sensor', 'plant', 'store',
+                   'shop', 'branch', 'site', 'location', 'region', 'warehouse', 'sku', 'product', 'item',
+                   'entity', 'meter', 'station']
+
+DATE_PATTERN = re.compile(
+    r'^(\d{4}[-/.]\d{1,2}[-/.]\d{1,2}|\d{1,2}[-/.]\d{1,2}[-/.]\d{2,4})([ T]\d{1,2}:\d{2}(:\d{2})?.*)?$'
+    r'|^\d{1,2}\s+[a-zа-я]{3,}\.?\s+\d{2,4}$|^[a-z]{3,}\.?\s+\d{1,2},?\s+\d{4}$', re.IGNORECASE)
+PHONE_PATTERN = re.compile(r'^\+?[\d\s().-]+(\s*(x|ext\.?)\s*\d+)?$', re.IGNORECASE)
+CURRENCY_PATTERN = re.compile(
+    r'^[(\s]*[-+]?\s*[$€£¥₹₽]\s*-?[\d,.\s]+\)?$|^[-+]?[\d,.\s]+\s*[$€£¥₹₽]$'
+    r'|^[-+]?[\d,.\s]+\s*(usd|eur|gbp|jpy|inr|rub|chf|cad|aud)$|^(usd|eur|gbp|jpy|inr|rub|chf|cad|aud)\s*[-+]?[\d,.\s]+$',
+    re.IGNORECASE)
+UUID_PATTERN = re.compile(r'^[0-9a-f]{8}-?[0-9a-f]{4}-?[0-9a-f]{4}-?[0-9a-f]{4}-?[0-9a-f]{12}$', re.IGNORECASE)
+
+
+def harmonize_name(name):
+    """The column name harmonize_columns produces, e.g. 'Order Date' -> 'order_date'"""
+    return re.sub('[^a-zA-Z0-9_]', '', str(name).replace(' ', '_')).lower()
+
+
+def name_tokens(name):
+    # camelCase and separators split words: 'customerID' -> ['customer', 'id']
+    spaced = re.sub(r'(?<=[a-z0-9])(?=[A-Z])', ' ', str(name))
+    return [token for token in re.split(r'[^0-9a-zа-яё]+', spaced.lower()) if token]
+
+
+def _name_matches(lower, tokens, keywords):
+    # Short keywords ('id', 'tel', 'gpa') must be whole words; longer ones match anywhere in the name
+    return any(keyword in tokens if len(keyword) <= 3 else keyword in lower for keyword in keywords)
+
+
+def _sample(series):
+    values = series.dropna() if len(series) <= SAMPLE_SIZE * 10 else series.iloc[::len(series) // (SAMPLE_SIZE * 10)].dropna()
+    if len(values) > SAMPLE_SIZE:
+        values = values.iloc[np.linspace(0, len(values) - 1, SAMPLE_SIZE).astype(int)]
+    return values
+
+
+def _share(strings, pattern):
+    return float(strings.str.match(pattern).mean()) if len(strings) else 0.0
+
+
+def _date_parse_rate(strings):
+    if not len(strings):
+        return 0.0
+    parsed = pd.to_datetime(strings.head(DATE_PARSE_SAMPLE), errors='coerce', format='mixed')
+    return float(parsed.notna().mean())
+
+
+def _integral(values):
+    if pd.api.types.is_integer_dtype(values):
+        return True
+    return pd.api.types.is_float_dtype(values) and bool(len(values)) and bool((values % 1 == 0).all())
+
+
+def profile_column(name, series):
+    """Catalog entry for one column: role, name tags and the date parse rate for date columns"""
+    lower, tokens = str(name).lower(), name_tokens(name)
+    tags = [tag for tag, keywords in TAG_KEYWORDS.items() if _name_matches(lower, tokens, keywords)]
+    if any(token.startswith(keyword) for token in tokens for keyword in ENTITY_KEYWORDS):
+        tags.append('entity')
+    entry = {'role': None, 'tags': tags, 'dtype': str(series.dtype), 'date_parse_rate': None}
+    dates_named = _name_matches(lower, tokens, DATE_KEYWORDS)
+    phone_named = _name_matches(lower, tokens, PHONE_KEYWORDS)
+    id_named = bool(ID_TOKENS.intersection(tokens))
+
+    if pd.api.types.is_datetime64_any_dtype(series):
+        entry.update(role='date', date_parse_rate=1.0)
+        return entry
+    if pd.api.types.is_bool_dtype(series) or isinstance(series.dtype, pd.CategoricalDtype):
+        entry['role'] = 'category'
+        return entry
+
+    values = _sample(series)
+    if pd.api.types.is_numeric_dtype(series):
+        digits = values.abs().astype('int64').astype(str).str.len() if _integral(values) else None
+        if phone_named and digits is not None and len(digits) and ((digits >= 7) & (digits <= 15)).mean() >= 0.8:
+            entry['role'] = 'phone'
+        elif id_named and (digits is not None or not len(values)):
+            entry['role'] = 'id'
+        elif _name_matches(lower, tokens, CURRENCY_KEYWORDS):
+            entry['role'] = 'currency'
+        else:
+            entry['role'] = 'numeric'
+        return entry
+
+    strings = values.astype(str).str.strip()
+    if dates_named or _share(strings, DATE_PATTERN) >= 0.9:
+        rate = _date_parse_rate(strings)
+        if rate >= 0.5:
+            entry.update(role='date', date_parse_rate=rate)
+            return entry
+    if phone_named and _share(strings, PHONE_PATTERN) >= 0.8 and \
+            strings.str.count(r'\d').between(7, 15).mean() >= 0.8:
+        entry['role'] = 'phone'
+    elif _share(strings, CURRENCY_PATTERN) >= 0.8:
+        entry['role'] = 'currency'
+    elif id_named or _share(strings, UUID_PATTERN) >= 0.9:
+        entry['role'] = 'id'
+    elif len(strings) and (strings.str.len().mean() >= 40 or strings.str.count(r'\s+').mean() >= 4):
+        entry['role'] = 'free_text'
+    elif len(strings) and strings.nunique() <= max(20, len(strings) // 2):
+        entry['role'] = 'category'
+    else:
+        entry['role'] = 'text'
+    return entry
+
+
+class ColumnCatalog:
+    """Catalog entries by column name; treat as immutable once built (it is shared like the dataset)"""
+
+    def __init__(self, entries):
+        self.entries = entries
+        self._harmonized = {}
+        for column in entries:
+            self._harmonized.setdefault(harmonize_name(column), column)
+
+    def entry(self, df, column):
+        """Entry for a column of df, following harmonize_columns renames; unknown columns are profiled"""
+        known = self.entries.get(column)
+        if known is None:
+            known = self.entries.get(self._harmonized.get(column))
+        return known if known is not None else profile_column(column, df[column])
+
+    def role(self, df, column):
+        return self.entry(df, column)['role']
+
+    def columns(self, df, role=None, tag=None):
+        """Columns of df, in order, with the given role and/or name tag"""
+        selected = []
+        for column in df.columns:
+            entry = self.entry(df, column)
+            if (role is None or entry['role'] == role) and (tag is None or tag in entry['tags']):
+                selected.append(column)
+        return selected
+
+    def to_dict(self):
+        return [{"column": str(column), "role": entry['role'], "tags": entry['tags'], "dtype": entry['dtype']}
+                for column, entry in self.entries.items()]
+
+
+def build_catalog(df):
+    return ColumnCatalog({column: profile_column(column, df[column]) for column in df.columns})
+
+
+def catalog_for(df, catalog=None):
+    """The stored catalog when the caller has one, otherwise one built from df"""
+    return catalog if catalog is not None else build_catalog(df)
@@ -0,0 +1,146 @@
+"""
+Server-side chart aggregation for the Visualization component.
+
+Charts are computed over every row of the dataset and returned ready to plot,
+so the browser only receives a few kilobytes: category counts, per-group
+sums/means, histogram bins and a downsampled set of scatter points. Results
+are cached per dataset version by the caller (see /api/aggregate).
+"""
+import numpy as np
+import pandas as pd
+
+CHART_KINDS = ("value_counts", "group", "histogram", "scatter")
+GROUP_FUNCS = ("sum", "mean", "count", "min", "max")
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 5000
+MAX_BINS = 200
+DEFAULT_SCATTER_POINTS = 2000
+# Cached charts kept per dataset version (oldest evicted first)
+MAX_CACHED_CHARTS = 64
+
+
+class ChartError(ValueError):
+    """Raised for invalid chart requests (unknown kind/function, missing or non-numeric columns)"""
+
+
+def _labels(values):
+    """JSON-safe labels: NaN becomes None, numpy scalars become Python values"""
+    return [None if pd.isna(value) else (value.item() if hasattr(value, "item") else value) for value in values]
+
+
+def _numbers(values):
+    return [None if not np.isfinite(value) else float(value) for value in np.asarray(values, dtype=float)]
+
+
+def _numeric(df, column):
+    """Column as floats; unparseable values become NaN and are ignored"""
+    series = df[column]
+    if not pd.api.types.is_numeric_dtype(series):
+        series = pd.to_numeric(series, errors="coerce")
+    return series.astype(float)
+
+
+def _top(result, limit, sort):
+    """Keep the first `limit` entries and fold the rest into an 'other' total"""
+    if sort == "label":
+        try:
+            result = result.sort_index(na_position="last")
+        except TypeError:
+            # Mixed label types (e.g. numbers and strings in an object column) sort as text
+            result = result.sort_index(key=lambda index: index.astype(str), na_position="last")
+    else:
+        result = result.sort_values(ascending=False, kind="stable")
+    other = result.iloc[limit:]
+    return result.iloc[:limit], other
+
+
+def value_counts(df, x, limit=DEFAULT_LIMIT, sort="value"):
+    counts = df[x].value_counts(dropna=False)
+    shown, other = _top(counts, limit, sort)
+    return {
+        "labels": _labels(shown.index),
+        "values": [int(value) for value in shown.to_numpy()],
+        "other": int(other.sum()),
+        "other_categories": int(len(other)),
+    }
+
+
+def group_aggregate(df, x, y, func="mean", limit=DEFAULT_LIMIT, sort="label"):
+    if func == "count" and y is None:
+        return value_counts(df, x, limit, sort)
+    values = _numeric(df, y)
+    result = values.groupby(df[x], dropna=False, sort=False).agg(func)
+    shown, other = _top(result, limit, sort)
+    response = {
+        "labels": _labels(shown.index),
+        "values": _numbers(shown.to_numpy()),
+        "other_categories": int(len(other)),
+    }
+    # Only additive aggregates can be folded into a single 'other' slice
+    if func in ("sum", "count"):
+        response["other"] = float(other.sum())
+    return response
+
+
+def histogram(df, x, bins=20):
+    values = _numeric(df, x).to_numpy()
+    values = values[np.isfinite(values)]
+    if len(values) == 0:
+        return {"edges": [], "counts": [], "missing": int(len(df))}
+    counts, edges = np.histogram(values, bins=bins)
+    return {
+        "edges": _numbers(edges),
+        "counts": [int(count) for count in counts],
+        "missing": int(len(df) - len(values)),
+    }
+
+
+def scatter_points(df, x, y, max_points=DEFAULT_SCATTER_POINTS):
+    points = pd.DataFrame({"x": _numeric(df, x), "y": _numeric(df, y)}).dropna()
+    total = len(points)
+    if total > max_points:
+        # Deterministic uniform sample so the same dataset version always plots the same points
+        points = points.sample(n=max_points, random_state=0).sort_index()
+    return {
+        "points": [{"x": float(px), "y": float(py)} for px, py in zip(points["x"].to_numpy(), points["y"].to_numpy())],
+        "total_points": int(total),
+        "sampled": total > max_points,
+    }
+
+
+def chart_aggregate(df, kind, x, y=None, func="mean", limit=DEFAULT_LIMIT, bins=20, sort=None,
+                    max_points=DEFAULT_SCATTER_POINTS):
+    """Validate a chart request and compute its aggregate over the whole DataFrame"""
+    if kind not in CHART_KINDS:
+        raise ChartError(f"Invalid kind. Use one of: {', '.join(CHART_KINDS)}")
+    if func not in GROUP_FUNCS:
+        raise ChartError(f"Invalid func. Use one of: {', '.join(GROUP_FUNCS)}")
+    if sort not in (None, "label", "value"):
+        raise ChartError("Invalid sort. Use 'label' or 'value'.")
+    if not 1 <= limit <= MAX_LIMIT:
+        raise ChartError(f"limit must be between 1 and {MAX_LIMIT}")
+    if not 1 <= bins <= MAX_BINS:
+        raise ChartError(f"bins must be between 1 and {MAX_BINS}")
+    if not 1 <= max_points <= MAX_LIMIT:
+        raise ChartError(f"max_points must be between 1 and {MAX_LIMIT}")
+    needs_y = kind == "scatter" or (kind == "group" and func != "count")
+    if needs_y and not y:
+        raise ChartError(f"'{kind}' charts require a y column")
+    missing = [col for col in (x, y) if col is not None and col not in df.columns]
+    if missing:
+        raise ChartError(f"Columns not found: {', '.join(missing)}")
+
+    if kind == "value_counts":
+        return value_counts(df, x, limit, sort or "value")
+    if kind == "group":
+        return group_aggregate(df, x, y, func, limit, sort or "label")
+    if kind == "histogram":
+        return histogram(df, x, bins)
+    return scatter_points(df, x, y, max_points)
+
+
+def remember(cache, key, result, limit=MAX_CACHED_CHARTS):
+    """Store result, evicting the oldest entries beyond limit"""
+    cache[key] = result
+    while len(cache) > limit:
+        cache.pop(next(iter(cache)))
@@ -0,0 +1,490 @@
+"""
+Cleaning engine shared by the HTTP API and batch jobs.
+
+Everything here works on plain pandas DataFrames and keyword flags so it can
+run outside a request (worker processes, scripts) without FastAPI.
+"""
+import io
+import lzma
+import zipfile
+import zlib
+
+import numpy as np
+import pandas as pd
+
+from catalog import catalog_for, harmonize_name
+from columnar import apply_elementwise, map_columns, transform_columns
+from decompression import COMPRESSED_SUFFIXES, compressed_members, detect_compression, new_budget
+from dedupe import deduplicate_customers as fuzzy_deduplicate
+from dedupe import identifier_columns
+from metrics import OperationTimer, track_operation
+from timeseries import fill_time_gaps as fill_time_series_gaps
+from timeseries import interpolate_downtime as interpolate_time_series
+from timeseries import smooth_sensor_data as smooth_time_series
+
+# Flag names accepted by clean_dataframe(), in the order they are applied
+CLEAN_FLAGS = [
+    "remove_duplicates", "harmonize_columns", "handle_missing", "trim_whitespace",
+    "standardize_dates", "reorder_columns",
+    "deduplicate_customers", "standardize_addresses", "normalize_phone_numbers",
+    "validate_accounts", "detect_fraud_patterns", "standardize_transactions",
+    "anonymize_data", "standardize_medical_codes", "validate_demographics",
+    "smooth_sensor_data", "standardize_units", "interpolate_downtime",
+    "fill_time_gaps", "adjust_seasonality", "normalize_promotions",
+    "standardize_grades", "validate_student_ids", "harmonize_course_codes",
+]
+
+SUPPORTED_EXTENSIONS = ('.csv', '.xlsx', '.xls') + COMPRESSED_SUFFIXES
+
+
+def file_format(filename):
+    """'csv' or 'excel' from the file extension (any case), None for anything else"""
+    lower = filename.lower()
+    if lower.endswith('.csv'):
+        return 'csv'
+    if lower.endswith(('.xlsx', '.xls')):
+        return 'excel'
+    return None
+
+
+class DataFormatError(ValueError):
+    """Raised when uploaded content cannot be parsed into a DataFrame"""
+
+
+def _read_member(name, open_stream, budget, encoding):
+    with open_stream(budget) as stream:
+        if file_format(name) == 'excel':
+            # Excel needs a seekable file; the member is bounded by the decompression budget
+            return pd.read_excel(io.BytesIO(stream.read()))
+        if file_format(name) == 'csv' or name.lower().endswith('.txt'):
+            return pd.read_csv(stream, encoding=encoding)
+    raise DataFormatError(f"Unsupported file in archive: {name}. Archives may contain CSV or Excel files.")
+
+
+def _read_compressed(filename, content, compression):
+    """Parse compressed/archived uploads, streaming decompressed bytes straight into the parser"""
+    try:
+        members = compressed_members(filename, content, compression)
+        if not members:
+            raise DataFormatError("Archive contains no files.")
+        for encoding in ('utf-8', 'latin-1'):
+            budget = new_budget()
+            try:
+                frames = [_read_member(name, open_stream, budget, encoding) for name, open_stream in members]
+                break
+            except UnicodeDecodeError:
+                continue
+        else:
+            raise DataFormatError("Unable to decode file. Please ensure it's a valid CSV file with UTF-8 or Latin-1 encoding.")
+    except (OSError, EOFError, zipfile.BadZipFile, lzma.LZMAError, zlib.error) as e:
+        raise DataFormatError(f"Unable to decompress {compression} file: {str(e)}")
+    
+    if len(frames) == 1:
+        return frames[0]
+    # Multi-member archives are stacked; all members must share the same columns
+    columns = list(frames[0].columns)
+    mismatched = [name for (name, _), frame in zip(members, frames) if list(frame.columns) != columns]
+    if mismatched:
+        raise DataFormatError(f"Archive members have different columns: {', '.join(mismatched)}")
+    return pd.concat(frames, ignore_index=True)
+
+
+def read_dataframe(filename, content=None, path=None):
+    """
+    Parse raw CSV/Excel bytes (optionally compressed or zipped) into a DataFrame.
+    Pass `path` instead of `content` to parse a file on disk without loading its bytes.
+    """
+    with track_operation("parse"):
+        if path is not None:
+            with open(path, 'rb') as f:
+                head = f.read(8)
+        else:
+            head = content[:8]
+        compression = detect_compression(filename, head)
+        if compression is not None:
+            return _read_compressed(filename, content if path is None else path, compression)
+        if file_format(filename) == 'csv' and path is not None:
+            try:
+                df = pd.read_csv(path, encoding='utf-8')
+            except UnicodeDecodeError:
+                df = pd.read_csv(path, encoding='latin-1')
+        elif file_format(filename) == 'csv':
+            try:
+                # Try to decode as UTF-8 first
+                df = pd.read_csv(io.StringIO(content.decode('utf-8')))
+            except UnicodeDecodeError:
+                # If that fails, try with latin-1 encoding
+                try:
+                    df = pd.read_csv(io.StringIO(content.decode('latin-1')))
+                except UnicodeDecodeError:
+                    raise DataFormatError("Unable to decode file. Please ensure it's a valid CSV file with UTF-8 or Latin-1 encoding.")
+        elif file_format(filename) == 'excel':
+            df = pd.read_excel(io.BytesIO(content) if path is None else path)
+        else:
+            raise DataFormatError("Unsupported file format. Please upload a CSV or Excel file (optionally gzip/bzip2/xz/zstd compressed or zipped).")
+    return df
+
+
+def clean_dataframe(df,
+                    remove_duplicates=False,
+                    harmonize_columns=False,
+                    handle_missing="none",
+                    trim_whitespace=False,
+                    standardize_dates=False,
+                    reorder_columns=False,
+                    # Industry-specific cleaning options
+                    deduplicate_customers=False,
+                    standardize_addresses=False,
+                    normalize_phone_numbers=False,
+                    validate_accounts=False,
+                    detect_fraud_patterns=False,
+                    standardize_transactions=False,
+                    anonymize_data=False,
+                    standardize_medical_codes=False,
+                    validate_demographics=False,
+                    smooth_sensor_data=False,
+                    standardize_units=False,
+                    interpolate_downtime=False,
+                    fill_time_gaps=False,
+                    adjust_seasonality=False,
+                    normalize_promotions=False,
+                    standardize_grades=False,
+                    validate_student_ids=False,
+                    harmonize_course_codes=False,
+                    catalog=None):
+    """
+    Apply the selected cleaning operations and return the cleaned DataFrame.
+    Columns are selected by their role in `catalog` (the dataset's stored
+    ColumnCatalog; built from df when not given).
+    """
+    catalog = catalog_for(df, catalog)
+    timer = OperationTimer()
+    # Apply cleaning operations
+    if remove_duplicates:
+        timer.start("remove_duplicates", len(df))
+        original_rows = len(df)
+        # take() rather than a boolean slice, so later column assignments act on an owned frame
+        df = df.take(np.flatnonzero(~df.duplicated().to_numpy()))
+        print(f"Removed {original_rows - len(df)} duplicate rows")
+    
+    if harmonize_columns:
+        timer.start("harmonize_columns", len(df))
+        original_columns = df.columns.tolist()
+        df.columns = [harmonize_name(col) for col in df.columns]
+        print(f"Harmonized columns: {original_columns} -> {df.columns.tolist()}")
+    
+    if handle_missing != "none":
+        timer.start("handle_missing", len(df))
+        missing_count = df.isnull().sum().sum()
+        if handle_missing == "drop":
+            df = df.take(np.flatnonzero(df.notna().all(axis=1).to_numpy()))
+            print(f"Dropped {missing_count} missing values")
+        elif handle_missing == "fill_mean":
+            numeric_columns = df.select_dtypes(include=['number']).columns
+            transform_columns(df, numeric_columns, _fill_mean)
+            print(f"Filled missing values with mean for columns: {numeric_columns.tolist()}")
+        elif handle_missing == "fill_zero":
+            df = df.fillna(0)
+            print(f"Filled all missing values with zero")
+    
+    if trim_whitespace:
+        timer.start("trim_whitespace", len(df))
+        string_columns = df.select_dtypes(include=['object']).columns
+        apply_elementwise(df, string_columns, _strip)
+        print(f"Trimmed whitespace for columns: {string_columns.tolist()}")
+    
+    if standardize_dates:
+        timer.start("standardize_dates", len(df))
+        # Enhanced date standardization to handle various formats
+        date_columns = catalog.columns(df, role='date')
+        for col, (values, error) in zip(date_columns, map_columns(df, date_columns, _standardize_date, processes=True)):
+            if error is None:
+                df[col] = values
+            else:
+                print(f"Could not standardize date column {col}: {error}")
+    
+    if reorder_columns:
+        timer.start("reorder_columns", len(df))
+        original_order = df.columns.tolist()
+        df = df.reindex(sorted(df.columns), axis=1)
+        print(f"Reordered columns: {original_order} -> {df.columns.tolist()}")
+    
+    # Industry-specific cleaning operations
+    # Retail/E-commerce
+    if deduplicate_customers:
+        timer.start("deduplicate_customers", len(df))
+        # Fuzzy record linkage over the customer identifier fields (see dedupe.py)
+        customer_identifiers = identifier_columns(df, catalog)
+        if len(customer_identifiers) >= 2:  # Need at least 2 identifiers to deduplicate
+            df, report = fuzzy_deduplicate(df, customer_identifiers, catalog=catalog)
+            print(f"Removed {report['rows_removed']} duplicate customer rows in {report['duplicate_clusters']} clusters")
+
+    if standardize_addresses:
+        timer.start("standardize_addresses", len(df))
+        address_columns = catalog.columns(df, tag='address')
+        # Basic address standardization - remove extra whitespace
+        apply_elementwise(df, address_columns, _strip_title)
+        print(f"Standardized address columns: {address_columns}")
+
+    if normalize_phone_numbers:
+        timer.start("normalize_phone_numbers", len(df))
+        phone_columns = catalog.columns(df, role='phone')
+        # Basic phone number normalization - remove non-digits
+        apply_elementwise(df, phone_columns, _strip_phone_punctuation)
+        print(f"Normalized phone number columns: {phone_columns}")
+
+    # Finance/Banking
+    if validate_accounts:
+        timer.start("validate_accounts", len(df))
+        account_columns = catalog.columns(df, tag='account')
+        # Basic account number validation - ensure consistent format
+        apply_elementwise(df, account_columns, _alphanumeric)
+        print(f"Validated account columns: {account_columns}")
+
+    # Healthcare
+    if anonymize_data:
+        timer.start("anonymize_data", len(df))
+        # Simplified anonymization - remove or obfuscate sensitive columns
+        sensitive_columns = catalog.columns(df, tag='sensitive')
+        for col in sensitive_columns:
+            if col in df.columns:
+                df[col] = '***REDACTED***'
+        print(f"Anonymized sensitive columns: {sensitive_columns}")
+
+    if standardize_medical_codes:
+        timer.start("standardize_medical_codes", len(df))
+        # Look for columns that might contain medical codes
+        code_columns = catalog.columns(df, tag='medical_code')
+        # Basic standardization - uppercase and strip
+        apply_elementwise(df, code_columns, _strip_upper)
+        print(f"Standardized medical code columns: {code_columns}")
+
+    # Manufacturing
+    if smooth_sensor_data:
+        timer.start("smooth_sensor_data", len(df))
+        # Time-ordered rolling mean per entity (see timeseries.py)
+        df, details = smooth_time_series(df, catalog=catalog)
+        print(f"Smoothed sensor data for columns: {details['columns']} (time key: {details['time_key']}, entities: {details['entity_keys']})")
+
+    if standardize_units:
+        timer.start("standardize_units", len(df))
+        # Look for columns with units in their names
+        unit_columns = catalog.columns(df, tag='unit')
+        # This is a simplified implementation - real implementation would need more context
+        # Just ensuring numeric data in these columns
+        transform_columns(df, unit_columns, _coerce_numeric, processes=True)
+        print(f"Standardized unit columns: {unit_columns}")
+
+    if interpolate_downtime:
+        timer.start("interpolate_downtime", len(df))
+        df, details = interpolate_time_series(df, catalog=catalog)
+        if details['time_key'] is not None:
+            print(f"Interpolated {details['filled_cells']} missing readings by time (entities: {details['entity_keys']})")
+
+    # Demand Planning
+    if fill_time_gaps:
+        timer.start("fill_time_gaps", len(df))
+        # Insert the missing periods of regularly sampled data, per entity (see timeseries.py)
+        df, details = fill_time_series_gaps(df, catalog=catalog)
+        if details.get('skipped'):
+            print(f"Did not fill time gaps in date column {details['time_key']}: {details['skipped']}")
+        elif details['time_key'] is not None:
+            print(f"Filled {details.get('rows_added', 0)} time gaps in date column: {details['time_key']} "
+                  f"(frequency: {details.get('frequency')}, entities: {details.get('entity_keys')})")
+        if details.get('unparsed_rows'):
+            print(f"Left {details['unparsed_rows']} rows with unparseable {details['time_key']} values unchanged")
+    
+    # Education
+    if standardize_grades:
+        timer.start("standardize_grades", len(df))
+        # Look for columns that might contain grades
+        grade_columns = catalog.columns(df, tag='grade')
+        # Standardize grade values (e.g., convert letter grades to a consistent format)
+        apply_elementwise(df, grade_columns, _strip_upper)
+        print(f"Standardized grade columns: {grade_columns}")
+
+    if validate_student_ids:
+        timer.start("validate_student_ids", len(df))
+        # Look for student ID columns
+        student_id_columns = catalog.columns(df, tag='student_id')
+        # Basic student ID validation - ensure consistent format
+        # Remove spaces and ensure consistent format
+        apply_elementwise(df, student_id_columns, _remove_spaces)
+        print(f"Validated student ID columns: {student_id_columns}")
+
+    if harmonize_course_codes:
+        timer.start("harmonize_course_codes", len(df))
+        # Look for course code columns
+        course_columns = catalog.columns(df, tag='course')
+        # Standardize course codes
+        apply_elementwise(df, course_columns, _strip_upper)
+        print(f"Harmonized course code columns: {course_columns}")
+
+    timer.stop()
+    return df
+
+
+# Per-column kernels; module-level so the column executor can ship them to worker processes
+def _strip(x):
+    return x.strip() if isinstance(x, str) else x
+
+
+def _strip_title(x):
+    return str(x).strip().title() if pd.notnull(x) else x
+
+
+def _strip_upper(x):
+    return str(x).strip().upper() if pd.notnull(x) else x
+
+
+def _strip_phone_punctuation(x):
+    return str(x).replace('-', '').replace(' ', '').replace('(', '').replace(')', '') if pd.notnull(x) else x
+
+
+def _alphanumeric(x):
+    return ''.join(filter(str.isalnum, str(x))) if pd.notnull(x) else x
+
+
+def _remove_spaces(x):
+    return str(x).replace(' ', '') if pd.notnull(x) else x
+
+
+def _fill_mean(series):
+    return series.fillna(series.mean())
+
+
+def _coerce_numeric(series):
+    # Fill NaN values that might be created by to_numeric with original values
+    return pd.to_numeric(series, errors='coerce').fillna(series)
+
+
+def _standardize_date(series):
+    """Returns (values, error); values are formatted consistently as YYYY-MM-DD"""
+    try:
+        # Try to convert to datetime with multiple format attempts
+        # This will handle mixed formats in the same column
+        parsed = pd.to_datetime(series, format='mixed', errors='coerce')
+        return parsed.dt.strftime('%Y-%m-%d'), None
+    except Exception as e:
+        return None, str(e)
+
+
+def duplicate_rows_mask(df, issue):
+    """Keep the first occurrence of every row"""
+    return ~df.duplicated()
+
+
+def missing_values_mask(df, issue):
+    # This is a simplified approach - in reality, you'd want more sophisticated handling
+    return df.notna().all(axis=1)
+
+
+def outliers_mask(df, issue):
+    """Keep rows within the 1.5 * IQR bounds of the issue's column (NaN counts as outside)"""
+    column = issue.get("column")
+    if column not in df.columns or df[column].dtype not in ['int64', 'float64']:
+        return None
+    params = issue.get("params") or {}
+    if params.get("lower_bound") is not None:
+        # Bounds computed by /api/analyze for this version of the data
+        lower_bound, upper_bound = params["lower_bound"], params["upper_bound"]
+    else:
+        Q1 = df[column].quantile(0.25)
+        Q3 = df[column].quantile(0.75)
+        IQR = Q3 - Q1
+        lower_bound = Q1 - 1.5 * IQR
+        upper_bound = Q3 + 1.5 * IQR
+    return df[column].between(lower_bound, upper_bound).to_numpy()
+
+
+# Issue fixes that only remove rows: issue type -> keep-mask (None keeps every row)
+ROW_FILTERS = {
+    "duplicate_rows": duplicate_rows_mask,
+    "missing_values": missing_values_mask,
+    "outliers": outliers_mask,
+}
+
+
+def handle_duplicates(df, issue, catalog=None):
+    """Handle duplicate rows"""
+    return df.take(np.flatnonzero(duplicate_rows_mask(df, issue)))
+
+
+def handle_missing_values(df, issue, catalog=None):
+    """Handle missing values - simple implementation"""
+    return df.take(np.flatnonzero(missing_values_mask(df, issue)))
+
+
+def handle_outliers(df, issue, catalog=None):
+    """Handle outliers in numeric columns"""
+    mask = outliers_mask(df, issue)
+    return df if mask is None else df.take(np.flatnonzero(mask))
+
+
+def handle_whitespace(df, issue, catalog=None):
+    """Handle whitespace issues in string columns"""
+    # Apply to all object columns
+    string_columns = df.select_dtypes(include=['object']).columns
+    return apply_elementwise(df, string_columns, _strip)
+
+
+def handle_date_formats(df, issue, catalog=None):
+    """Handle date format inconsistencies"""
+    # Try to standardize date columns
+    date_columns = catalog_for(df, catalog).columns(df, role='date')
+    for col, (values, error) in zip(date_columns, map_columns(df, date_columns, _standardize_date, processes=True)):
+        if error is None:
+            df[col] = values
+        else:
+            print(f"Could not standardize date column {col}: {error}")
+    return df
+
+
+# Mapping of analysis issue types to cleaning operations
+ISSUE_OPERATIONS = {
+    "duplicate_rows": handle_duplicates,
+    "missing_values": handle_missing_values,
+    "outliers": handle_outliers,
+    "whitespace_issues": handle_whitespace,
+    "date_format_inconsistency": handle_date_formats,
+    # Add more issue-specific handlers as needed
+}
+
+
+def apply_issue_fixes(df, issues, catalog=None):
+    """
+    Apply several issue fixes at once; the result does not depend on the order the
+    issues were selected in:
+    1. Row-removing fixes (ROW_FILTERS) are all evaluated against the frame as given,
+       i.e. the data that was analysed, and a row is kept only if every fix keeps it.
+       The combined mask is applied with a single take instead of one copy per fix.
+    2. Column fixes then run once each, in ISSUE_OPERATIONS order, on the kept rows.
+    Unsupported issue types and fixes that fail are skipped. Returns (df, applied issues).
+    Column fixes select columns through `catalog` (built from df when not given).
+    """
+    keep = np.ones(len(df), dtype=bool)
+    applied = []
+    for issue in issues:
+        if issue["type"] in ROW_FILTERS:
+            try:
+                mask = ROW_FILTERS[issue["type"]](df, issue)
+            except Exception as e:
+                print(f"Failed to apply cleaning for issue {issue.get('description')}: {str(e)}")
+                continue
+            if mask is not None:
+                keep &= np.asarray(mask, dtype=bool)
+            applied.append(issue)
+    if not keep.all():
+        with track_operation("issue_row_filter", len(df)):
+            df = df.take(np.flatnonzero(keep))
+    
+    column_issues = [issue for issue in issues if issue["type"] in ISSUE_OPERATIONS and issue["type"] not in ROW_FILTERS]
+    order = list(ISSUE_OPERATIONS)
+    for issue in sorted(column_issues, key=lambda issue: order.index(issue["type"])):
+        try:
+            df = ISSUE_OPERATIONS[issue["type"]](df, issue, catalog)
+        except Exception as e:
+            print(f"Failed to apply cleaning for issue {issue.get('description')}: {str(e)}")
+            continue
+        applied.append(issue)
+    return df, applied
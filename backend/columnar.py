@@ -0,0 +1,95 @@
+"""
+Column-parallel execution of independent per-column steps.
+
+Most cleaning and profiling steps touch each column on its own, so columns can
+be processed concurrently and reassembled in their original order, giving the
+same result as a sequential loop:
+- NumPy/pandas kernels (quantiles, null counts, nunique...) release the GIL and
+  run on a thread pool;
+- element-wise Python functions hold the GIL and run on a process pool, which
+  only pays off once columns are long enough to amortize pickling them.
+Small frames, single columns and code already running inside a worker process
+(batch jobs) fall back to the plain sequential loop.
+"""
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+
+# Degree of parallelism for per-column work (1 disables it)
+COLUMN_WORKERS = int(os.environ.get("DATACLEANR_COLUMN_WORKERS", str(os.cpu_count() or 1)))
+# Frames smaller than this many cells are processed sequentially
+PARALLEL_MIN_CELLS = int(os.environ.get("DATACLEANR_PARALLEL_MIN_CELLS", "200000"))
+# Columns shorter than this are not worth shipping to another process
+PROCESS_MIN_ROWS = int(os.environ.get("DATACLEANR_PROCESS_MIN_ROWS", "50000"))
+
+_executors = {}
+_executors_lock = threading.Lock()
+
+
+def get_executor(kind, workers):
+    key = (kind, workers)
+    with _executors_lock:
+        if key not in _executors:
+            if kind == "process":
+                # Forking the threaded server could copy locks held by other threads; spawn starts clean
+                _executors[key] = ProcessPoolExecutor(max_workers=workers,
+                                                      mp_context=multiprocessing.get_context("spawn"))
+            else:
+                _executors[key] = ThreadPoolExecutor(max_workers=workers)
+        return _executors[key]
+
+
+def shutdown_executors():
+    """Stop the shared pools; called when the server shuts down"""
+    with _executors_lock:
+        executors = list(_executors.values())
+        _executors.clear()
+    for executor in executors:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def _worker_count(workers, n_columns):
+    workers = COLUMN_WORKERS if workers is None else workers
+    # Nested pools inside batch worker processes would oversubscribe the cores
+    if multiprocessing.parent_process() is not None:
+        return 1
+    return max(1, min(workers, n_columns))
+
+
+def map_columns(df, columns, func, processes=False, workers=None):
+    """
+    Return [func(df[col]) for col in columns], computed in parallel when worthwhile.
+    func must be a module-level function (or a partial of one) when processes=True.
+    """
+    columns = list(columns)
+    workers = _worker_count(workers, len(columns))
+    if workers > 1 and len(df) * len(columns) >= PARALLEL_MIN_CELLS:
+        if processes and len(df) < PROCESS_MIN_ROWS:
+            # Not worth pickling; threads still overlap any GIL-free parts
+            processes = False
+        executor = get_executor("process" if processes else "thread", workers)
+        return list(executor.map(func, [df[col] for col in columns]))
+    return [func(df[col]) for col in columns]
+
+
+def transform_columns(df, columns, func, processes=False, workers=None):
+    """
+    Replace each column with func(column); columns are reassembled in order.
+    Columns are assigned in place, so df must own its data (filter rows with
+    take() rather than a boolean slice).
+    """
+    columns = list(columns)
+    for col, values in zip(columns, map_columns(df, columns, func, processes, workers)):
+        df[col] = values
+    return df
+
+
+def _apply_elements(func, series):
+    return series.apply(func)
+
+
+def apply_elementwise(df, columns, func, workers=None):
+    """Element-wise series.apply(func) per column, spread across processes for long columns"""
+    return transform_columns(df, columns, partial(_apply_elements, func), processes=True, workers=workers)
@@ -0,0 +1,282 @@
+"""
+Headless DataCleanr: the cleaning engine as a library and a command-line tool.
+
+Library use (with backend/ on PYTHONPATH):
+
+    import datacleanr
+    df = datacleanr.read_file("sales.csv")
+    report = datacleanr.analyze_dataframe(df)
+    df = datacleanr.clean_dataframe(df, remove_duplicates=True, trim_whitespace=True)
+
+Command line:
+
+    python datacleanr.py clean inbox/ -o cleaned/ --set remove_duplicates --set handle_missing=drop
+    python datacleanr.py clean a.csv b.csv.gz -o cleaned/ --recipe <recipe_id or recipe.json>
+    python datacleanr.py analyze sales.csv
+    python datacleanr.py suggest sales.csv
+
+Nothing heavy is imported up front: pandas and the engine modules load on first
+use (module __getattr__ for library attributes, local imports in the CLI), and
+FastAPI is never imported. One invocation handles any number of files, so the
+import cost is paid once per run rather than once per file. The HTTP API
+(main.py) uses the same engine modules.
+"""
+import argparse
+import contextlib
+import importlib
+import json
+import os
+import sys
+
+# Public name -> engine module that provides it, imported on first access
+_EXPORTS = {
+    "CLEAN_FLAGS": "cleaning",
+    "SUPPORTED_EXTENSIONS": "cleaning",
+    "DataFormatError": "cleaning",
+    "read_dataframe": "cleaning",
+    "clean_dataframe": "cleaning",
+    "apply_issue_fixes": "cleaning",
+    "build_catalog": "catalog",
+    "ColumnCatalog": "catalog",
+    "analyze_dataframe": "analysis",
+    "suggest_cleaning_steps": "analysis",
+    "detect_industry": "analysis",
+    "industry_cleaning_suggestions": "analysis",
+    "RecipeError": "recipes",
+    "apply_recipe": "recipes",
+    "clean_file_job": "batch",
+}
+
+__all__ = sorted(_EXPORTS) + ["read_file", "load_recipe", "main"]
+
+
+def __getattr__(name):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_EXPORTS))
+
+
+def read_file(path):
+    """Parse a CSV/Excel file (optionally compressed or zipped) into a DataFrame"""
+    from cleaning import read_dataframe
+
+    with open(path, "rb") as f:
+        return read_dataframe(os.path.basename(path), f.read())
+
+
+def load_recipe(reference):
+    """
+    Load a recipe from a JSON file (a saved recipe, or a bare list of steps) or
+    by id from DATACLEANR_RECIPE_DIR. Raises RecipeError if it cannot be used.
+    """
+    from recipes import RecipeError, recipe_storage, validate_steps
+
+    if os.path.isfile(reference):
+        with open(reference) as f:
+            recipe = json.load(f)
+        if isinstance(recipe, list):
+            recipe = {"steps": recipe}
+        if not isinstance(recipe, dict):
+            raise RecipeError(f"{reference} does not contain a recipe")
+        # Compiled recipes are cached by (recipe_id, version)
+        recipe = {"recipe_id": os.path.abspath(reference), "version": 1, "name": reference, **recipe}
+    elif reference in recipe_storage:
+        recipe = recipe_storage[reference]
+    else:
+        raise RecipeError(f"Recipe not found: {reference}")
+    validate_steps(recipe.get("steps"))
+    return recipe
+
+
+def _parse_value(value):
+    lowered = value.lower()
+    if lowered in ("true", "yes", "1"):
+        return True
+    if lowered in ("false", "no", "0"):
+        return False
+    return value
+
+
+def parse_options(options_json, flags):
+    """Merge --options JSON and --set FLAG[=VALUE] into clean_dataframe keyword arguments"""
+    from cleaning import CLEAN_FLAGS
+
+    options = json.loads(options_json) if options_json else {}
+    if not isinstance(options, dict):
+        raise ValueError("--options must be a JSON object")
+    for flag in flags:
+        name, _, value = flag.partition("=")
+        options[name.strip()] = _parse_value(value) if value else True
+    unknown = sorted(set(options) - set(CLEAN_FLAGS))
+    if unknown:
+        raise ValueError(f"Unknown cleaning options: {', '.join(unknown)}")
+    return options
+
+
+def expand_inputs(paths):
+    """(name, path) for each input file; directories contribute their supported files"""
+    from cleaning import SUPPORTED_EXTENSIONS
+
+    inputs = []
+    for path in paths:
+        if os.path.isdir(path):
+            inputs.extend((name, os.path.join(path, name)) for name in sorted(os.listdir(path))
+                          if name.lower().endswith(SUPPORTED_EXTENSIONS) and os.path.isfile(os.path.join(path, name)))
+        else:
+            inputs.append((os.path.basename(path), path))
+    return inputs
+
+
+def output_paths(inputs, output_dir, output_format):
+    """'<dir>/sales_cleaned.csv' per input; repeated names get a numeric suffix"""
+    from decompression import inner_filename
+
+    used, paths = set(), []
+    for name, _ in inputs:
+        base = os.path.splitext(inner_filename(name))[0]
+        candidate, counter = f"{base}_cleaned", 1
+        while candidate in used:
+            counter += 1
+            candidate = f"{base}_cleaned_{counter}"
+        used.add(candidate)
+        paths.append(os.path.join(output_dir, f"{candidate}.{output_format}"))
+    return paths
+
+
+def _emit(stream, record):
+    # One JSON object per line, flushed as soon as each file is done
+    print(json.dumps(record, default=str), file=stream, flush=True)
+
+
+def _quiet_worker():
+    # Engine progress messages must not interleave with the JSON results on stdout
+    sys.stdout = sys.stderr
+
+
+def run_clean(args):
+    from batch import clean_file_job
+    from recipes import RecipeError
+
+    if args.recipe and (args.options or args.flags):
+        raise ValueError("Use either --recipe or cleaning options, not both")
+    try:
+        recipe = load_recipe(args.recipe) if args.recipe else None
+    except RecipeError as e:
+        raise ValueError(str(e))
+    options = {} if recipe is not None else parse_options(args.options, args.flags)
+    inputs = expand_inputs(args.inputs)
+    os.makedirs(args.output_dir, exist_ok=True)
+    jobs = [(name, path, output_path, options, args.format, recipe)
+            for (name, path), output_path in zip(inputs, output_paths(inputs, args.output_dir, args.format))]
+
+    if args.jobs > 1 and len(jobs) > 1:
+        from concurrent.futures import ProcessPoolExecutor
+
+        with ProcessPoolExecutor(max_workers=min(args.jobs, len(jobs)), initializer=_quiet_worker) as executor:
+            results = executor.map(clean_file_job, *zip(*jobs))
+            failed = _report(args.results, results, args.output_dir)
+    else:
+        failed = _report(args.results, (clean_file_job(*job) for job in jobs), args.output_dir)
+    return 1 if failed else 0
+
+
+def _report(stream, results, output_dir):
+    failed = 0
+    for result in results:
+        if result["status"] == "success":
+            result["output"] = os.path.join(output_dir, result["output"])
+        else:
+            failed += 1
+        _emit(stream, result)
+    return failed
+
+
+def run_analyze(args):
+    from analysis import analyze_dataframe
+
+    failed = 0
+    for name, path in expand_inputs(args.inputs):
+        try:
+            df = read_file(path)
+            report = analyze_dataframe(df)
+            _emit(args.results, {
+                "filename": name,
+                "total_rows": len(df),
+                "total_columns": len(df.columns),
+                "issues_found": len(report),
+                "analysis_report": report,
+            })
+        except Exception as e:
+            failed += 1
+            _emit(args.results, {"filename": name, "status": "error", "error": str(e)})
+    return 1 if failed else 0
+
+
+def run_suggest(args):
+    from analysis import detect_industry, industry_cleaning_suggestions, suggest_cleaning_steps
+
+    failed = 0
+    for name, path in expand_inputs(args.inputs):
+        try:
+            df = read_file(path)
+            industry = detect_industry(df, name)
+            industry_steps, description = industry_cleaning_suggestions(industry["industry"])
+            _emit(args.results, {
+                "filename": name,
+                **industry,
+                "suggestions": list(dict.fromkeys(suggest_cleaning_steps(df) + industry_steps)),
+                "description": description,
+            })
+        except Exception as e:
+            failed += 1
+            _emit(args.results, {"filename": name, "status": "error", "error": str(e)})
+    return 1 if failed else 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="datacleanr", description="Clean and analyze CSV/Excel files without the web server.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    clean = commands.add_parser("clean", help="Clean files with an option set or a saved recipe")
+    clean.add_argument("inputs", nargs="+", help="Files or directories (their supported files are cleaned)")
+    clean.add_argument("-o", "--output-dir", default=".", help="Directory for <name>_cleaned.<format> outputs")
+    clean.add_argument("--set", dest="flags", action="append", default=[], metavar="FLAG[=VALUE]",
+                       help="Cleaning option, e.g. --set remove_duplicates --set handle_missing=drop")
+    clean.add_argument("--options", help="Cleaning options as a JSON object (same keys as /api/clean)")
+    clean.add_argument("--recipe", help="Saved recipe id or path to a recipe JSON file")
+    clean.add_argument("--format", choices=("csv", "xlsx"), default="csv", help="Output format")
+    clean.add_argument("-j", "--jobs", type=int, default=1, help="Files cleaned in parallel worker processes")
+    clean.set_defaults(run=run_clean)
+
+    analyze = commands.add_parser("analyze", help="Print each file's data quality report")
+    analyze.add_argument("inputs", nargs="+", help="Files or directories")
+    analyze.set_defaults(run=run_analyze)
+
+    suggest = commands.add_parser("suggest", help="Detect each file's industry and suggest cleaning options")
+    suggest.add_argument("inputs", nargs="+", help="Files or directories")
+    suggest.set_defaults(run=run_suggest)
+    return parser
+
+
+def main(argv=None):
+    """CLI entry point; prints one JSON line per file and returns 1 if any file failed"""
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    args.results = sys.stdout
+    try:
+        # Results go to stdout; the engine's progress messages go to stderr
+        with contextlib.redirect_stdout(sys.stderr):
+            return args.run(args)
+    except ValueError as e:
+        parser.error(str(e))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
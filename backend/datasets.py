@@ -0,0 +1,88 @@
+"""
+Content-addressed registry of parsed datasets.
+
+Uploads are keyed by the SHA-256 of their bytes plus the parse settings, so a
+re-upload of identical content reuses the already parsed DataFrame (and its
+cached profile, column catalog and analysis) instead of parsing and storing
+another copy. Each file_id holding a dataset counts as one reference; the
+dataset is dropped when the last reference is released. Shared DataFrames must be treated as
+immutable - callers copy before modifying (copy-on-write).
+"""
+import hashlib
+import os
+import threading
+
+# content key -> {'data', 'refcount', 'nbytes', 'profile', 'catalog', 'analysis', 'charts'}
+dataset_storage = {}
+_lock = threading.Lock()
+
+
+class StreamingHasher:
+    """Accumulates upload chunks while hashing them as they arrive"""
+
+    def __init__(self):
+        self.digest = hashlib.sha256()
+        self.chunks = []
+        self.size = 0
+
+    def update(self, chunk):
+        self.digest.update(chunk)
+        self.chunks.append(chunk)
+        self.size += len(chunk)
+
+    def content(self):
+        return b"".join(self.chunks)
+
+    def hexdigest(self):
+        return self.digest.hexdigest()
+
+
+def content_key(digest, filename, **parse_settings):
+    """Identity of a parsed dataset: content hash plus everything that affects parsing"""
+    settings = {"format": os.path.splitext(filename)[1], **parse_settings}
+    return digest + ":" + ",".join(f"{name}={settings[name]}" for name in sorted(settings))
+
+
+def acquire(key):
+    """Take a reference to an existing dataset; returns its record or None"""
+    with _lock:
+        record = dataset_storage.get(key)
+        if record is not None:
+            record['refcount'] += 1
+        return record
+
+
+def register(key, df, nbytes=0):
+    """Store a freshly parsed dataset with one reference (or join a concurrent registration)"""
+    with _lock:
+        record = dataset_storage.get(key)
+        if record is not None:
+            record['refcount'] += 1
+            return record
+        record = dataset_storage[key] = {
+            'data': df,
+            'refcount': 1,
+            'nbytes': nbytes,
+            'profile': None,
+            'catalog': None,
+            'analysis': None,
+            'charts': {},
+        }
+        return record
+
+
+def release(key):
+    """Drop one reference; the dataset is evicted when none remain"""
+    if key is None:
+        return
+    with _lock:
+        record = dataset_storage.get(key)
+        if record is None:
+            return
+        record['refcount'] -= 1
+        if record['refcount'] <= 0:
+            del dataset_storage[key]
+
+
+def stored_bytes():
+    return sum(record['nbytes'] for record in list(dataset_storage.values()))
@@ -0,0 +1,133 @@
+"""
+Streaming decompression for compressed and archived uploads.
+
+Compression is detected from magic bytes (gzip, bzip2, xz, zstd, zip), and each
+member is exposed as a binary stream that decompresses lazily while the parser
+reads it, so the decompressed bytes are never held in memory at once. Every
+stream counts the bytes it produces against a shared budget and aborts as soon
+as the decompressed size exceeds the limit (decompression bombs).
+"""
+import bz2
+import gzip
+import io
+import lzma
+import os
+import zipfile
+
+MAX_DECOMPRESSED_SIZE = int(os.environ.get("DATACLEANR_MAX_DECOMPRESSED_BYTES", str(1 * 1024 * 1024 * 1024)))
+
+MAGIC_NUMBERS = [
+    (b"\x1f\x8b", "gzip"),
+    (b"BZh", "bzip2"),
+    (b"\xfd7zXZ\x00", "xz"),
+    (b"\x28\xb5\x2f\xfd", "zstd"),
+    (b"PK\x03\x04", "zip"),
+]
+COMPRESSED_SUFFIXES = ('.gz', '.gzip', '.bz2', '.xz', '.zst', '.zstd', '.zip')
+EXCEL_SUFFIXES = ('.xlsx', '.xls')
+
+
+class DecompressedSizeError(ValueError):
+    """Raised when decompressed content exceeds MAX_DECOMPRESSED_SIZE"""
+
+
+def detect_compression(filename, head):
+    """Compression format from magic bytes; .xlsx files are zip containers and are not archives"""
+    if filename.lower().endswith(EXCEL_SUFFIXES):
+        return None
+    for magic, name in MAGIC_NUMBERS:
+        if head.startswith(magic):
+            return name
+    return None
+
+
+def inner_filename(filename):
+    """'sales.csv.gz' -> 'sales.csv'; names without an inner extension are treated as CSV"""
+    base = filename
+    if base.lower().endswith(COMPRESSED_SUFFIXES):
+        base = os.path.splitext(base)[0]
+    if not os.path.splitext(base)[1]:
+        base += ".csv"
+    return base
+
+
+class LimitedReader(io.RawIOBase):
+    """Raw stream that fails once the shared byte budget is exhausted"""
+
+    def __init__(self, stream, budget):
+        self.stream = stream
+        self.budget = budget
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = self.stream.read(len(buffer))
+        self.budget['remaining'] -= len(data)
+        if self.budget['remaining'] < 0:
+            raise DecompressedSizeError(
+                f"Decompressed content exceeds the {self.budget['limit'] // (1024 * 1024)}MB limit")
+        buffer[:len(data)] = data
+        return len(data)
+
+    def close(self):
+        try:
+            self.stream.close()
+        finally:
+            super().close()
+
+
+def _open_zstd(fileobj):
+    try:
+        import zstandard
+    except ImportError:
+        raise ValueError("Zstandard uploads require the 'zstandard' package on the server.")
+    return zstandard.ZstdDecompressor().stream_reader(fileobj)
+
+
+def _source(content):
+    """Content is the raw bytes, or the path of a file holding them (read from disk, never loaded whole)"""
+    return content if isinstance(content, str) else io.BytesIO(content)
+
+
+def _open_single(compression, content):
+    source = _source(content)
+    if compression == "gzip":
+        return gzip.open(source)
+    if compression == "bzip2":
+        return bz2.open(source)
+    if compression == "xz":
+        return lzma.open(source)
+    return _open_zstd(open(source, "rb") if isinstance(source, str) else source)
+
+
+def compressed_members(filename, content, compression, limit=None):
+    """
+    List (member_name, open_stream) pairs for compressed content (bytes or a file
+    path). Each call of open_stream(budget) returns a fresh buffered binary stream
+    charged to budget. limit defaults to MAX_DECOMPRESSED_SIZE.
+    """
+    limit = MAX_DECOMPRESSED_SIZE if limit is None else limit
+    if compression != "zip":
+        def open_stream(budget):
+            return io.BufferedReader(LimitedReader(_open_single(compression, content), budget))
+        return [(inner_filename(filename), open_stream)]
+
+    archive = zipfile.ZipFile(_source(content))
+    members = [info for info in archive.infolist()
+               if not info.is_dir() and not info.filename.startswith("__MACOSX/")
+               and not os.path.basename(info.filename).startswith(".")]
+    # Declared sizes give a cheap early rejection; actual bytes are still counted while streaming
+    if sum(info.file_size for info in members) > limit:
+        raise DecompressedSizeError(f"Archive expands beyond the {limit // (1024 * 1024)}MB limit")
+
+    def opener(info):
+        def open_stream(budget):
+            return io.BufferedReader(LimitedReader(archive.open(info), budget))
+        return open_stream
+    return [(info.filename, opener(info)) for info in members]
+
+
+def new_budget(limit=None):
+    limit = MAX_DECOMPRESSED_SIZE if limit is None else limit
+    return {'remaining': limit, 'limit': limit}
@@ -0,0 +1,267 @@
+"""
+Fuzzy customer deduplication (record linkage) that scales to millions of rows.
+
+Pipeline:
+1. Identifier columns (name/email/customer...) are normalized and concatenated
+   into one match key; rows with identical keys collapse immediately.
+2. Candidate pairs among the remaining unique keys come from blocking only -
+   never all pairs:
+   - blocks sharing a blocking key (email domain + phonetic name key), compared
+     all-against-all when the block is small enough;
+   - a sorted-neighbourhood window over the sorted match keys.
+3. Candidates are scored with the cosine similarity of their character-trigram
+   sets. Trigrams are hashed into 2^16 buckets and kept sparse (the sorted
+   bucket ids of each key), so unrelated keys rarely share a bucket. Pairs are
+   scored in vectorized chunks, in parallel threads.
+4. A pair whose email or id values are both present and differ is never a
+   match, however similar the names are.
+5. Matching pairs are merged into clusters (connected components). Each
+   cluster keeps its first row, matching drop_duplicates(keep='first'). Every
+   other member must itself be a match for that first row; members that only
+   joined through a chain of matches stay separate.
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from catalog import catalog_for
+from metrics import track_operation
+
+DEFAULT_THRESHOLD = float(os.environ.get("DATACLEANR_DEDUPE_THRESHOLD", "0.85"))
+DEFAULT_WINDOW = int(os.environ.get("DATACLEANR_DEDUPE_WINDOW", "5"))
+DEFAULT_WORKERS = int(os.environ.get("DATACLEANR_DEDUPE_WORKERS", str(os.cpu_count() or 1)))
+# Blocks larger than this are left to the sorted-neighbourhood pass (avoids quadratic blocks)
+MAX_BLOCK_SIZE = 500
+# Characters of the match key considered for similarity
+KEY_LENGTH = 48
+TRIGRAM_BUCKETS = 1 << 16
+CHUNK_ROWS = 50000
+# Candidate pairs scored per vectorized batch
+PAIR_CHUNK = 65536
+HASH_MIX = np.uint64(0x9E3779B97F4A7C15)
+
+SOUNDEX_TABLE = str.maketrans("abcdefghijklmnopqrstuvwxyz", "01230120022455012623010202")
+
+
+def identifier_columns(df, catalog=None):
+    """Customer identifier columns (name/email/customer...) from the column catalog"""
+    return catalog_for(df, catalog).columns(df, tag='customer_identifier')
+
+
+def veto_columns(df, columns, catalog=None):
+    """Match columns whose values must agree exactly when both are present: emails and ids"""
+    catalog = catalog_for(df[columns], catalog)
+    return [col for col in columns if 'email' in str(col).lower() or catalog.role(df, col) == 'id']
+
+
+def normalize_text(series):
+    return (series.fillna("").astype(str).str.lower()
+            .str.replace(r"[^\w@.\s]", " ", regex=True)
+            .str.replace(r"\s+", " ", regex=True)
+            .str.strip())
+
+
+def soundex(series):
+    """Vectorized Soundex-style phonetic key (first letter + 3 consonant-class digits)"""
+    letters = series.str.replace(r"[^a-z]", "", regex=True)
+    first = letters.str[:1]
+    digits = (letters.str[1:].str.translate(SOUNDEX_TABLE)
+              .str.replace(r"(\d)\1+", r"\1", regex=True)
+              .str.replace("0", "", regex=False))
+    return (first + digits + "000").str[:4]
+
+
+def build_keys(df, columns):
+    """Normalized match key per row and a blocking key per row"""
+    normalized = {col: normalize_text(df[col]) for col in columns}
+    email_cols = [col for col in columns if 'email' in str(col).lower()]
+    name_cols = [col for col in columns if col not in email_cols] or columns
+
+    match_key = normalized[columns[0]]
+    for col in columns[1:]:
+        match_key = match_key + "|" + normalized[col]
+
+    name = normalized[name_cols[0]]
+    tokens = name.str.split(" ")
+    phonetic = soundex(tokens.str[-1].fillna("")) + name.str[:1]
+    if email_cols:
+        domain = normalized[email_cols[0]].str.split("@").str[-1].fillna("")
+        block_key = domain + "/" + phonetic
+    else:
+        block_key = phonetic
+    return match_key, block_key
+
+
+def trigram_ids(keys):
+    """
+    (n, KEY_LENGTH - 2) array with the distinct hashed trigram ids of each key,
+    sorted, with -1 for padding and repeats; plus the number of distinct ids per key.
+    """
+    padded = (" " + keys + " ").to_numpy(dtype=f"<U{KEY_LENGTH}")
+    codes = padded.view(np.uint32).reshape(len(padded), KEY_LENGTH).astype(np.uint64)
+    trigrams = (codes[:, :-2] << np.uint64(42)) | (codes[:, 1:-1] << np.uint64(21)) | codes[:, 2:]
+    ids = ((trigrams * HASH_MIX) >> np.uint64(48)).astype(np.int32)
+    ids[codes[:, 2:] == 0] = -1
+    ids.sort(axis=1)
+    ids[:, 1:][ids[:, 1:] == ids[:, :-1]] = -1
+    return ids, (ids >= 0).sum(axis=1)
+
+
+def pair_similarity(ids, sizes, left, right):
+    """Cosine similarity of the trigram sets of keys left[i] and right[i]"""
+    similarity = np.zeros(len(left), dtype=np.float32)
+    for start in range(0, len(left), PAIR_CHUNK):
+        a, b = left[start:start + PAIR_CHUNK], right[start:start + PAIR_CHUNK]
+        # Ids are distinct within a key, so equal neighbours in the merged row are shared trigrams
+        merged = np.sort(np.concatenate([ids[a], ids[b]], axis=1), axis=1)
+        shared = ((merged[:, 1:] == merged[:, :-1]) & (merged[:, 1:] >= 0)).sum(axis=1)
+        norms = np.sqrt(sizes[a] * sizes[b])
+        similarity[start:start + len(a)] = shared / np.where(norms == 0, 1, norms)
+    return similarity
+
+
+def _matches(ids, sizes, vetoes, left, right, threshold):
+    """Keep candidate pairs that reach the threshold and whose email/id values do not conflict"""
+    keep = pair_similarity(ids, sizes, left, right) >= threshold
+    for codes in vetoes:
+        # Code 0 is an empty value, which never vetoes
+        a, b = codes[left], codes[right]
+        keep &= (a == b) | (a == 0) | (b == 0)
+    return left[keep], right[keep]
+
+
+def _block_pairs(ids, sizes, vetoes, blocks, threshold):
+    left, right = [], []
+    for members in blocks:
+        i, j = np.triu_indices(len(members), k=1)
+        left.append(members[i])
+        right.append(members[j])
+    if not left:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    return _matches(ids, sizes, vetoes, np.concatenate(left), np.concatenate(right), threshold)
+
+
+def _window_pairs(ids, sizes, vetoes, start, stop, window, threshold):
+    """Compare each key with the next window-1 keys in sorted order within [start, stop)"""
+    left, right = [], []
+    for offset in range(1, window):
+        positions = np.arange(start, min(stop, len(ids) - offset))
+        left.append(positions)
+        right.append(positions + offset)
+    if not left:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    return _matches(ids, sizes, vetoes, np.concatenate(left), np.concatenate(right), threshold)
+
+
+def connected_components(n, left, right):
+    """Label each node with the smallest node id in its component"""
+    labels = np.arange(n)
+    if len(left) == 0:
+        return labels
+    while True:
+        smallest = np.minimum(labels[left], labels[right])
+        previous = labels.copy()
+        np.minimum.at(labels, left, smallest)
+        np.minimum.at(labels, right, smallest)
+        # Pointer jumping until every label points at a root
+        while True:
+            jumped = labels[labels]
+            if np.array_equal(jumped, labels):
+                break
+            labels = jumped
+        if np.array_equal(labels, previous):
+            return labels
+
+
+def _anchor_to_first_row(key_labels, codes, n, ids, sizes, vetoes, threshold):
+    """
+    Cut chains: a key stays in its component only if it matches (and does not
+    conflict with) the anchor, the key of the component's first row; others
+    become singletons.
+    """
+    m = len(key_labels)
+    first_row = np.full(m, n, dtype=np.int64)
+    np.minimum.at(first_row, key_labels[codes], np.arange(n))
+    anchor = codes[first_row[key_labels]]
+    members = np.flatnonzero(anchor != np.arange(m))
+    matched, _ = _matches(ids, sizes, vetoes, members, anchor[members], threshold)
+    # Clusters are labelled by their anchor key, which is never cut loose
+    labels = np.arange(m)
+    labels[matched] = anchor[matched]
+    return labels
+
+
+def find_duplicate_clusters(df, columns=None, threshold=DEFAULT_THRESHOLD, window=DEFAULT_WINDOW,
+                            workers=DEFAULT_WORKERS, catalog=None):
+    """
+    Cluster rows that refer to the same customer.
+    Returns an array with, for every row, the position of the first row of its cluster.
+    """
+    columns = columns or identifier_columns(df, catalog)
+    n = len(df)
+    if not columns or n == 0:
+        return np.arange(n)
+
+    with track_operation("dedupe_keys", n):
+        match_key, block_key = build_keys(df, columns)
+        # Exact matches on the normalized key collapse before any similarity work
+        codes, uniques = pd.factorize(match_key, sort=True)
+        unique_keys = pd.Series(uniques)
+        unique_blocks = pd.Series(block_key.to_numpy()).groupby(codes).first().reindex(range(len(uniques)))
+        ids, sizes = trigram_ids(unique_keys)
+        # Email/id value codes per unique key (the match key determines them); 0 is empty
+        vetoes = []
+        for col in veto_columns(df, columns, catalog):
+            values = pd.Series(normalize_text(df[col]).to_numpy()).groupby(codes).first()
+            value_codes, _ = pd.factorize(values.where(values != ""))
+            vetoes.append(value_codes + 1)
+
+    m = len(uniques)
+    tasks = []
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        with track_operation("dedupe_blocking", m):
+            block_codes, _ = pd.factorize(unique_blocks)
+            order = np.argsort(block_codes, kind="stable")
+            boundaries = np.flatnonzero(np.diff(block_codes[order])) + 1
+            blocks = [b for b in np.split(order, boundaries) if 1 < len(b) <= MAX_BLOCK_SIZE]
+            batch = max(1, len(blocks) // (max(1, workers) * 4) + 1)
+            for i in range(0, len(blocks), batch):
+                tasks.append(executor.submit(_block_pairs, ids, sizes, vetoes, blocks[i:i + batch], threshold))
+            # Unique keys are already sorted, so the neighbourhood window is positional
+            for start in range(0, m, CHUNK_ROWS):
+                tasks.append(executor.submit(_window_pairs, ids, sizes, vetoes, start,
+                                             min(start + CHUNK_ROWS, m), window, threshold))
+            pairs = [task.result() for task in tasks]
+
+    with track_operation("dedupe_clusters", m):
+        left = np.concatenate([p[0] for p in pairs]) if pairs else np.empty(0, dtype=np.int64)
+        right = np.concatenate([p[1] for p in pairs]) if pairs else np.empty(0, dtype=np.int64)
+        key_labels = connected_components(m, left, right)
+        key_labels = _anchor_to_first_row(key_labels, codes, n, ids, sizes, vetoes, threshold)
+        # Map cluster of unique keys back to the first row position in each cluster
+        row_cluster = key_labels[codes]
+        first_row = np.full(m, n, dtype=np.int64)
+        np.minimum.at(first_row, row_cluster, np.arange(n))
+        return first_row[row_cluster]
+
+
+def cluster_report(representatives):
+    sizes = pd.Series(representatives).value_counts()
+    duplicates = sizes[sizes > 1]
+    return {
+        "clusters": int(len(sizes)),
+        "duplicate_clusters": int(len(duplicates)),
+        "rows_removed": int((duplicates - 1).sum()),
+        "largest_cluster": int(sizes.max()) if len(sizes) else 0,
+        "cluster_size_distribution": {int(size): int(count) for size, count in duplicates.value_counts().sort_index().items()},
+    }
+
+
+def deduplicate_customers(df, columns=None, threshold=DEFAULT_THRESHOLD, window=DEFAULT_WINDOW,
+                          workers=DEFAULT_WORKERS, catalog=None):
+    """Drop fuzzy-duplicate customer rows, keeping the first row of every cluster"""
+    representatives = find_duplicate_clusters(df, columns, threshold, window, workers, catalog)
+    keep = representatives == np.arange(len(df))
+    return df.take(np.flatnonzero(keep)), cluster_report(representatives)
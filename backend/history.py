@@ -0,0 +1,212 @@
+"""
+Undo/redo history of cleaning rounds, stored as deltas.
+
+Version 0 is the raw upload. Every stored cleaning result becomes a new version
+whose delta is taken against the closest representable base - its parent
+version, otherwise the raw data:
+- removed: bitmap (np.packbits) of base rows the version dropped;
+- renames: base column -> version column, for columns whose values are unchanged;
+- columns: the version's column order;
+- changed: only the columns that are new or whose values differ (kept rows only).
+A version that adds or reorders rows (e.g. time-gap filling) cannot be expressed
+as a subset of any base and is stored as a full snapshot. Any version is
+materialized on demand by replaying deltas from the raw data.
+
+History is linear: committing after an undo discards the versions that were
+undone. Only the latest HISTORY_DEPTH versions are retained; when the oldest is
+dropped, versions based on it are rebased onto the raw data.
+"""
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+HISTORY_DEPTH = max(1, int(os.environ.get("DATACLEANR_HISTORY_DEPTH", "20")))
+
+
+class HistoryError(ValueError):
+    """Raised for unknown versions or when there is nothing to undo/redo"""
+
+
+def compute_delta(base, df):
+    """Delta turning base into df, or None when df is not a row subset of base"""
+    if not (base.index.is_unique and df.index.is_unique
+            and base.columns.is_unique and df.columns.is_unique):
+        return None
+    keep = base.index.isin(df.index)
+    if not base.index[keep].equals(df.index):
+        return None
+
+    def kept(col):
+        return base[col] if keep.all() else base[col][keep]
+
+    renames, changed = {}, {}
+    unmatched = [col for col in base.columns if col not in df.columns]
+    for col in df.columns:
+        if col in base.columns and kept(col).equals(df[col]):
+            continue
+        # A renamed column keeps its values under a new name (e.g. harmonize_columns)
+        source = next((candidate for candidate in unmatched if kept(candidate).equals(df[col])), None)
+        if source is not None:
+            renames[source] = col
+            unmatched.remove(source)
+        else:
+            changed[col] = df[col].copy()
+    return {
+        "removed": None if keep.all() else np.packbits(~keep),
+        "removed_rows": int((~keep).sum()),
+        "base_rows": len(base),
+        "renames": renames,
+        "columns": list(df.columns),
+        "changed": changed,
+    }
+
+
+def apply_delta(base, delta):
+    if delta["removed"] is not None:
+        removed = np.unpackbits(delta["removed"], count=delta["base_rows"]).astype(bool)
+        base = base[~removed]
+    sources = {new: old for old, new in delta["renames"].items()}
+    data = {col: delta["changed"][col] if col in delta["changed"] else base[sources.get(col, col)]
+            for col in delta["columns"]}
+    return pd.DataFrame(data, index=base.index)
+
+
+def delta_nbytes(version):
+    if version.get("snapshot") is not None:
+        return int(version["snapshot"].memory_usage(index=True, deep=False).sum())
+    delta = version.get("delta")
+    if delta is None:
+        return 0
+    removed = delta["removed"].nbytes if delta["removed"] is not None else 0
+    return removed + sum(int(series.memory_usage(index=True, deep=False)) for series in delta["changed"].values())
+
+
+class VersionHistory:
+    def __init__(self, raw, depth=HISTORY_DEPTH):
+        self.depth = depth
+        self.versions = {0: {
+            "version": 0,
+            "label": "upload",
+            "created_at": time.time(),
+            "base": None,
+            "delta": None,
+            "snapshot": None,
+            "steps": [],
+            "rows": len(raw),
+            "columns": len(raw.columns),
+        }}
+        self.order = [0]
+        self.current = 0
+        self.next_id = 1
+
+    def _encode(self, raw, parent_id, parent_df, df):
+        """Delta against the parent if possible, otherwise against the raw data, otherwise a snapshot"""
+        candidates = [(parent_id, parent_df)] + ([(0, raw)] if parent_id != 0 else [])
+        for base_id, base_df in candidates:
+            delta = compute_delta(base_df, df)
+            if delta is not None:
+                return {"base": base_id, "delta": delta, "snapshot": None}
+        return {"base": None, "delta": None, "snapshot": df.copy()}
+
+    def commit(self, raw, parent_df, df, label, steps):
+        """
+        Record df as a new version on top of the current one; parent_df must be the
+        materialized current version. Versions that were undone are discarded.
+        """
+        position = self.order.index(self.current)
+        for version_id in self.order[position + 1:]:
+            del self.versions[version_id]
+        self.order = self.order[:position + 1]
+
+        version_id = self.next_id
+        self.next_id += 1
+        self.versions[version_id] = {
+            "version": version_id,
+            "label": label,
+            "created_at": time.time(),
+            "steps": list(steps),
+            "rows": len(df),
+            "columns": len(df.columns),
+            **self._encode(raw, self.current, parent_df, df),
+        }
+        self.order.append(version_id)
+        self.current = version_id
+        self._prune(raw)
+        return version_id
+
+    def _prune(self, raw):
+        while len(self.order) - 1 > self.depth:
+            oldest = self.order[1]
+            # Rebase versions built on the oldest one before dropping it
+            for version_id in self.order[2:]:
+                version = self.versions[version_id]
+                if version["base"] == oldest:
+                    version.update(self._encode(raw, 0, raw, self.materialize(raw, version_id)))
+            del self.versions[oldest]
+            self.order.remove(oldest)
+
+    def materialize(self, raw, version_id):
+        if version_id not in self.versions:
+            raise HistoryError(f"Version {version_id} not found")
+        version = self.versions[version_id]
+        if version_id == 0:
+            return raw
+        if version["snapshot"] is not None:
+            return version["snapshot"].copy()
+        return apply_delta(self.materialize(raw, version["base"]), version["delta"])
+
+    def row_aligned(self, version_id):
+        """True when the version keeps the raw data's row labels (every delta on its chain is a row subset)"""
+        if version_id not in self.versions:
+            raise HistoryError(f"Version {version_id} not found")
+        while version_id != 0:
+            version = self.versions[version_id]
+            if version["snapshot"] is not None:
+                return False
+            version_id = version["base"]
+        return True
+
+    def checkout(self, version_id):
+        if version_id not in self.versions:
+            raise HistoryError(f"Version {version_id} not found")
+        self.current = version_id
+        return self.versions[version_id]
+
+    def undo_target(self):
+        """Version an undo moves to (the previous one)"""
+        position = self.order.index(self.current)
+        if position == 0:
+            raise HistoryError("Nothing to undo")
+        return self.order[position - 1]
+
+    def redo_target(self):
+        """Version a redo moves to (the next one, if it was not discarded)"""
+        position = self.order.index(self.current)
+        if position == len(self.order) - 1:
+            raise HistoryError("Nothing to redo")
+        return self.order[position + 1]
+
+    def nbytes(self):
+        return sum(delta_nbytes(version) for version in self.versions.values())
+
+    def summary(self):
+        versions = []
+        for version_id in self.order:
+            version = self.versions[version_id]
+            delta = version["delta"]
+            versions.append({
+                "version": version_id,
+                "label": version["label"],
+                "created_at": version["created_at"],
+                "rows": version["rows"],
+                "columns": version["columns"],
+                "base": version["base"],
+                "storage": "root" if version_id == 0 else "snapshot" if version["snapshot"] is not None else "delta",
+                "removed_rows": delta["removed_rows"] if delta else 0,
+                "changed_columns": [str(col) for col in delta["changed"]] if delta else [],
+                "renamed_columns": {str(old): str(new) for old, new in delta["renames"].items()} if delta else {},
+                "bytes": delta_nbytes(version),
+            })
+        return {"current": self.current, "depth": self.depth, "versions": versions}
@@ -0,0 +1,229 @@
+"""
+Incremental statistics for append-only datasets.
+
+DatasetProfile keeps running per-column statistics (exact counts and null
+counts, a HyperLogLog distinct-count sketch, a compressed quantile summary for
+numeric columns) plus a sorted row-hash index used to deduplicate appended rows
+against everything already stored. All updates are vectorized over the delta
+only, so appending N rows costs O(N log N) regardless of the dataset size.
+"""
+import numpy as np
+import pandas as pd
+
+from catalog import catalog_for
+from cleaning import apply_issue_fixes, clean_dataframe
+from dedupe import deduplicate_customers
+
+HLL_PRECISION = 12
+QUANTILE_CAPACITY = 512
+
+# Cleaning flags whose result depends on rows outside the delta (column means,
+# rolling windows, sorting, subset deduplication); a recorded session using any
+# of these is replayed on the full dataset instead of the delta.
+NON_INCREMENTAL_FLAGS = {"smooth_sensor_data", "fill_time_gaps", "deduplicate_customers", "interpolate_downtime"}
+NON_INCREMENTAL_ISSUES = {"outliers"}
+
+
+def row_hashes(df):
+    """Stable 64-bit hash per row (values only, index ignored)"""
+    return pd.util.hash_pandas_object(df, index=False).to_numpy(dtype=np.uint64)
+
+
+class HyperLogLog:
+    def __init__(self, precision=HLL_PRECISION):
+        self.precision = precision
+        self.registers = np.zeros(1 << precision, dtype=np.uint8)
+
+    def update(self, hashes):
+        if len(hashes) == 0:
+            return
+        p = self.precision
+        index = (hashes >> np.uint64(64 - p)).astype(np.int64)
+        remainder = (hashes << np.uint64(p)) & np.uint64(0xFFFFFFFFFFFFFFFF)
+        # Rank = position of the leftmost 1-bit in the remaining bits
+        rank = np.full(len(hashes), 64 - p + 1, dtype=np.uint8)
+        nonzero = remainder != 0
+        rank[nonzero] = (64 - np.floor(np.log2(remainder[nonzero].astype(np.float64)))).astype(np.uint8)
+        np.maximum.at(self.registers, index, rank)
+
+    def estimate(self):
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        raw = alpha * m * m / np.sum(np.power(2.0, -self.registers.astype(np.float64)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if raw <= 2.5 * m and zeros > 0:
+            # Linear counting for small cardinalities
+            return int(round(m * np.log(m / zeros)))
+        return int(round(raw))
+
+
+class QuantileSummary:
+    """Weighted centroids, halved by merging neighbours whenever capacity is exceeded"""
+
+    def __init__(self, capacity=QUANTILE_CAPACITY):
+        self.capacity = capacity
+        self.values = np.empty(0, dtype=np.float64)
+        self.weights = np.empty(0, dtype=np.float64)
+        self.minimum = None
+        self.maximum = None
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        values = values[np.isfinite(values)]
+        if len(values) == 0:
+            return
+        self.minimum = values.min() if self.minimum is None else min(self.minimum, values.min())
+        self.maximum = values.max() if self.maximum is None else max(self.maximum, values.max())
+        merged_values = np.concatenate([self.values, values])
+        merged_weights = np.concatenate([self.weights, np.ones(len(values))])
+        order = np.argsort(merged_values, kind="mergesort")
+        merged_values, merged_weights = merged_values[order], merged_weights[order]
+        while len(merged_values) > self.capacity:
+            if len(merged_values) % 2:
+                merged_values = np.append(merged_values, merged_values[-1])
+                merged_weights = np.append(merged_weights, 0.0)
+            pair_weights = merged_weights[0::2] + merged_weights[1::2]
+            merged_values = (merged_values[0::2] * merged_weights[0::2] +
+                             merged_values[1::2] * merged_weights[1::2]) / np.where(pair_weights == 0, 1, pair_weights)
+            merged_weights = pair_weights
+        self.values, self.weights = merged_values, merged_weights
+
+    def quantile(self, q):
+        if len(self.values) == 0:
+            return None
+        if q <= 0:
+            return float(self.minimum)
+        if q >= 1:
+            return float(self.maximum)
+        cumulative = np.cumsum(self.weights) - self.weights / 2
+        return float(np.interp(q * self.weights.sum(), cumulative, self.values))
+
+
+class ColumnStats:
+    def __init__(self, numeric):
+        self.numeric = numeric
+        self.count = 0
+        self.null_count = 0
+        self.sum = 0.0
+        self.distinct = HyperLogLog()
+        self.quantiles = QuantileSummary() if numeric else None
+
+    def update(self, series):
+        non_null = series.dropna()
+        self.count += len(series)
+        self.null_count += len(series) - len(non_null)
+        self.distinct.update(row_hashes(non_null.to_frame()))
+        if self.numeric:
+            values = pd.to_numeric(non_null, errors="coerce").to_numpy(dtype=np.float64)
+            self.sum += float(np.nansum(values))
+            self.quantiles.update(values)
+
+    def to_dict(self):
+        stats = {
+            "count": self.count,
+            "null_count": self.null_count,
+            "distinct_estimate": self.distinct.estimate(),
+        }
+        if self.numeric:
+            non_null = self.count - self.null_count
+            stats.update({
+                "mean": self.sum / non_null if non_null else None,
+                "min": self.quantiles.quantile(0),
+                "p25": self.quantiles.quantile(0.25),
+                "median": self.quantiles.quantile(0.5),
+                "p75": self.quantiles.quantile(0.75),
+                "max": self.quantiles.quantile(1),
+            })
+        return stats
+
+
+class DatasetProfile:
+    def __init__(self, df):
+        self.rows = 0
+        self.duplicate_rows = 0
+        self.columns = {col: ColumnStats(pd.api.types.is_numeric_dtype(df[col])) for col in df.columns}
+        self.hash_index = np.empty(0, dtype=np.uint64)
+        self.update(df)
+
+    def update(self, delta):
+        """Fold new rows into the statistics; returns a boolean mask of rows already seen"""
+        hashes = row_hashes(delta)
+        seen = np.isin(hashes, self.hash_index) | pd.Series(hashes).duplicated().to_numpy()
+        self.duplicate_rows += int(seen.sum())
+        self.hash_index = np.union1d(self.hash_index, hashes)
+        for col, stats in self.columns.items():
+            stats.update(delta[col])
+        self.rows += len(delta)
+        return seen
+
+    def to_dict(self):
+        return {
+            "rows": self.rows,
+            "duplicate_rows": self.duplicate_rows,
+            "columns": {str(col): stats.to_dict() for col, stats in self.columns.items()},
+        }
+
+
+def align_delta(existing, delta):
+    """
+    Match appended rows to the stored schema (column order and dtypes).
+    Raises ValueError when the column sets differ.
+    """
+    if set(delta.columns) != set(existing.columns):
+        missing = [str(col) for col in existing.columns if col not in delta.columns]
+        extra = [str(col) for col in delta.columns if col not in existing.columns]
+        raise ValueError(f"Appended columns do not match the dataset (missing: {missing}, unexpected: {extra})")
+    delta = delta[list(existing.columns)]
+    for col in existing.columns:
+        if delta[col].dtype != existing[col].dtype:
+            try:
+                delta[col] = delta[col].astype(existing[col].dtype)
+            except (ValueError, TypeError):
+                pass
+    return delta
+
+
+def steps_are_incremental(steps):
+    for index, step in enumerate(steps):
+        if step["kind"] == "clean":
+            options = step.get("options", {})
+            if any(options.get(flag) for flag in NON_INCREMENTAL_FLAGS) or options.get("handle_missing") == "fill_mean":
+                return False
+            # Only a leading deduplication can be checked against the raw row hashes
+            if index > 0 and options.get("remove_duplicates"):
+                return False
+        elif step["kind"] == "deduplicate_customers":
+            return False
+        elif any(issue.get("type") in NON_INCREMENTAL_ISSUES for issue in step.get("issues", [])):
+            return False
+    return True
+
+
+def clean_delta(steps, delta, seen_raw, cleaned_hash_index, catalog=None):
+    """
+    Replay recorded session steps on appended rows only.
+    `seen_raw` marks delta rows that duplicate existing raw rows; they are dropped
+    when the session removed duplicates before any other transformation. Rows
+    duplicating the existing cleaned output are dropped when a later issue fix
+    removed duplicates. Pass the dataset's stored `catalog` so a small delta gets
+    the same column roles as the full data.
+    """
+    catalog = catalog_for(delta, catalog)
+    df = delta
+    dedupe_cleaned = False
+    for index, step in enumerate(steps):
+        if step["kind"] == "clean":
+            options = step.get("options", {})
+            if index == 0 and options.get("remove_duplicates"):
+                df = df.take(np.flatnonzero(~seen_raw))
+            df = clean_dataframe(df, catalog=catalog, **options)
+        elif step["kind"] == "deduplicate_customers":
+            df, _ = deduplicate_customers(df, step["columns"], threshold=step["threshold"], window=step["window"],
+                                          catalog=catalog)
+        else:
+            df, applied = apply_issue_fixes(df, step.get("issues", []), catalog)
+            if any(issue["type"] == "duplicate_rows" for issue in applied):
+                dedupe_cleaned = True
+    if dedupe_cleaned and len(df):
+        df = df.take(np.flatnonzero(~np.isin(row_hashes(df), cleaned_hash_index)))
+    return df
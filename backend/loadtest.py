@@ -0,0 +1,462 @@
+"""
+Local load-testing harness for the DataCleanr API.
+
+Starts the app on localhost (a uvicorn subprocess by default, or a uvicorn
+server thread with --in-process), generates messy CSV files of a configurable
+size and replays a weighted mix of user sessions against it while ramping the
+number of concurrent users:
+
+    full     upload -> suggest -> analyze -> clean -> download (CSV)
+    explore  upload -> suggest -> detect-industry -> analyze
+    quick    upload -> clean -> download (XLSX)
+
+Every stage reports throughput, per-endpoint p50/p95/p99 latency and error
+rate, and the server's peak RSS (summed over its process tree, sampled from
+/proc, so Linux only). Example:
+
+    python loadtest.py --rows 20000 --concurrency 1,4,16 --duration 30 --json report.json
+
+Every session uploads its file with one extra row carrying a unique order id,
+so content-addressed dataset reuse does not turn uploads into cache hits;
+--shared-content uploads the generated files unchanged to measure that path.
+
+--max-error-rate and --max-p95-ms turn the run into a regression check: the
+exit code is 1 when any stage exceeds them.
+"""
+import argparse
+import csv
+import http.client
+import io
+import json
+import math
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from collections import defaultdict
+
+SESSION_MIXES = {
+    "full": ["upload", "suggest", "analyze", "clean", "download_csv"],
+    "explore": ["upload", "suggest", "detect_industry", "analyze"],
+    "quick": ["upload", "clean", "download_xlsx"],
+}
+DEFAULT_MIX = "full=6,explore=3,quick=1"
+# Cleaning options sent by sessions that clean
+CLEAN_OPTIONS = {
+    "remove_duplicates": "true",
+    "harmonize_columns": "true",
+    "handle_missing": "fill_mean",
+    "trim_whitespace": "true",
+    "standardize_dates": "true",
+}
+RSS_SAMPLE_INTERVAL = 0.2
+PERCENTILES = (50, 95, 99)
+
+
+def generate_csv(rows, seed=0):
+    """Sales-like CSV with duplicates, missing values, padded strings, mixed date formats and outliers"""
+    rng = random.Random(seed)
+    names = ["John Smith", " Jane Doe", "Bob Johnson ", "alice brown", "Carlos Díaz", "Mei Chen"]
+    cities = ["New York", "Boston", "chicago", " Denver", "San Francisco", None]
+    products = ["Laptop", "Mouse", "Keyboard", "Monitor", "Headphones"]
+    out = io.StringIO()
+    writer = csv.writer(out)
+    writer.writerow(["Order ID", "Product", "Quantity", "Price", "Order Date", "Customer Name", "Email", "Discount", "City"])
+    previous = None
+    for index in range(rows):
+        if previous is not None and rng.random() < 0.03:
+            writer.writerow(previous)
+            continue
+        name = rng.choice(names)
+        day = rng.randint(1, 28)
+        date = rng.choice([f"2023-03-{day:02d}", f"03/{day:02d}/2023", f"2023/03/{day:02d}"])
+        row = [
+            1000 + index,
+            rng.choice(products),
+            rng.randint(1, 10) if rng.random() > 0.01 else rng.randint(500, 1000),
+            round(rng.uniform(5, 1500), 2),
+            date,
+            name,
+            f"{name.strip().split()[0].lower()}{rng.randint(1, 99)}@example.com" if rng.random() > 0.05 else "",
+            round(rng.choice([0, 0.05, 0.1, 0.2]), 2) if rng.random() > 0.2 else "",
+            rng.choice(cities) or "",
+        ]
+        writer.writerow(row)
+        previous = row
+    return out.getvalue().encode()
+
+
+def with_nonce_row(content, nonce):
+    """Append one order row keyed by `nonce` so every session uploads distinct bytes"""
+    out = io.StringIO()
+    csv.writer(out).writerow([nonce, "Laptop", 1, 999.0, "2023-03-01", "Load Test", f"loadtest{nonce}@example.com", "", "Boston"])
+    return content + out.getvalue().encode()
+
+
+def encode_multipart(fields, files):
+    boundary = uuid.uuid4().hex
+    body = io.BytesIO()
+    for name, value in fields.items():
+        body.write(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode())
+    for name, (filename, content) in files.items():
+        body.write(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+                   f'Content-Type: application/octet-stream\r\n\r\n'.encode())
+        body.write(content)
+        body.write(b"\r\n")
+    body.write(f"--{boundary}--\r\n".encode())
+    return body.getvalue(), f"multipart/form-data; boundary={boundary}"
+
+
+class Client:
+    """One virtual user: a keep-alive connection that records every request's latency"""
+
+    def __init__(self, host, port, timeout, recorder):
+        self.host, self.port, self.timeout = host, port, timeout
+        self.recorder = recorder
+        self.conn = None
+
+    def request(self, label, method, path, fields=None, files=None):
+        if files is not None or fields is not None:
+            body, content_type = encode_multipart(fields or {}, files or {})
+            headers = {"Content-Type": content_type}
+        else:
+            body, headers = None, {}
+        start = time.perf_counter()
+        status, data = 0, b""
+        try:
+            if self.conn is None:
+                self.conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+            self.conn.request(method, path, body=body, headers=headers)
+            response = self.conn.getresponse()
+            status, data = response.status, response.read()
+        except (OSError, http.client.HTTPException):
+            # Connection reset, timeout, ...: recorded as status 0 and reconnected next time
+            self.close()
+        self.recorder.record(label, time.perf_counter() - start, status)
+        return status, data
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+
+def run_session(client, steps, content, filename):
+    """Replay one session; stops at the first failed step since later steps depend on it"""
+    file_id = None
+    for step in steps:
+        if step == "upload":
+            status, data = client.request("POST /api/upload", "POST", "/api/upload", files={"file": (filename, content)})
+            if status == 200:
+                file_id = json.loads(data)["file_id"]
+        elif step == "suggest":
+            status, _ = client.request("POST /api/suggest", "POST", "/api/suggest", fields={"file_id": file_id})
+        elif step == "detect_industry":
+            status, _ = client.request("POST /api/detect-industry", "POST", "/api/detect-industry", fields={"file_id": file_id})
+        elif step == "analyze":
+            status, _ = client.request("POST /api/analyze", "POST", "/api/analyze", fields={"file_id": file_id})
+        elif step == "clean":
+            status, _ = client.request("POST /api/clean", "POST", "/api/clean", fields={"file_id": file_id, **CLEAN_OPTIONS})
+        else:
+            output_format = step.rsplit("_", 1)[1]
+            status, _ = client.request(f"GET /api/download/{{file_id}}?format={output_format}", "GET",
+                                       f"/api/download/{file_id}?format={output_format}")
+        if status != 200:
+            break
+    if file_id is not None:
+        client.request("DELETE /api/files/{file_id}", "DELETE", f"/api/files/{file_id}")
+    return status == 200
+
+
+class Recorder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.statuses = defaultdict(lambda: defaultdict(int))
+
+    def record(self, label, seconds, status):
+        with self.lock:
+            self.latencies[label].append(seconds)
+            self.statuses[label][status] += 1
+            if not 200 <= status < 300:
+                self.errors[label] += 1
+
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(p / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def process_tree(pid):
+    """pid plus all of its descendants (uvicorn workers, batch and column process pools)"""
+    children = defaultdict(list)
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                # The command name may contain spaces; ppid is the second field after ')'
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children[ppid].append(int(entry))
+    tree, pending = [], [pid]
+    while pending:
+        current = pending.pop()
+        tree.append(current)
+        pending.extend(children.get(current, []))
+    return tree
+
+
+def rss_bytes(pid):
+    """Resident set size of a process and its descendants"""
+    total = 0
+    for member in process_tree(pid):
+        try:
+            with open(f"/proc/{member}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        total += int(line.split()[1]) * 1024
+                        break
+        except OSError:
+            continue
+    return total
+
+
+class RssSampler(threading.Thread):
+    """Samples the server's RSS in the background and keeps the peak since the last reset"""
+
+    def __init__(self, pid):
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.peak = 0
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.is_set():
+            self.peak = max(self.peak, rss_bytes(self.pid))
+            self.stopped.wait(RSS_SAMPLE_INTERVAL)
+
+    def reset(self):
+        peak, self.peak = self.peak, rss_bytes(self.pid)
+        return max(peak, self.peak)
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_until_ready(host, port, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            conn = http.client.HTTPConnection(host, port, timeout=2)
+            conn.request("GET", "/")
+            if conn.getresponse().status == 200:
+                return
+        except OSError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"Server on {host}:{port} did not become ready within {timeout}s")
+
+
+def start_subprocess_server(port, log_path):
+    backend_dir = os.path.dirname(os.path.abspath(__file__))
+    # The app logs every cleaning step; keep that (and any tracebacks) out of the report
+    with open(log_path, "w") as log:
+        process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+            cwd=backend_dir, stdout=log, stderr=subprocess.STDOUT,
+        )
+    return process, process.pid
+
+
+def start_in_process_server(port, log_path):
+    import uvicorn
+
+    from main import app
+
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    return server, os.getpid()
+
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in SESSION_MIXES:
+            raise ValueError(f"Unknown session type '{name}'. Use: {', '.join(SESSION_MIXES)}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def run_stage(host, port, users, duration, mix, files, timeout, sampler, seed, shared_content=False):
+    """Run `users` concurrent virtual users for `duration` seconds and summarize the stage"""
+    recorder = Recorder()
+    sessions = defaultdict(lambda: [0, 0])
+    sessions_lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+    names, weights = list(mix), list(mix.values())
+    if sampler is not None:
+        sampler.reset()
+
+    def user(index):
+        rng = random.Random(seed * 1000 + index)
+        client = Client(host, port, timeout, recorder)
+        while time.perf_counter() < deadline:
+            kind = rng.choices(names, weights)[0]
+            filename, content = rng.choice(files)
+            if not shared_content:
+                content = with_nonce_row(content, uuid.uuid4().int >> 65)
+            ok = run_session(client, SESSION_MIXES[kind], content, filename)
+            with sessions_lock:
+                sessions[kind][0 if ok else 1] += 1
+        client.close()
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=user, args=(index,)) for index in range(users)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    endpoints = {}
+    for label, values in sorted(recorder.latencies.items()):
+        values = sorted(values)
+        endpoints[label] = {
+            "requests": len(values),
+            "errors": recorder.errors[label],
+            "error_rate": recorder.errors[label] / len(values),
+            "statuses": {str(status): count for status, count in recorder.statuses[label].items()},
+            **{f"p{p}_ms": round(percentile(values, p) * 1000, 2) for p in PERCENTILES},
+        }
+    total_requests = sum(endpoint["requests"] for endpoint in endpoints.values())
+    total_errors = sum(endpoint["errors"] for endpoint in endpoints.values())
+    return {
+        "users": users,
+        "seconds": round(elapsed, 2),
+        "requests": total_requests,
+        "requests_per_second": round(total_requests / elapsed, 2),
+        "sessions": {kind: {"completed": done, "failed": failed} for kind, (done, failed) in sessions.items()},
+        "sessions_per_second": round(sum(done for done, _ in sessions.values()) / elapsed, 2),
+        "error_rate": total_errors / total_requests if total_requests else 0.0,
+        "peak_rss_mb": round(sampler.reset() / 1024 ** 2, 1) if sampler is not None else None,
+        "endpoints": endpoints,
+    }
+
+
+def print_stage(stage, out):
+    rss = f", peak RSS {stage['peak_rss_mb']} MB" if stage["peak_rss_mb"] is not None else ""
+    print(f"\n{stage['users']} users: {stage['requests_per_second']} req/s, {stage['sessions_per_second']} sessions/s, "
+          f"errors {stage['error_rate']:.2%}{rss}", file=out)
+    print(f"  {'endpoint':<42} {'requests':>8} {'errors':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}", file=out)
+    for label, endpoint in stage["endpoints"].items():
+        print(f"  {label:<42} {endpoint['requests']:>8} {endpoint['errors']:>7} "
+              f"{endpoint['p50_ms']:>9} {endpoint['p95_ms']:>9} {endpoint['p99_ms']:>9}", file=out)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Load-test the DataCleanr API on localhost.")
+    parser.add_argument("--rows", default="5000", help="Rows per generated file; comma-separated for several sizes")
+    parser.add_argument("--concurrency", default="1,4,16", help="Concurrent users per stage, e.g. 1,4,16")
+    parser.add_argument("--duration", type=float, default=20, help="Seconds per stage")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"Weighted session mix (default {DEFAULT_MIX})")
+    parser.add_argument("--timeout", type=float, default=300, help="Per-request timeout in seconds")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--shared-content", action="store_true", help="Upload identical bytes in every session (exercises dataset reuse)")
+    parser.add_argument("--url", help="Target an already running server (host:port) instead of starting one")
+    parser.add_argument("--server-pid", type=int, help="With --url: pid whose process tree RSS is tracked")
+    parser.add_argument("--in-process", action="store_true", help="Run uvicorn in a thread of this process (RSS then includes the load generator)")
+    parser.add_argument("--server-log", default="/tmp/datacleanr_loadtest_server.log", help="Where the started server's output goes")
+    parser.add_argument("--json", dest="json_path", help="Write the full report to this file")
+    parser.add_argument("--max-error-rate", type=float, help="Fail if any stage's error rate exceeds this (e.g. 0.01)")
+    parser.add_argument("--max-p95-ms", type=float, help="Fail if any endpoint's p95 latency exceeds this")
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    try:
+        mix = parse_mix(args.mix)
+        levels = [int(level) for level in args.concurrency.split(",")]
+        sizes = [int(rows) for rows in args.rows.split(",")]
+    except ValueError as e:
+        parser.error(str(e))
+
+    out = sys.stdout
+    if args.in_process:
+        # The in-process app prints every cleaning step; send that to stderr
+        sys.stdout = sys.stderr
+    files = [(f"loadtest_{rows}.csv", generate_csv(rows, args.seed + index)) for index, rows in enumerate(sizes)]
+    server = None
+    if args.url:
+        host, _, port = args.url.replace("http://", "").rstrip("/").partition(":")
+        port, pid = int(port or 80), args.server_pid
+    else:
+        host, port = "127.0.0.1", free_port()
+        start = start_in_process_server if args.in_process else start_subprocess_server
+        server, pid = start(port, args.server_log)
+        if not args.in_process:
+            print(f"Server output: {args.server_log}", file=out)
+    sampler = None
+    try:
+        wait_until_ready(host, port)
+        if pid is not None:
+            sampler = RssSampler(pid)
+            sampler.start()
+        print(f"Target {host}:{port}; files: {', '.join(f'{name} ({len(content) / 1024:.0f} KB)' for name, content in files)}", file=out)
+        stages = []
+        for users in levels:
+            stage = run_stage(host, port, users, args.duration, mix, files, args.timeout, sampler, args.seed,
+                              args.shared_content)
+            print_stage(stage, out)
+            stages.append(stage)
+    finally:
+        if sampler is not None:
+            sampler.stopped.set()
+        if isinstance(server, subprocess.Popen):
+            server.terminate()
+            server.wait(timeout=30)
+        elif server is not None:
+            server.should_exit = True
+
+    report = {
+        "rows": sizes,
+        "mix": mix,
+        "duration": args.duration,
+        "shared_content": args.shared_content,
+        "stages": stages,
+    }
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(report, f, indent=2)
+
+    failures = []
+    for stage in stages:
+        if args.max_error_rate is not None and stage["error_rate"] > args.max_error_rate:
+            failures.append(f"{stage['users']} users: error rate {stage['error_rate']:.2%}")
+        for label, endpoint in stage["endpoints"].items():
+            if args.max_p95_ms is not None and endpoint["p95_ms"] > args.max_p95_ms:
+                failures.append(f"{stage['users']} users: {label} p95 {endpoint['p95_ms']} ms")
+    for failure in failures:
+        print(f"FAILED {failure}", file=out)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,14 +1,47 @@
 from fastapi import FastAPI, File, UploadFile, Form, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, Response, StreamingResponse
 from fastapi.exceptions import RequestValidationError
 from pydantic import BaseModel
+from starlette.requests import ClientDisconnect
+import asyncio
 import pandas as pd
 import uuid
 import os
 from typing import List, Optional
+import copy
 import io
 import json
+import numpy as np
+import shutil
+import time
+from metrics import (
+    BYTES_EXPORTED, BYTES_INGESTED, REQUEST_LATENCY, REQUESTS_IN_FLIGHT,
+    gauge, job, record_cache, render_latest, track_operation,
+)
+from batch import batch_dir, resolve_server_directory, run_batch
+from batch import shutdown_executor as shutdown_batch_executor
+from catalog import build_catalog
+from charts import ChartError, DEFAULT_LIMIT, DEFAULT_SCATTER_POINTS, chart_aggregate, remember
+from admission import SAMPLE_BYTES, admitted, estimate_upload_bytes, estimate_work_bytes, frame_nbytes
+from analysis import analyze_dataframe, industry_cleaning_suggestions
+from analysis import detect_industry as detect_dataset_industry
+from analysis import suggest_cleaning_steps as suggest_dataset_steps
+from cleaning import SUPPORTED_EXTENSIONS, DataFormatError, apply_issue_fixes, clean_dataframe, read_dataframe
+from columnar import shutdown_executors as shutdown_column_executors
+from decompression import DecompressedSizeError
+from diff import MAX_CACHED_DIFFS, DiffError, align_rows, changed_cells, column_changes, column_pairs, diff_summary
+from dedupe import DEFAULT_THRESHOLD, DEFAULT_WINDOW, deduplicate_customers, identifier_columns
+from datasets import StreamingHasher, content_key, dataset_storage, stored_bytes
+from datasets import acquire as acquire_dataset
+from datasets import register as register_dataset
+from datasets import release as release_dataset
+from history import HistoryError, VersionHistory
+from incremental import DatasetProfile, align_delta, clean_delta, row_hashes, steps_are_incremental
+from query import OUTPUT_FORMATS, QueryError, parquet_path, run_query, write_columnar
+from recipes import RecipeError, apply_recipe, delete_recipe, recipe_storage, save_recipe
+from uploads import UploadError, create_session, finalized_frame, get_session, parse_checksum, remove_session, upload_sessions
+from profiling import finish_profile, get_profile_path, is_admin_token, profile_storage, start_profile
 
 app = FastAPI(title="DataCleanr API")
 
@@ -30,6 +63,7 @@ async def http_exception_handler(request: Request, exc: HTTPException):
         status_code=exc.status_code,
         content={"detail": exc.detail},
         headers={
+            **(exc.headers or {}),
             "Access-Control-Allow-Origin": "http://localhost:3000",
             "Access-Control-Allow-Credentials": "true"
         }
@@ -57,9 +91,129 @@ async def general_exception_handler(request: Request, exc: Exception):
         }
     )
 
+@app.on_event("shutdown")
+def shutdown_worker_pools():
+    # Worker processes would otherwise outlive a stopped or reloaded server
+    shutdown_column_executors()
+    shutdown_batch_executor()
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    REQUESTS_IN_FLIGHT.inc()
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        REQUESTS_IN_FLIGHT.dec()
+        # Label by route template (e.g. /api/download/{file_id}) to keep cardinality bounded
+        route = request.scope.get("route")
+        route_path = getattr(route, "path", None) or "unmatched"
+        REQUEST_LATENCY.observe(time.perf_counter() - start,
+                                method=request.method, route=route_path, status=str(status))
+
+@app.middleware("http")
+async def profile_request(request: Request, call_next):
+    # Opt-in via "X-Profile: 1" header or "?profile=1"; restricted to admins
+    requested = request.headers.get("x-profile") or request.query_params.get("profile")
+    if requested not in ("1", "true", "yes"):
+        return await call_next(request)
+    if not is_admin_token(request.headers.get("x-admin-token")):
+        return JSONResponse(
+            status_code=403,
+            content={"detail": "Profiling requires a valid X-Admin-Token header"},
+            headers={
+                "Access-Control-Allow-Origin": "http://localhost:3000",
+                "Access-Control-Allow-Credentials": "true"
+            }
+        )
+    
+    session, token = start_profile(f"{request.method} {request.url.path}")
+    try:
+        response = await call_next(request)
+        body = b"".join([chunk async for chunk in response.body_iterator])
+    finally:
+        summary = finish_profile(session, token)
+    
+    headers = {k: v for k, v in response.headers.items() if k.lower() != "content-length"}
+    headers["X-Profile-Id"] = summary["profile_id"]
+    # Attach the per-phase breakdown to JSON responses; other responses only get the header
+    if response.headers.get("content-type", "").startswith("application/json"):
+        try:
+            payload = json.loads(body)
+            if isinstance(payload, dict):
+                payload["profile"] = summary
+                return JSONResponse(content=payload, status_code=response.status_code, headers=headers)
+        except ValueError:
+            pass
+    return Response(content=body, status_code=response.status_code, headers=headers,
+                    media_type=response.media_type)
+
 # In-memory storage for file data
 file_storage = {}
 
+# Uploads are read in chunks of this size while hashing
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+# Largest file accepted by a single upload or append request
+MAX_UPLOAD_SIZE = 1 * 1024 * 1024 * 1024
+
+# Completed batch jobs: batch_id -> {'archive_path', 'results'}
+batch_storage = {}
+
+# Dataset gauges are derived from file_storage at scrape time
+gauge("datacleanr_stored_datasets", "Distinct raw datasets currently held in memory",
+      callback=lambda: len(dataset_storage) + sum(1 for entry in list(file_storage.values())
+                                                  if entry.get('dataset_key') is None))
+gauge("datacleanr_stored_dataset_bytes", "Approximate in-memory size of stored datasets",
+      callback=lambda: stored_bytes() + sum(entry.get('nbytes', 0) for entry in list(file_storage.values())))
+gauge("datacleanr_files", "File ids currently registered", callback=lambda: len(file_storage))
+
+def update_storage_size(file_id):
+    """Bytes held privately by this file_id; shared raw datasets are counted once in datasets.py"""
+    entry = file_storage[file_id]
+    private_data = dataframe_nbytes(entry['data']) if entry.get('dataset_key') is None else 0
+    history_data = entry['history'].nbytes() if entry.get('history') is not None else 0
+    entry['nbytes'] = private_data + history_data + (
+        dataframe_nbytes(entry['cleaned_data']) if entry['cleaned_data'] is not None else 0)
+
+def detach_dataset(file_id):
+    """Copy-on-write: give file_id its own raw data/profile before they are modified"""
+    entry = file_storage[file_id]
+    key = entry.get('dataset_key')
+    if key is None:
+        return
+    record = dataset_storage.get(key)
+    if record is not None and record['profile'] is not None and entry.get('profile') is None:
+        entry['profile'] = copy.deepcopy(record['profile'])
+    if record is not None and entry.get('catalog') is None:
+        # Catalogs are never modified after they are built, so the reference is shared
+        entry['catalog'] = record['catalog']
+    entry['dataset_key'] = None
+    release_dataset(key)
+
+def bump_version(file_id):
+    """Data changed: issue ids from earlier analyses no longer apply"""
+    entry = file_storage[file_id]
+    entry['version'] = entry.get('version', 0) + 1
+    entry['issues'] = None
+
+def register_issues(file_id, analysis_report):
+    """Keep analysed issues server-side by id so /api/clean-issues only needs the ids"""
+    entry = file_storage[file_id]
+    entry['issues'] = {
+        'version': entry.get('version', 0),
+        'by_id': {issue["id"]: issue for issue in analysis_report}
+    }
+
+def dataframe_nbytes(df):
+    """Cheap size estimate (shallow memory usage) used for metrics and accounting"""
+    try:
+        return int(df.memory_usage(index=True, deep=False).sum())
+    except Exception:
+        return 0
+
 def prepare_dataframe_for_json(df):
     """
     Prepare a pandas DataFrame for JSON serialization by handling NaN values
@@ -79,8 +233,9 @@ def prepare_dataframe_for_json(df):
                 result_df[col] = [None] * len(result_df[col])
         
         # Replace NaN and infinity values with None for JSON serialization
-        # Using where instead of fillna as it's more reliable for this use case
-        result_df = result_df.where(pd.notnull(result_df), None)
+        # Using where instead of fillna as it's more reliable for this use case;
+        # object dtype first, since float columns would turn None back into NaN
+        result_df = result_df.astype(object).where(pd.notnull(result_df), None)
         # Replace infinity values with None
         result_df = result_df.replace([float('inf'), float('-inf')], None)
         
@@ -89,6 +244,115 @@ def prepare_dataframe_for_json(df):
         print(f"Error in prepare_dataframe_for_json: {str(e)}")
         raise
 
+def get_history(file_id):
+    """Version history of the file's cleaning rounds, rooted at its current raw data"""
+    entry = file_storage[file_id]
+    if entry.get('history') is None:
+        entry['history'] = VersionHistory(entry['data'])
+        # Version ids restart with a new history, so cached diffs no longer apply
+        entry['diff_counts'] = {}
+    return entry['history']
+
+def store_cleaned_result(file_id, df, label="clean"):
+    """Record df as a new history version and publish it as the current cleaned data"""
+    entry = file_storage[file_id]
+    history = get_history(file_id)
+    # The current version is materialized as cleaned_data (or the raw data for version 0)
+    parent_df = entry['cleaned_data'] if history.current != 0 and entry['cleaned_data'] is not None else entry['data']
+    with track_operation("history_commit", len(df)):
+        version = history.commit(entry['data'], parent_df, df, label, entry.get('steps', []))
+    result = publish_cleaned_result(file_id, df)
+    result["version"] = version
+    return result
+
+def publish_cleaned_result(file_id, df):
+    """Store cleaned data, write the CSV/XLSX exports and build the preview response"""
+    file_storage[file_id]['cleaned_data'] = df.copy()
+    file_storage[file_id]['cleaned_hash_index'] = None
+    bump_version(file_id)
+    # New cleaned version: charts computed for the previous one are stale
+    file_storage[file_id]['cleaned_charts'] = {}
+    update_storage_size(file_id)
+    
+    # Save cleaned files to tmp directory
+    tmp_dir = "/tmp"
+    csv_path = os.path.join(tmp_dir, f"{file_id}_cleaned.csv")
+    xlsx_path = os.path.join(tmp_dir, f"{file_id}_cleaned.xlsx")
+    
+    # Handle potential issues with large files
+    with track_operation("export", len(df)):
+        try:
+            df.to_csv(csv_path, index=False)
+            df.to_excel(xlsx_path, index=False)
+        except Exception as e:
+            print(f"Error saving files: {str(e)}")
+            # Continue with the response even if file saving fails
+        # Columnar copy for /api/query projection and predicate pushdown
+        write_columnar(df, parquet_path(file_id))
+    
+    # Return preview of cleaned data
+    preview_data = df.head(20)
+    # Handle different data types for JSON serialization
+    for col in preview_data.columns:
+        if preview_data[col].dtype == 'datetime64[ns]':
+            preview_data[col] = preview_data[col].astype(str)
+    
+    # Replace NaN values with None for JSON serialization
+    preview_data = preview_data.astype(object).where(pd.notnull(preview_data), None)
+    # Replace infinity values with None
+    preview_data = preview_data.replace([float('inf'), float('-inf')], None)
+    
+    # Convert to records
+    preview_records = preview_data.to_dict(orient='records')
+    
+    return {
+        "preview": preview_records,
+        "download_urls": {
+            "csv": f"/api/download/{file_id}?format=csv",
+            "xlsx": f"/api/download/{file_id}?format=xlsx"
+        },
+        "rows": len(df),
+        "columns": list(df.columns)
+    }
+
+# Admission estimates: handler arguments -> bytes the request is expected to need
+async def upload_size(file):
+    """Spooled upload size and its first SAMPLE_BYTES, read without loading the whole body"""
+    head = await file.read(SAMPLE_BYTES)
+    await file.seek(0)
+    size = file.size
+    if size is None:
+        size = file.file.seek(0, os.SEEK_END)
+        file.file.seek(0)
+    return size, head
+
+async def upload_memory(file, **_):
+    size, head = await upload_size(file)
+    return estimate_upload_bytes(file.filename, size, head)
+
+async def cleaning_memory(file_id=None, request=None, **_):
+    entry = file_storage.get(file_id if request is None else request.file_id)
+    return estimate_work_bytes(entry['data']) if entry is not None else 0
+
+async def finalize_memory(upload_id, **_):
+    # Incrementally parsed parts are already resident and are concatenated once. They are
+    # dropped before the spool file is parsed as a fallback, so the larger of the two is reserved.
+    session = upload_sessions.get(upload_id)
+    if session is None:
+        return 0
+    spool_parse = estimate_upload_bytes(session.filename, session.length, session.head(SAMPLE_BYTES), spooled=True)
+    parser = session.parser
+    if parser is not None and not parser.failed and parser.parts:
+        return max(sum(frame_nbytes(part) for part in parser.parts), spool_parse)
+    return spool_parse
+
+async def append_memory(file_id, file, **_):
+    # The delta is parsed like an upload, then concatenated into a new copy of the data
+    entry = file_storage.get(file_id)
+    if entry is None:
+        return 0
+    return await upload_memory(file) + 2 * frame_nbytes(entry['data'])
+
 class CleanOptions(BaseModel):
     remove_duplicates: bool = False
     harmonize_columns: bool = False
@@ -96,6 +360,25 @@ class CleanOptions(BaseModel):
     trim_whitespace: bool = False
     standardize_dates: bool = False
     reorder_columns: bool = False
+    # Industry-specific cleaning options
+    deduplicate_customers: bool = False
+    standardize_addresses: bool = False
+    normalize_phone_numbers: bool = False
+    validate_accounts: bool = False
+    detect_fraud_patterns: bool = False
+    standardize_transactions: bool = False
+    anonymize_data: bool = False
+    standardize_medical_codes: bool = False
+    validate_demographics: bool = False
+    smooth_sensor_data: bool = False
+    standardize_units: bool = False
+    interpolate_downtime: bool = False
+    fill_time_gaps: bool = False
+    adjust_seasonality: bool = False
+    normalize_promotions: bool = False
+    standardize_grades: bool = False
+    validate_student_ids: bool = False
+    harmonize_course_codes: bool = False
 
 class SuggestionResponse(BaseModel):
     suggestions: List[str]
@@ -109,70 +392,147 @@ class IndustryDetectionResponse(BaseModel):
 # Add a new model for issue-based cleaning
 class IssueBasedCleanRequest(BaseModel):
     file_id: str
-    selected_issues: List[str]
-    analysis_report: List[dict]
+    selected_issues: List[str]  # issue ids returned by /api/analyze
+
+# Saved cleaning recipe, recorded from a session (file_id) or given explicitly (steps)
+class RecipeCreateRequest(BaseModel):
+    name: str
+    file_id: Optional[str] = None
+    steps: Optional[List[dict]] = None
+
+# Projection/filter/aggregate query over a stored dataset
+class QueryFilter(BaseModel):
+    column: str
+    op: str  # eq, ne, lt, le, gt, ge, in, not_in, is_null, not_null, contains
+    value: Optional[object] = None
+
+class QueryAggregate(BaseModel):
+    func: str  # count, sum, mean, min, max, nunique
+    column: Optional[str] = None
+    alias: Optional[str] = None
+
+class QueryRequest(BaseModel):
+    columns: Optional[List[str]] = None
+    filters: List[QueryFilter] = []
+    group_by: List[str] = []
+    aggregates: List[QueryAggregate] = []
+    limit: Optional[int] = None
+    source: str = "latest"  # latest (cleaned if available), cleaned, raw
+    format: str = "csv"  # csv, jsonl
 
 @app.get("/")
 async def root():
     return {"message": "DataCleanr API is running"}
 
+@app.get("/metrics")
+async def metrics():
+    return PlainTextResponse(render_latest(), media_type="text/plain; version=0.0.4")
+
+@app.get("/api/profiles/{profile_id}")
+async def get_profile(profile_id: str, request: Request, format: str = "tree"):
+    if not is_admin_token(request.headers.get("x-admin-token")):
+        raise HTTPException(status_code=403, detail="Profiles are only available to admins")
+    if format not in ("tree", "folded"):
+        raise HTTPException(status_code=400, detail="Invalid format. Use 'tree' or 'folded'.")
+    if profile_id not in profile_storage:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    path = get_profile_path(profile_id, format)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile data not found")
+    if format == "tree":
+        return FileResponse(path, media_type="application/json", filename=f"{profile_id}.json")
+    return FileResponse(path, media_type="text/plain", filename=f"{profile_id}.folded")
+
+async def read_upload(file):
+    """Read an uploaded file in chunks, hashing as it arrives; stops as soon as it exceeds MAX_UPLOAD_SIZE"""
+    hasher = StreamingHasher()
+    while True:
+        chunk = await file.read(UPLOAD_CHUNK_SIZE)
+        if not chunk:
+            break
+        hasher.update(chunk)
+        if hasher.size > MAX_UPLOAD_SIZE:
+            raise HTTPException(status_code=413,
+                                detail=f"File size exceeds {MAX_UPLOAD_SIZE / 1024 ** 3:g}GB limit. Please upload a smaller file.")
+    return hasher
+
 @app.post("/api/upload")
+@admitted("upload", upload_memory)
 async def upload_file(file: UploadFile = File(...)):
+    hasher = await read_upload(file)
+    return ingest_upload(file.filename, hasher.hexdigest(), hasher.size,
+                         lambda: read_dataframe(file.filename, hasher.content()))
+
+def ingest_upload(filename, digest, size, parse):
+    """
+    Register an uploaded file under a new file_id and return its preview.
+    `parse()` produces the DataFrame and is only called when no dataset with
+    the same content hash is stored yet.
+    """
     try:
         # Generate unique file ID
         file_id = str(uuid.uuid4())
         
-        # Read file content with larger buffer
-        content = await file.read()
+        BYTES_INGESTED.inc(size, format=os.path.splitext(filename)[1].lstrip('.').lower() or "unknown")
         
-        # Check file size (limit to 1GB)
-        if len(content) > 1 * 1024 * 1024 * 1024:
-            raise HTTPException(status_code=400, detail="File size exceeds 1GB limit. Please upload a smaller file.")
-        
-        # Determine file type and read with pandas
-        if file.filename.endswith('.csv'):
-            try:
-                # Try to decode as UTF-8 first
-                df = pd.read_csv(io.StringIO(content.decode('utf-8')))
-            except UnicodeDecodeError:
-                # If that fails, try with latin-1 encoding
-                try:
-                    df = pd.read_csv(io.StringIO(content.decode('latin-1')))
-                except UnicodeDecodeError:
-                    raise HTTPException(status_code=400, detail="Unable to decode file. Please ensure it's a valid CSV file with UTF-8 or Latin-1 encoding.")
-        elif file.filename.endswith(('.xlsx', '.xls')):
-            df = pd.read_excel(io.BytesIO(content))
+        # Identical content parsed with the same settings is shared instead of parsed again
+        dataset_key = content_key(digest, filename)
+        record = acquire_dataset(dataset_key)
+        record_cache("parsed_dataset", record is not None)
+        if record is not None:
+            df = record['data']
+            print(f"Reusing parsed dataset for {filename} ({size} bytes)")
         else:
-            raise HTTPException(status_code=400, detail="Unsupported file format. Please upload a CSV or Excel file.")
-        
-        # Validate that we have data
-        if df.empty:
-            raise HTTPException(status_code=400, detail="Uploaded file is empty or contains no data.")
+            # Determine file type and read with pandas
+            try:
+                df = parse()
+            except DecompressedSizeError as e:
+                raise HTTPException(status_code=413, detail=str(e))
+            except (DataFormatError, ValueError) as e:
+                raise HTTPException(status_code=400, detail=str(e))
+            
+            # Validate that we have data
+            if df.empty:
+                raise HTTPException(status_code=400, detail="Uploaded file is empty or contains no data.")
+            record = register_dataset(dataset_key, df, dataframe_nbytes(df))
+            df = record['data']
         
-        # Store file data in memory
+        # Store file data in memory (the raw DataFrame is shared and must not be modified in place)
         file_storage[file_id] = {
-            'filename': file.filename,
-            'data': df.copy(),
-            'cleaned_data': None
+            'filename': filename,
+            'data': df,
+            'dataset_key': dataset_key,
+            'cleaned_data': None,
+            'steps': [],
+            'nbytes': 0,
+            'version': 0
         }
         
         # Return file_id and preview (first 20 rows)
-        preview_data = df.head(20)
-        # Handle NaN values and other non-JSON compliant data types
-        preview_data = prepare_dataframe_for_json(preview_data)
-        # Convert to records - this is where the error might occur
-        preview_records = preview_data.to_dict(orient='records')
-        return JSONResponse(
-            content={
-                "file_id": file_id,
-                "preview": preview_records,
-                "columns": list(df.columns)
-            },
-            headers={
-                "Access-Control-Allow-Origin": "http://localhost:3000",
-                "Access-Control-Allow-Credentials": "true"
-            }
-        )
+        try:
+            # Column roles are computed once at ingest and shared by every later operation
+            get_column_catalog(file_id)
+            preview_data = df.head(20)
+            # Handle NaN values and other non-JSON compliant data types
+            preview_data = prepare_dataframe_for_json(preview_data)
+            # Convert to records - this is where the error might occur
+            preview_records = preview_data.to_dict(orient='records')
+            return JSONResponse(
+                content={
+                    "file_id": file_id,
+                    "preview": preview_records,
+                    "columns": list(df.columns)
+                },
+                headers={
+                    "Access-Control-Allow-Origin": "http://localhost:3000",
+                    "Access-Control-Allow-Credentials": "true"
+                }
+            )
+        except Exception:
+            # Don't leak the dataset reference of an upload that never reached the client
+            file_storage.pop(file_id, None)
+            release_dataset(dataset_key)
+            raise
     
     except HTTPException:
         # Re-raise HTTP exceptions
@@ -193,38 +553,92 @@ async def upload_file(file: UploadFile = File(...)):
             pass
         raise HTTPException(status_code=500, detail=f"Error processing file: {str(e)}")
 
+def upload_status(session, status_code=200):
+    return JSONResponse(content=session.status(), status_code=status_code,
+                        headers={"Upload-Offset": str(session.offset)})
+
+@app.post("/api/uploads")
+async def create_upload(filename: str = Form(...), length: int = Form(...)):
+    if not filename.lower().endswith(SUPPORTED_EXTENSIONS):
+        raise HTTPException(status_code=400, detail="Unsupported file format. Please upload a CSV or Excel file (optionally gzip/bzip2/xz/zstd compressed or zipped).")
+    try:
+        session = create_session(filename, length)
+    except UploadError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    print(f"Started resumable upload {session.upload_id} for {filename} ({length} bytes)")
+    response = upload_status(session, status_code=201)
+    response.headers["Location"] = f"/api/uploads/{session.upload_id}"
+    return response
+
+@app.get("/api/uploads/{upload_id}")
+async def get_upload(upload_id: str):
+    try:
+        return upload_status(get_session(upload_id))
+    except UploadError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+
+@app.patch("/api/uploads/{upload_id}")
+async def upload_chunk(upload_id: str, request: Request):
+    """
+    Append one chunk. Headers: Upload-Offset (must equal the confirmed offset)
+    and Upload-Checksum ('sha256 <base64 digest>' of the body). Failed chunks
+    answer with the confirmed offset to resume from.
+    """
+    try:
+        session = get_session(upload_id)
+    except UploadError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    try:
+        offset = request.headers.get("Upload-Offset", "")
+        if not offset.isdigit():
+            raise UploadError(400, "Upload-Offset header must be the byte offset this chunk starts at")
+        checksum = parse_checksum(request.headers.get("Upload-Checksum"))
+        await session.write_chunk(int(offset), checksum, request.stream())
+    except UploadError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e), headers={"Upload-Offset": str(session.offset)})
+    except ClientDisconnect:
+        print(f"Upload {upload_id} lost its connection mid-chunk; confirmed offset stays at {session.offset}")
+        return Response(status_code=400)
+    return upload_status(session)
+
+@app.post("/api/uploads/{upload_id}/finalize")
+@admitted("upload", finalize_memory)
+async def finalize_upload(upload_id: str):
+    try:
+        session = get_session(upload_id)
+    except UploadError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    if session.busy or not session.complete:
+        raise HTTPException(status_code=409, detail=f"Upload is incomplete: {session.offset} of {session.length} bytes received",
+                            headers={"Upload-Offset": str(session.offset)})
+    session.busy = True
+    try:
+        # Rows parsed while chunks arrived are used as is; the spool file is parsed only as a fallback
+        df = await asyncio.to_thread(finalized_frame, session)
+        if df is None:
+            parse = lambda: read_dataframe(session.filename, path=session.path)
+        else:
+            print(f"Using {len(df)} rows parsed during upload {upload_id}")
+            parse = lambda: df
+        response = ingest_upload(session.filename, session.digest.hexdigest(), session.length, parse)
+    finally:
+        session.busy = False
+    # A failed finalize keeps the session (and its spool file) so the client can retry
+    remove_session(upload_id)
+    return response
+
+@app.delete("/api/uploads/{upload_id}")
+async def cancel_upload(upload_id: str):
+    if remove_session(upload_id) is None:
+        raise HTTPException(status_code=404, detail="Upload not found or expired")
+    return {"message": "Upload cancelled"}
+
 @app.post("/api/suggest")
 async def suggest_cleaning_steps(file_id: str = Form(...)):
     if file_id not in file_storage:
         raise HTTPException(status_code=404, detail="File not found")
     
-    df = file_storage[file_id]['data']
-    suggestions = []
-    
-    # Check for duplicates
-    if df.duplicated().any():
-        suggestions.append("remove_duplicates")
-    
-    # Check for columns with spaces or uppercase
-    if any(col != col.lower() or ' ' in col for col in df.columns):
-        suggestions.append("harmonize_columns")
-    
-    # Check for missing values
-    if df.isnull().any().any():
-        suggestions.append("handle_missing")
-    
-    # Check for string columns with leading/trailing whitespace
-    string_cols = df.select_dtypes(include=['object']).columns
-    if any(df[col].astype(str).str.strip().ne(df[col]).any() for col in string_cols):
-        suggestions.append("trim_whitespace")
-    
-    # Simple date column detection
-    for col in df.columns:
-        if 'date' in col.lower() or 'time' in col.lower():
-            suggestions.append("standardize_dates")
-            break
-    
-    return {"suggestions": suggestions}
+    return {"suggestions": suggest_dataset_steps(file_storage[file_id]['data'], get_column_catalog(file_id))}
 
 # New endpoint for industry detection
 @app.post("/api/detect-industry")
@@ -238,198 +652,7 @@ def detect_industry_internal(file_id: str):
     if file_id not in file_storage:
         raise HTTPException(status_code=404, detail="File not found")
     
-    df = file_storage[file_id]['data']
-    filename = file_storage[file_id]['filename']
-    
-    # Analyze column names and data for industry patterns
-    column_names = [col.lower() for col in df.columns]
-    industry_scores = {
-        "retail_ecommerce": 0,
-        "finance_banking": 0,
-        "healthcare": 0,
-        "manufacturing": 0,
-        "demand_planning": 0,
-        "education": 0,
-        "law_enforcement": 0
-    }
-    
-    # Check for industry-specific column patterns
-    # Retail/E-commerce indicators
-    retail_keywords = ['product', 'customer', 'order', 'sku', 'price', 'sales', 'purchase', 'cart', 'inventory', 'transaction', 'shipping', 'delivery', 'benefit', 'segment']
-    for keyword in retail_keywords:
-        if any(keyword in col for col in column_names):
-            industry_scores["retail_ecommerce"] += 1
-    
-    # Finance/Banking indicators
-    finance_keywords = ['account', 'transaction', 'balance', 'credit', 'debit', 'loan', 'interest', 'currency', 'benefit']
-    for keyword in finance_keywords:
-        if any(keyword in col for col in column_names):
-            industry_scores["finance_banking"] += 1
-    
-    # Healthcare indicators
-    healthcare_keywords = ['patient', 'doctor', 'diagnosis', 'treatment', 'medical', 'hospital', 'clinic', 'insurance', 'claim']
-    for keyword in healthcare_keywords:
-        if any(keyword in col for col in column_names):
-            industry_scores["healthcare"] += 1
-    
-    # Manufacturing indicators
-    manufacturing_keywords = ['production', 'machine', 'sensor', 'equipment', 'maintenance', 'quality', 'defect']
-    for keyword in manufacturing_keywords:
-        if any(keyword in col for col in column_names):
-            industry_scores["manufacturing"] += 1
-    
-    # Demand Planning indicators
-    demand_keywords = ['demand', 'forecast', 'planning', 'inventory', 'supply', 'chain', 'stock', 'reorder']
-    for keyword in demand_keywords:
-        if any(keyword in col for col in column_names):
-            industry_scores["demand_planning"] += 1
-    
-    # Education indicators
-    education_keywords = ['student', 'course', 'grade', 'score', 'exam', 'assignment', 'gpa', 'degree', 'major', 'faculty', 'department', 'enrollment', 'academic', 'semester', 'tuition']
-    for keyword in education_keywords:
-        if any(keyword in col for col in column_names):
-            industry_scores["education"] += 1
-    
-    # Law Enforcement indicators
-    law_enforcement_keywords = ['crime', 'offense', 'incident', 'case', 'arrest', 'charge', 'violation', 
-                               'weapon', 'battery', 'assault', 'robbery', 'theft', 'trespass', 
-                               'domestic', 'location', 'date', 'primary_type', 'description', 'updated_on']
-    for keyword in law_enforcement_keywords:
-        if any(keyword in col for col in column_names):
-            industry_scores["law_enforcement"] += 1
-    
-    # Additional data content analysis
-    if not df.empty:
-        # Sample a few rows to analyze actual data content
-        sample_data = df.head(min(5, len(df)))
-        
-        # Check for retail/ecommerce-specific values
-        retail_data_indicators = ['shipping', 'delivery', 'customer', 'sales', 'benefit']
-        for col in df.columns:
-            col_lower = col.lower()
-            # Check column values for retail indicators
-            if any(indicator in col_lower for indicator in ['delivery', 'shipping']):
-                values = sample_data[col].dropna().astype(str).str.lower()
-                if any('shipping' in val or 'delivery' in val for val in values):
-                    industry_scores["retail_ecommerce"] += 1
-            
-            # Check for customer-related data
-            if 'customer' in col_lower:
-                if sample_data[col].notna().any():
-                    industry_scores["retail_ecommerce"] += 1
-                    
-            # Check for sales/benefit related data
-            if any(indicator in col_lower for indicator in ['sales', 'benefit', 'price']):
-                if sample_data[col].notna().any():
-                    industry_scores["retail_ecommerce"] += 1
-        
-        # Check for finance-specific values
-        finance_data_indicators = ['account', 'balance', 'credit', 'debit', 'loan', 'interest']
-        for col in df.columns:
-            col_lower = col.lower()
-            if any(indicator in col_lower for indicator in finance_data_indicators):
-                if sample_data[col].notna().any():
-                    industry_scores["finance_banking"] += 1
-        
-        # Check for healthcare-specific values
-        healthcare_data_indicators = ['patient', 'doctor', 'diagnosis', 'treatment', 'medical']
-        for col in df.columns:
-            col_lower = col.lower()
-            if any(indicator in col_lower for indicator in healthcare_data_indicators):
-                if sample_data[col].notna().any():
-                    industry_scores["healthcare"] += 1
-        
-        # Check for education-specific values
-        education_data_indicators = ['student', 'course', 'grade', 'score', 'exam']
-        for col in df.columns:
-            col_lower = col.lower()
-            if any(indicator in col_lower for indicator in education_data_indicators):
-                if sample_data[col].notna().any():
-                    industry_scores["education"] += 1
-    
-    # Additional education detection based on file name
-    education_file_indicators = ['course', 'class', 'education', 'school', 'university', 'student', 'academy']
-    filename_lower = filename.lower()
-    if any(indicator in filename_lower for indicator in education_file_indicators):
-        industry_scores["education"] += 2
-    
-    # Course-related column matching (made more specific)
-    course_related_columns = ['название курса', 'course', 'название', 'title', 'price', 'цена', 'кол-во', 'quantity', 'total', 'всего', 'sale', 'дата']
-    course_matches = sum(1 for col in column_names if any(keyword in col for keyword in course_related_columns))
-    
-    # Increased threshold to avoid false positives
-    if course_matches >= 5:
-        industry_scores["education"] += 2
-    
-    # Determine the industry with highest score
-    detected_industry = max(industry_scores, key=industry_scores.get)
-    max_score = industry_scores[detected_industry]
-    
-    # Calculate confidence based on matched keywords vs. total possible for that industry
-    if max_score > 0:
-        if detected_industry == "retail_ecommerce":
-            max_possible = len(retail_keywords) + 5  # +5 for potential data content matches
-        elif detected_industry == "finance_banking":
-            max_possible = len(finance_keywords) + 5
-        elif detected_industry == "healthcare":
-            max_possible = len(healthcare_keywords) + 5
-        elif detected_industry == "manufacturing":
-            max_possible = len(manufacturing_keywords) + 5
-        elif detected_industry == "demand_planning":
-            max_possible = len(demand_keywords) + 5
-        elif detected_industry == "education":
-            max_possible = len(education_keywords) + 2  # +2 for filename boost
-        elif detected_industry == "law_enforcement":
-            max_possible = len(law_enforcement_keywords) + 5
-        else:
-            max_possible = max_score
-        
-        confidence = min(max_score / max_possible, 1.0) if max_possible > 0 else 0.0
-    else:
-        confidence = 0.0
-    
-    # Only classify if confidence meets minimum threshold
-    MIN_CONFIDENCE_THRESHOLD = 0.1
-    if confidence < MIN_CONFIDENCE_THRESHOLD:
-        final_industry = "General"
-        confidence = 0.0
-        features = []
-    else:
-        # Generate features list for the response
-        features = []
-        if detected_industry == "retail_ecommerce":
-            features = [kw for kw in retail_keywords if any(kw in col for col in column_names)]
-        elif detected_industry == "finance_banking":
-            features = [kw for kw in finance_keywords if any(kw in col for col in column_names)]
-        elif detected_industry == "healthcare":
-            features = [kw for kw in healthcare_keywords if any(kw in col for col in column_names)]
-        elif detected_industry == "manufacturing":
-            features = [kw for kw in manufacturing_keywords if any(kw in col for col in column_names)]
-        elif detected_industry == "demand_planning":
-            features = [kw for kw in demand_keywords if any(kw in col for col in column_names)]
-        elif detected_industry == "education":
-            features = [kw for kw in education_keywords if any(kw in col for col in column_names)]
-        elif detected_industry == "law_enforcement":
-            features = [kw for kw in law_enforcement_keywords if any(kw in col for col in column_names)]
-
-        # Convert industry code to readable format
-        industry_mapping = {
-            "retail_ecommerce": "Retail/E-commerce",
-            "finance_banking": "Finance/Banking",
-            "healthcare": "Healthcare",
-            "manufacturing": "Manufacturing",
-            "demand_planning": "Demand Planning/Business Forecasting",
-            "education": "Education",
-            "law_enforcement": "Law Enforcement"
-        }
-        
-        final_industry = industry_mapping.get(detected_industry, "General")
-    
-    return {
-        "industry": final_industry,
-        "confidence": round(confidence, 2),
-        "features": features[:5]  # Top 5 matching features
-    }
+    return detect_dataset_industry(file_storage[file_id]['data'], file_storage[file_id]['filename'])
 
 # New endpoint for industry-specific suggestions
 @app.post("/api/industry-suggestions")
@@ -446,30 +669,7 @@ async def industry_suggestions(file_id: str = Form(...)):
     basic_suggestions = basic_suggestions_response["suggestions"]
     
     # Add industry-specific suggestions
-    industry_suggestions = []
-    description = ""
-    
-    if industry == "Retail/E-commerce":
-        industry_suggestions = ["deduplicate_customers", "standardize_addresses", "normalize_phone_numbers"]
-        description = "Retail data often contains duplicate customer records, inconsistent addresses, and varied phone number formats."
-    elif industry == "Finance/Banking":
-        industry_suggestions = ["validate_accounts", "detect_fraud_patterns", "standardize_transactions"]
-        description = "Financial data requires account validation, fraud pattern detection, and transaction standardization."
-    elif industry == "Healthcare":
-        industry_suggestions = ["anonymize_data", "standardize_medical_codes", "validate_demographics"]
-        description = "Healthcare data needs anonymization for HIPAA compliance, medical code standardization, and demographic validation."
-    elif industry == "Manufacturing":
-        industry_suggestions = ["smooth_sensor_data", "standardize_units", "interpolate_downtime"]
-        description = "Manufacturing data often has sensor noise, unit inconsistencies, and equipment downtime gaps."
-    elif industry == "Demand Planning/Business Forecasting":
-        industry_suggestions = ["fill_time_gaps", "adjust_seasonality", "normalize_promotions"]
-        description = "Demand planning data requires time series gap filling, seasonal adjustments, and promotion impact normalization."
-    elif industry == "Education":
-        industry_suggestions = ["standardize_grades", "validate_student_ids", "harmonize_course_codes"]
-        description = "Educational data often contains student records, course information, and grade data that needs standardization."
-    else:
-        industry_suggestions = []
-        description = "General data cleaning suggestions based on detected data quality issues."
+    industry_suggestions, description = industry_cleaning_suggestions(industry)
     
     # Combine basic and industry-specific suggestions
     all_suggestions = list(set(basic_suggestions + industry_suggestions))
@@ -481,6 +681,8 @@ async def industry_suggestions(file_id: str = Form(...)):
     }
 
 @app.post("/api/clean")
+@admitted("clean", cleaning_memory)
+@job("clean")
 async def clean_data(file_id: str = Form(...), 
                      remove_duplicates: bool = Form(False),
                      harmonize_columns: bool = Form(False),
@@ -515,223 +717,36 @@ async def clean_data(file_id: str = Form(...),
     df = file_storage[file_id]['data'].copy()
     
     # Apply cleaning operations
-    if remove_duplicates:
-        original_rows = len(df)
-        df = df.drop_duplicates()
-        print(f"Removed {original_rows - len(df)} duplicate rows")
-    
-    if harmonize_columns:
-        original_columns = df.columns.tolist()
-        df.columns = (df.columns
-                      .str.replace(' ', '_')
-                      .str.replace('[^a-zA-Z0-9_]', '', regex=True)
-                      .str.lower())
-        print(f"Harmonized columns: {original_columns} -> {df.columns.tolist()}")
-    
-    if handle_missing != "none":
-        missing_count = df.isnull().sum().sum()
-        if handle_missing == "drop":
-            df = df.dropna()
-            print(f"Dropped {missing_count} missing values")
-        elif handle_missing == "fill_mean":
-            numeric_columns = df.select_dtypes(include=['number']).columns
-            for col in numeric_columns:
-                mean_val = df[col].mean()
-                df[col] = df[col].fillna(mean_val)
-            print(f"Filled missing values with mean for columns: {numeric_columns.tolist()}")
-        elif handle_missing == "fill_zero":
-            df = df.fillna(0)
-            print(f"Filled all missing values with zero")
-    
-    if trim_whitespace:
-        string_columns = df.select_dtypes(include=['object']).columns
-        for col in string_columns:
-            df[col] = df[col].apply(lambda x: x.strip() if isinstance(x, str) else x)
-        print(f"Trimmed whitespace for columns: {string_columns.tolist()}")
-    
-    if standardize_dates:
-        # Enhanced date standardization to handle various formats
-        for col in df.columns:
-            if 'date' in col.lower() or 'time' in col.lower() or 'дата' in col.lower():  # Include Russian "дата" (date)
-                try:
-                    # Try to convert to datetime with multiple format attempts
-                    # This will handle mixed formats in the same column
-                    df[col] = pd.to_datetime(df[col], infer_datetime_format=True, errors='coerce')
-                    
-                    # Format all dates consistently as YYYY-MM-DD
-                    df[col] = df[col].dt.strftime('%Y-%m-%d')
-                except Exception as e:
-                    print(f"Could not standardize date column {col}: {e}")
-    
-    if reorder_columns:
-        original_order = df.columns.tolist()
-        df = df.reindex(sorted(df.columns), axis=1)
-        print(f"Reordered columns: {original_order} -> {df.columns.tolist()}")
-    
-    # Industry-specific cleaning operations
-    # Retail/E-commerce
-    if deduplicate_customers:
-        # Simplified customer deduplication based on common fields
-        customer_identifiers = [col for col in df.columns if any(keyword in col.lower() for keyword in ['customer', 'client', 'user', 'name', 'email'])]
-        if len(customer_identifiers) >= 2:  # Need at least 2 identifiers to deduplicate
-            original_rows = len(df)
-            df = df.drop_duplicates(subset=customer_identifiers)
-            print(f"Removed {original_rows - len(df)} duplicate customer rows")
-
-    if standardize_addresses:
-        address_columns = [col for col in df.columns if 'address' in col.lower()]
-        # Basic address standardization - remove extra whitespace
-        for col in address_columns:
-            if col in df.columns:
-                df[col] = df[col].apply(lambda x: str(x).strip().title() if pd.notnull(x) else x)
-        print(f"Standardized address columns: {address_columns}")
-
-    if normalize_phone_numbers:
-        phone_columns = [col for col in df.columns if any(keyword in col.lower() for keyword in ['phone', 'mobile', 'tel'])]
-        # Basic phone number normalization - remove non-digits
-        for col in phone_columns:
-            if col in df.columns:
-                df[col] = df[col].apply(lambda x: str(x).replace('-', '').replace(' ', '').replace('(', '').replace(')', '') if pd.notnull(x) else x)
-        print(f"Normalized phone number columns: {phone_columns}")
-
-    # Finance/Banking
-    if validate_accounts:
-        account_columns = [col for col in df.columns if any(keyword in col.lower() for keyword in ['account', 'acct'])]
-        # Basic account number validation - ensure consistent format
-        for col in account_columns:
-            if col in df.columns:
-                df[col] = df[col].apply(lambda x: ''.join(filter(str.isalnum, str(x))) if pd.notnull(x) else x)
-        print(f"Validated account columns: {account_columns}")
-
-    # Healthcare
-    if anonymize_data:
-        # Simplified anonymization - remove or obfuscate sensitive columns
-        sensitive_columns = [col for col in df.columns if any(keyword in col.lower() for keyword in ['name', 'address', 'phone', 'ssn', 'social'])]
-        for col in sensitive_columns:
-            if col in df.columns:
-                df[col] = '***REDACTED***'
-        print(f"Anonymized sensitive columns: {sensitive_columns}")
-
-    if standardize_medical_codes:
-        # Look for columns that might contain medical codes
-        code_columns = [col for col in df.columns if any(keyword in col.lower() for keyword in ['code', 'icd', 'cpt'])]
-        # Basic standardization - uppercase and strip
-        for col in code_columns:
-            if col in df.columns:
-                df[col] = df[col].apply(lambda x: str(x).strip().upper() if pd.notnull(x) else x)
-        print(f"Standardized medical code columns: {code_columns}")
-
-    # Manufacturing
-    if smooth_sensor_data:
-        # Simplified sensor data smoothing for numeric columns
-        numeric_columns = df.select_dtypes(include=['number']).columns
-        # Apply rolling mean to smooth data (window of 3)
-        for col in numeric_columns:
-            if df[col].count() > 10:  # Only smooth if we have enough data points
-                original_series = df[col].copy()
-                df[col] = df[col].rolling(window=3, center=True).mean()
-                # Fill NaN values that might be created by rolling mean
-                df[col] = df[col].fillna(method='ffill').fillna(method='bfill').fillna(original_series)
-        print(f"Smoothed sensor data for columns: {numeric_columns.tolist()}")
-
-    if standardize_units:
-        # Look for columns with units in their names
-        unit_columns = [col for col in df.columns if any(keyword in col.lower() for keyword in ['temp', 'temperature', 'pressure', 'weight', 'length'])]
-        # This is a simplified implementation - real implementation would need more context
-        # Just ensuring numeric data in these columns
-        for col in unit_columns:
-            if col in df.columns:
-                original_series = df[col].copy()
-                df[col] = pd.to_numeric(df[col], errors='coerce')
-                # Fill NaN values that might be created by to_numeric with original values
-                df[col] = df[col].fillna(original_series)
-        print(f"Standardized unit columns: {unit_columns}")
-
-    # Demand Planning
-    if fill_time_gaps:
-        # Check for date columns and fill gaps
-        date_columns = [col for col in df.columns if any(keyword in col.lower() for keyword in ['date', 'time', 'дата'])]
-        if date_columns:
-            # Simplified time gap filling
-            date_col = date_columns[0]
-            try:
-                df[date_col] = pd.to_datetime(df[date_col], infer_datetime_format=True, errors='coerce')
-                df = df.sort_values(by=date_col)
-                # Format consistently
-                df[date_col] = df[date_col].dt.strftime('%Y-%m-%d')
-            except Exception as e:
-                print(f"Could not process date column {date_col}: {e}")
-            print(f"Filled time gaps in date column: {date_col}")
-    
-    # Education
-    if standardize_grades:
-        # Look for columns that might contain grades
-        grade_columns = [col for col in df.columns if any(keyword in col.lower() for keyword in ['grade', 'score', 'gpa'])]
-        # Standardize grade values (e.g., convert letter grades to a consistent format)
-        for col in grade_columns:
-            if col in df.columns:
-                df[col] = df[col].apply(lambda x: str(x).strip().upper() if pd.notnull(x) else x)
-        print(f"Standardized grade columns: {grade_columns}")
-
-    if validate_student_ids:
-        # Look for student ID columns
-        student_id_columns = [col for col in df.columns if any(keyword in col.lower() for keyword in ['student', 'id', 'sid'])]
-        # Basic student ID validation - ensure consistent format
-        for col in student_id_columns:
-            if col in df.columns:
-                # Remove spaces and ensure consistent format
-                df[col] = df[col].apply(lambda x: str(x).replace(' ', '') if pd.notnull(x) else x)
-        print(f"Validated student ID columns: {student_id_columns}")
-
-    if harmonize_course_codes:
-        # Look for course code columns
-        course_columns = [col for col in df.columns if any(keyword in col.lower() for keyword in ['course', 'class'])]
-        # Standardize course codes
-        for col in course_columns:
-            if col in df.columns:
-                df[col] = df[col].apply(lambda x: str(x).strip().upper() if pd.notnull(x) else x)
-        print(f"Harmonized course code columns: {course_columns}")
-    
-    # Store cleaned data
-    file_storage[file_id]['cleaned_data'] = df.copy()
-    
-    # Save cleaned files to tmp directory
-    tmp_dir = "/tmp"
-    csv_path = os.path.join(tmp_dir, f"{file_id}_cleaned.csv")
-    xlsx_path = os.path.join(tmp_dir, f"{file_id}_cleaned.xlsx")
-    
-    # Handle potential issues with large files
-    try:
-        df.to_csv(csv_path, index=False)
-        df.to_excel(xlsx_path, index=False)
-    except Exception as e:
-        print(f"Error saving files: {str(e)}")
-        # Continue with the response even if file saving fails
-    
-    # Return preview of cleaned data
-    preview_data = df.head(20)
-    # Handle different data types for JSON serialization
-    for col in preview_data.columns:
-        if preview_data[col].dtype == 'datetime64[ns]':
-            preview_data[col] = preview_data[col].astype(str)
-    
-    # Replace NaN values with None for JSON serialization
-    preview_data = preview_data.where(pd.notnull(preview_data), None)
-    # Replace infinity values with None
-    preview_data = preview_data.replace([float('inf'), float('-inf')], None)
-    
-    # Convert to records
-    preview_records = preview_data.to_dict(orient='records')
-    
-    return {
-        "preview": preview_records,
-        "download_urls": {
-            "csv": f"/api/download/{file_id}?format=csv",
-            "xlsx": f"/api/download/{file_id}?format=xlsx"
-        },
-        "rows": len(df),
-        "columns": list(df.columns)
-    }
+    options = dict(remove_duplicates=remove_duplicates,
+                   harmonize_columns=harmonize_columns,
+                   handle_missing=handle_missing,
+                   trim_whitespace=trim_whitespace,
+                   standardize_dates=standardize_dates,
+                   reorder_columns=reorder_columns,
+                   deduplicate_customers=deduplicate_customers,
+                   standardize_addresses=standardize_addresses,
+                   normalize_phone_numbers=normalize_phone_numbers,
+                   validate_accounts=validate_accounts,
+                   detect_fraud_patterns=detect_fraud_patterns,
+                   standardize_transactions=standardize_transactions,
+                   anonymize_data=anonymize_data,
+                   standardize_medical_codes=standardize_medical_codes,
+                   validate_demographics=validate_demographics,
+                   smooth_sensor_data=smooth_sensor_data,
+                   standardize_units=standardize_units,
+                   interpolate_downtime=interpolate_downtime,
+                   fill_time_gaps=fill_time_gaps,
+                   adjust_seasonality=adjust_seasonality,
+                   normalize_promotions=normalize_promotions,
+                   standardize_grades=standardize_grades,
+                   validate_student_ids=validate_student_ids,
+                   harmonize_course_codes=harmonize_course_codes)
+    df = clean_dataframe(df, catalog=get_column_catalog(file_id), **options)
+    
+    # Record the session so it can be saved as a recipe (clean always starts from the raw data)
+    file_storage[file_id]['steps'] = [{"kind": "clean", "options": options}]
+    
+    return store_cleaned_result(file_id, df)
 
 @app.get("/api/download/{file_id}")
 async def download_file(file_id: str, format: str = "csv"):
@@ -744,16 +759,89 @@ async def download_file(file_id: str, format: str = "csv"):
         file_path = os.path.join(tmp_dir, f"{file_id}_cleaned.csv")
         if not os.path.exists(file_path):
             raise HTTPException(status_code=404, detail="Cleaned file not found")
+        BYTES_EXPORTED.inc(os.path.getsize(file_path), format="csv")
         return FileResponse(file_path, filename=f"cleaned_{file_storage[file_id]['filename'].rsplit('.', 1)[0]}.csv")
     elif format == "xlsx":
         file_path = os.path.join(tmp_dir, f"{file_id}_cleaned.xlsx")
         if not os.path.exists(file_path):
             raise HTTPException(status_code=404, detail="Cleaned file not found")
+        BYTES_EXPORTED.inc(os.path.getsize(file_path), format="xlsx")
         return FileResponse(file_path, filename=f"cleaned_{file_storage[file_id]['filename'].rsplit('.', 1)[0]}.xlsx")
     else:
         raise HTTPException(status_code=400, detail="Invalid format. Use 'csv' or 'xlsx.")
 
+@app.post("/api/batch/clean")
+@job("batch_clean")
+async def batch_clean(files: Optional[List[UploadFile]] = File(None),
+                      directory: Optional[str] = Form(None),
+                      options: str = Form("{}"),
+                      concurrency: int = Form(4),
+                      output_format: str = Form("csv")):
+    if output_format not in ("csv", "xlsx"):
+        raise HTTPException(status_code=400, detail="Invalid format. Use 'csv' or 'xlsx'.")
+    try:
+        clean_options = CleanOptions(**json.loads(options))
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Invalid cleaning options: {str(e)}")
+    if not files and not directory:
+        raise HTTPException(status_code=400, detail="Provide files or a server-side directory to process.")
+    
+    batch_id = str(uuid.uuid4())
+    inputs = []
+    
+    if directory:
+        try:
+            inputs.extend(resolve_server_directory(directory))
+        except PermissionError as e:
+            raise HTTPException(status_code=403, detail=str(e))
+        except FileNotFoundError as e:
+            raise HTTPException(status_code=404, detail=str(e))
+    
+    if files:
+        # Spool uploads to disk so worker processes read them by path instead of pickled bytes
+        input_dir = os.path.join(batch_dir(batch_id), "input")
+        os.makedirs(input_dir, exist_ok=True)
+        for index, upload in enumerate(files):
+            name = os.path.basename(upload.filename or f"file_{index}.csv")
+            path = os.path.join(input_dir, f"{index:04d}_{name}")
+            with open(path, "wb") as f:
+                shutil.copyfileobj(upload.file, f, 1024 * 1024)
+            size = os.path.getsize(path)
+            if size > 1 * 1024 * 1024 * 1024:
+                raise HTTPException(status_code=400, detail=f"File '{name}' exceeds 1GB limit.")
+            BYTES_INGESTED.inc(size, format=os.path.splitext(name)[1].lstrip('.').lower() or "unknown")
+            inputs.append((name, path))
+    
+    if not inputs:
+        raise HTTPException(status_code=400, detail="No CSV or Excel files found to process.")
+    
+    results, archive_path = await run_batch(batch_id, inputs, clean_options.model_dump(),
+                                            concurrency=concurrency, output_format=output_format)
+    batch_storage[batch_id] = {'archive_path': archive_path, 'results': results}
+    
+    succeeded = sum(1 for result in results if result["status"] == "success")
+    print(f"Batch {batch_id}: {succeeded}/{len(results)} files cleaned")
+    return {
+        "batch_id": batch_id,
+        "files": len(results),
+        "succeeded": succeeded,
+        "failed": len(results) - succeeded,
+        "results": results,
+        "download_url": f"/api/batch/{batch_id}/download"
+    }
+
+@app.get("/api/batch/{batch_id}/download")
+async def download_batch(batch_id: str):
+    if batch_id not in batch_storage:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    archive_path = batch_storage[batch_id]['archive_path']
+    if not os.path.exists(archive_path):
+        raise HTTPException(status_code=404, detail="Batch archive not found")
+    BYTES_EXPORTED.inc(os.path.getsize(archive_path), format="zip")
+    return FileResponse(archive_path, media_type="application/zip", filename=f"cleaned_batch_{batch_id}.zip")
+
 @app.post("/api/analyze")
+@job("analyze")
 async def analyze_data_quality(file_id: str = Form(...)):
     if file_id not in file_storage:
         raise HTTPException(status_code=404, detail="File not found")
@@ -766,146 +854,18 @@ async def analyze_data_quality(file_id: str = Form(...)):
         df = file_storage[file_id]['data']
         is_cleaned = False
     
-    analysis_report = []
-    
-    # 1. Check for duplicates
-    duplicate_count = df.duplicated().sum()
-    if duplicate_count > 0:
-        analysis_report.append({
-            "type": "duplicate_rows",
-            "severity": "medium",
-            "description": f"Found {duplicate_count} duplicate rows",
-            "recommendation": "Remove duplicates to ensure data integrity"
-        })
-    
-    # 2. Check for missing values
-    missing_data = df.isnull().sum()
-    total_cells = df.size
-    total_missing = missing_data.sum()
-    
-    if total_missing > 0:
-        missing_percentage = (total_missing / total_cells) * 100
-        analysis_report.append({
-            "type": "missing_values",
-            "severity": "high" if missing_percentage > 10 else "medium" if missing_percentage > 5 else "low",
-            "description": f"Missing values detected: {total_missing} out of {total_cells} ({missing_percentage:.2f}%)",
-            "recommendation": "Handle missing values using appropriate strategy (drop, fill with mean/median, etc.)"
-        })
-        
-        # Detailed missing values by column
-        for column, missing_count in missing_data.items():
-            if missing_count > 0:
-                column_missing_percentage = (missing_count / len(df)) * 100
-                analysis_report.append({
-                    "type": "missing_values_column",
-                    "severity": "high" if column_missing_percentage > 30 else "medium" if column_missing_percentage > 10 else "low",
-                    "description": f"Column '{column}' has {missing_count} missing values ({column_missing_percentage:.2f}%)",
-                    "recommendation": f"Consider handling missing values in '{column}' specifically"
-                })
-    
-    # 3. Check for data type inconsistencies
-    for column in df.columns:
-        if df[column].dtype == 'object':
-            # Check if numeric values are stored as strings
-            non_null_series = df[column].dropna()
-            if len(non_null_series) > 0:
-                # Try to convert to numeric and see if it works for most values
-                numeric_count = pd.to_numeric(non_null_series, errors='coerce').notna().sum()
-                if numeric_count > len(non_null_series) * 0.8 and numeric_count < len(non_null_series):
-                    analysis_report.append({
-                        "type": "data_type_inconsistency",
-                        "severity": "medium",
-                        "description": f"Column '{column}' contains mixed data types (mostly numeric but stored as strings)",
-                        "recommendation": f"Convert '{column}' to numeric data type for better analysis"
-                    })
-    
-    # 4. Check for columns with spaces or special characters in names
-    problematic_columns = [col for col in df.columns if any(c in col for c in [' ', '-', '.', '/', '\\', '(', ')'])]
-    if problematic_columns:
-        analysis_report.append({
-            "type": "column_naming",
-            "severity": "low",
-            "description": f"Columns with special characters detected: {', '.join(problematic_columns)}",
-            "recommendation": "Standardize column names to use only alphanumeric characters and underscores"
-        })
-    
-    # 5. Check for columns with only one unique value (potential redundant columns)
-    single_value_columns = [col for col in df.columns if df[col].nunique() <= 1 and len(df[col].dropna()) > 0]
-    if single_value_columns:
-        analysis_report.append({
-            "type": "single_value_columns",
-            "severity": "low",
-            "description": f"Columns with only one unique value: {', '.join(single_value_columns)}",
-            "recommendation": "Consider removing columns with only one value as they provide no analytical value"
-        })
-    
-    # 6. Check for outliers in numeric columns
-    numeric_columns = df.select_dtypes(include=['number']).columns
-    for column in numeric_columns:
-        if len(df[column].dropna()) > 0:
-            Q1 = df[column].quantile(0.25)
-            Q3 = df[column].quantile(0.75)
-            IQR = Q3 - Q1
-            lower_bound = Q1 - 1.5 * IQR
-            upper_bound = Q3 + 1.5 * IQR
-            outliers = df[(df[column] < lower_bound) | (df[column] > upper_bound)][column]
-            
-            if len(outliers) > 0:
-                outlier_percentage = (len(outliers) / len(df)) * 100
-                analysis_report.append({
-                    "type": "outliers",
-                    "severity": "high" if outlier_percentage > 5 else "medium",
-                    "description": f"Column '{column}' contains {len(outliers)} outliers ({outlier_percentage:.2f}%)",
-                    "recommendation": f"Investigate outliers in '{column}' using visualization or statistical methods"
-                })
-    
-    # 7. Check for string columns with leading/trailing whitespace
-    string_columns = df.select_dtypes(include=['object']).columns
-    for column in string_columns:
-        if df[column].astype(str).str.strip().ne(df[column]).any():
-            analysis_report.append({
-                "type": "whitespace_issues",
-                "severity": "low",
-                "description": f"Column '{column}' contains leading/trailing whitespace",
-                "recommendation": f"Trim whitespace in '{column}' for consistency"
-            })
-    
-    # 8. Check for inconsistent date formats
-    date_columns = [col for col in df.columns if any(keyword in col.lower() for keyword in ['date', 'time', 'дата'])]
-    for column in date_columns:
-        if df[column].dtype == 'object':
-            # Try to parse dates and see if there are parsing errors
-            try:
-                pd.to_datetime(df[column].head(100), errors='raise')
-            except:
-                analysis_report.append({
-                    "type": "date_format_inconsistency",
-                    "severity": "medium",
-                    "description": f"Column '{column}' has inconsistent date formats",
-                    "recommendation": f"Standardize date formats in '{column}'"
-                })
-    
-    # 9. Check for data size issues
-    if len(df) == 0:
-        analysis_report.append({
-            "type": "empty_dataset",
-            "severity": "critical",
-            "description": "Dataset is empty",
-            "recommendation": "Upload a non-empty dataset"
-        })
-    elif len(df) > 100000:
-        analysis_report.append({
-            "type": "large_dataset",
-            "severity": "info",
-            "description": f"Large dataset detected ({len(df)} rows)",
-            "recommendation": "Processing may take longer for large datasets"
-        })
+    # Raw analysis of a shared (content-addressed) dataset is computed once
+    record = None if is_cleaned else dataset_storage.get(file_storage[file_id].get('dataset_key'))
+    if record is not None:
+        record_cache("analysis", record['analysis'] is not None)
+        if record['analysis'] is not None:
+            register_issues(file_id, record['analysis']['analysis_report'])
+            return {**record['analysis'], "file_id": file_id}
     
-    # Sort by severity (critical, high, medium, low, info)
-    severity_order = {"critical": 0, "high": 1, "medium": 2, "low": 3, "info": 4}
-    analysis_report.sort(key=lambda x: severity_order.get(x["severity"], 5))
+    analysis_report = analyze_dataframe(df, get_column_catalog(file_id))
+    register_issues(file_id, analysis_report)
     
-    return {
+    result = {
         "file_id": file_id,
         "is_cleaned": is_cleaned,
         "total_rows": len(df),
@@ -913,114 +873,476 @@ async def analyze_data_quality(file_id: str = Form(...)):
         "issues_found": len(analysis_report),
         "analysis_report": analysis_report
     }
+    if record is not None:
+        record['analysis'] = copy.deepcopy(result)
+    return result
 
 @app.post("/api/clean-issues")
+@admitted("clean_issues", cleaning_memory)
+@job("clean_issues")
 async def clean_data_based_on_issues(request: IssueBasedCleanRequest):
     if request.file_id not in file_storage:
         raise HTTPException(status_code=404, detail="File not found")
     
+    # Issues were saved by /api/analyze for the current version of the data
+    registry = file_storage[request.file_id].get('issues')
+    if registry is None or registry['version'] != file_storage[request.file_id].get('version', 0):
+        raise HTTPException(status_code=409, detail="No current analysis for this file. Run /api/analyze again.")
+    unknown = [issue_id for issue_id in request.selected_issues if issue_id not in registry['by_id']]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown issue ids: {', '.join(unknown)}")
+    
     # Get original data (or cleaned data if it exists)
     if file_storage[request.file_id]['cleaned_data'] is not None:
         df = file_storage[request.file_id]['cleaned_data'].copy()
+        steps = file_storage[request.file_id].get('steps', [])
     else:
         df = file_storage[request.file_id]['data'].copy()
-    
-    # Create a mapping of issue types to cleaning operations
-    issue_operations = {
-        "duplicate_rows": lambda df: df.drop_duplicates(),
-        "missing_values": handle_missing_values,
-        "outliers": handle_outliers,
-        "whitespace_issues": handle_whitespace,
-        "date_format_inconsistency": handle_date_formats,
-        # Add more issue-specific handlers as needed
-    }
+        steps = []
     
     # Apply cleaning operations based on selected issues
-    for issue_id in request.selected_issues:
-        # Find the issue in the analysis report
-        issue = next((item for item in request.analysis_report 
-                     if f"issue-{request.analysis_report.index(item)}" == issue_id), None)
-        
-        if issue and issue["type"] in issue_operations:
-            try:
-                df = issue_operations[issue["type"]](df, issue)
-                print(f"Applied cleaning for issue: {issue['description']}")
-            except Exception as e:
-                print(f"Failed to apply cleaning for issue {issue['description']}: {str(e)}")
+    # Row removals are fused into one mask over the analysed data (see apply_issue_fixes)
+    selected = [registry['by_id'][issue_id] for issue_id in dict.fromkeys(request.selected_issues)]
+    df, applied_issues = apply_issue_fixes(df, selected, get_column_catalog(request.file_id))
+    for issue in applied_issues:
+        print(f"Applied cleaning for issue: {issue['description']}")
+    
+    # Record the session so it can be saved as a recipe
+    if applied_issues:
+        # Computed parameters (e.g. outlier bounds) belong to this data; replays recompute them
+        recorded = [{key: value for key, value in issue.items() if key != "params"} for issue in applied_issues]
+        file_storage[request.file_id]['steps'] = steps + [{"kind": "issues", "issues": recorded}]
+    
+    return store_cleaned_result(request.file_id, df, label="clean_issues")
+
+@app.post("/api/recipes")
+async def create_recipe(request: RecipeCreateRequest):
+    if request.steps is not None:
+        steps = request.steps
+    elif request.file_id is not None:
+        if request.file_id not in file_storage:
+            raise HTTPException(status_code=404, detail="File not found")
+        steps = file_storage[request.file_id].get('steps', [])
+        if not steps:
+            raise HTTPException(status_code=400, detail="No cleaning steps recorded for this file yet")
+    else:
+        raise HTTPException(status_code=400, detail="Provide a file_id to record from or explicit steps")
     
-    # Store the newly cleaned data
-    file_storage[request.file_id]['cleaned_data'] = df.copy()
+    try:
+        recipe = save_recipe(request.name, steps, source_file_id=request.file_id)
+    except RecipeError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return recipe
+
+@app.get("/api/recipes")
+async def list_recipes():
+    return {"recipes": [
+        {"recipe_id": recipe["recipe_id"], "name": recipe["name"], "steps": len(recipe["steps"])}
+        for recipe in recipe_storage.values()
+    ]}
+
+@app.get("/api/recipes/{recipe_id}")
+async def get_recipe(recipe_id: str):
+    if recipe_id not in recipe_storage:
+        raise HTTPException(status_code=404, detail="Recipe not found")
+    return recipe_storage[recipe_id]
+
+@app.delete("/api/recipes/{recipe_id}")
+async def remove_recipe(recipe_id: str):
+    if recipe_id not in recipe_storage:
+        raise HTTPException(status_code=404, detail="Recipe not found")
+    delete_recipe(recipe_id)
+    return {"deleted": recipe_id}
+
+@app.post("/api/recipes/{recipe_id}/apply")
+@admitted("apply_recipe", cleaning_memory)
+@job("apply_recipe")
+async def apply_recipe_to_file(recipe_id: str, file_id: str = Form(...)):
+    if recipe_id not in recipe_storage:
+        raise HTTPException(status_code=404, detail="Recipe not found")
+    if file_id not in file_storage:
+        raise HTTPException(status_code=404, detail="File not found")
     
-    # Save cleaned files to tmp directory
-    tmp_dir = "/tmp"
-    csv_path = os.path.join(tmp_dir, f"{request.file_id}_cleaned.csv")
-    xlsx_path = os.path.join(tmp_dir, f"{request.file_id}_cleaned.xlsx")
+    recipe = recipe_storage[recipe_id]
+    # Replay straight from the raw upload - no suggestion, analysis or industry detection
+    with track_operation("load"):
+        df = file_storage[file_id]['data'].copy()
+    try:
+        df = apply_recipe(recipe, df, get_column_catalog(file_id))
+    except RecipeError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    file_storage[file_id]['steps'] = list(recipe["steps"])
+    
+    result = store_cleaned_result(file_id, df, label=f"recipe:{recipe['name']}")
+    result["recipe_id"] = recipe_id
+    return result
+
+def get_dataset_profile(file_id):
+    """Running statistics for the raw data, built on first use and then updated per append"""
+    entry = file_storage[file_id]
+    # Shared datasets keep one profile for every file_id pointing at them
+    holder = dataset_storage.get(entry.get('dataset_key')) or entry
+    profile = holder.get('profile')
+    record_cache("dataset_profile", profile is not None)
+    if profile is None:
+        with track_operation("build_profile", len(entry['data'])):
+            profile = holder['profile'] = DatasetProfile(entry['data'])
+    return profile
+
+def get_column_catalog(file_id):
+    """Column roles of the raw data, built at ingest (or after an append changed dtypes)"""
+    entry = file_storage[file_id]
+    holder = dataset_storage.get(entry.get('dataset_key')) or entry
+    catalog = holder.get('catalog')
+    record_cache("column_catalog", catalog is not None)
+    if catalog is None:
+        with track_operation("build_catalog", len(entry['data'])):
+            catalog = holder['catalog'] = build_catalog(entry['data'])
+    return catalog
+
+@app.get("/api/catalog/{file_id}")
+async def get_file_catalog(file_id: str):
+    if file_id not in file_storage:
+        raise HTTPException(status_code=404, detail="File not found")
+    return {"file_id": file_id, "columns": get_column_catalog(file_id).to_dict()}
+
+@app.get("/api/stats/{file_id}")
+async def get_dataset_stats(file_id: str):
+    if file_id not in file_storage:
+        raise HTTPException(status_code=404, detail="File not found")
+    return {"file_id": file_id, **get_dataset_profile(file_id).to_dict()}
+
+@app.post("/api/append")
+@admitted("append", append_memory)
+@job("append")
+async def append_rows(file_id: str = Form(...), file: UploadFile = File(...)):
+    if file_id not in file_storage:
+        raise HTTPException(status_code=404, detail="File not found")
+    entry = file_storage[file_id]
     
-    df.to_csv(csv_path, index=False)
-    df.to_excel(xlsx_path, index=False)
+    content = (await read_upload(file)).content()
+    BYTES_INGESTED.inc(len(content), format=os.path.splitext(file.filename)[1].lstrip('.').lower() or "unknown")
+    try:
+        delta = read_dataframe(file.filename, content)
+        delta = align_delta(entry['data'], delta)
+    except DecompressedSizeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except (DataFormatError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except pd.errors.ParserError as e:
+        raise HTTPException(status_code=400, detail=f"Unable to parse file. Error: {str(e)}")
+    if delta.empty:
+        raise HTTPException(status_code=400, detail="Uploaded file is empty or contains no data.")
     
-    # Return preview of cleaned data
-    preview_data = df.head(20)
-    # Handle different data types for JSON serialization
-    for col in preview_data.columns:
-        if preview_data[col].dtype == 'datetime64[ns]':
-            preview_data[col] = preview_data[col].astype(str)
+    # Update running statistics with the new rows only (on a private copy if the dataset is shared)
+    detach_dataset(file_id)
+    profile = get_dataset_profile(file_id)
+    with track_operation("append_profile", len(delta)):
+        seen_raw = profile.update(delta)
+    
+    existing_rows = len(entry['data'])
+    # Appended rows continue the raw row labels, which cleaned versions keep as row identity
+    delta.index = pd.RangeIndex(existing_rows, existing_rows + len(delta))
+    combined = pd.concat([entry['data'], delta], ignore_index=True)
+    if any(combined[col].dtype != entry['data'][col].dtype for col in combined.columns):
+        # The appended rows widened a column dtype, so stored hashes are no longer comparable
+        print(f"Column dtypes changed on append for {file_id}; rebuilding profile and column catalog")
+        with track_operation("build_profile", len(combined)):
+            profile = entry['profile'] = DatasetProfile(combined)
+        entry['catalog'] = None
+    entry['data'] = combined
+    entry['charts'] = {}
+    bump_version(file_id)
+    # Versions were deltas against the previous raw data
+    entry['history'] = None
+    
+    result = {
+        "file_id": file_id,
+        "rows_appended": len(delta),
+        "total_rows": len(combined),
+        "duplicates_in_delta": int(seen_raw.sum()),
+        "delta_missing_values": {str(col): int(count) for col, count in delta.isnull().sum().items() if count > 0},
+        "cleaning_mode": None
+    }
     
-    # Replace NaN values with None for JSON serialization
-    preview_data = preview_data.where(pd.notnull(preview_data), None)
+    steps = entry.get('steps', [])
+    if entry['cleaned_data'] is not None and steps:
+        cleaned = entry['cleaned_data']
+        cleaned_delta = None
+        if steps_are_incremental(steps):
+            cleaned_hash_index = entry.get('cleaned_hash_index')
+            if cleaned_hash_index is None:
+                cleaned_hash_index = np.unique(row_hashes(cleaned))
+            with track_operation("append_clean", len(delta)):
+                cleaned_delta = clean_delta(steps, delta, seen_raw, cleaned_hash_index, get_column_catalog(file_id))
+            if list(cleaned_delta.columns) == list(cleaned.columns):
+                cleaned_delta = align_delta(cleaned, cleaned_delta)
+            else:
+                cleaned_delta = None
+        
+        if cleaned_delta is not None:
+            result["cleaning_mode"] = "incremental"
+            cleaned = pd.concat([cleaned, cleaned_delta])
+            result.update(store_cleaned_result(file_id, cleaned, label="append"))
+            entry['cleaned_hash_index'] = np.union1d(cleaned_hash_index, row_hashes(cleaned_delta))
+        else:
+            # Session uses cross-row operations (means, rolling windows, outlier bounds): replay on everything
+            result["cleaning_mode"] = "full"
+            with track_operation("append_clean", len(combined)):
+                cleaned = clean_delta(steps, combined.copy(), np.zeros(len(combined), dtype=bool),
+                                      np.empty(0, dtype=np.uint64), get_column_catalog(file_id))
+            result.update(store_cleaned_result(file_id, cleaned, label="append"))
+    
+    update_storage_size(file_id)
+    result["stats"] = profile.to_dict()
+    print(f"Appended {len(delta)} rows to {file_id} (existing {existing_rows}, cleaning: {result['cleaning_mode']})")
+    return result
+
+@app.post("/api/deduplicate-customers")
+@admitted("deduplicate_customers", cleaning_memory)
+@job("deduplicate_customers")
+async def deduplicate_customer_records(file_id: str = Form(...),
+                                       threshold: float = Form(DEFAULT_THRESHOLD),
+                                       window: int = Form(DEFAULT_WINDOW),
+                                       columns: Optional[str] = Form(None)):
+    if file_id not in file_storage:
+        raise HTTPException(status_code=404, detail="File not found")
+    if not 0 < threshold <= 1:
+        raise HTTPException(status_code=400, detail="Threshold must be between 0 and 1")
+    if window < 2:
+        raise HTTPException(status_code=400, detail="Window must be at least 2")
+    
+    entry = file_storage[file_id]
+    df = entry['cleaned_data'] if entry['cleaned_data'] is not None else entry['data']
+    steps = entry.get('steps', []) if entry['cleaned_data'] is not None else []
+    if columns:
+        match_columns = [col.strip() for col in columns.split(',') if col.strip()]
+        missing = [col for col in match_columns if col not in df.columns]
+        if missing:
+            raise HTTPException(status_code=400, detail=f"Columns not found: {', '.join(missing)}")
+    else:
+        match_columns = identifier_columns(df, get_column_catalog(file_id))
+    if not match_columns:
+        raise HTTPException(status_code=400, detail="No customer identifier columns found")
+    
+    with track_operation("deduplicate_customers", len(df)):
+        df, report = deduplicate_customers(df, match_columns, threshold=threshold, window=window,
+                                           catalog=get_column_catalog(file_id))
+    print(f"Removed {report['rows_removed']} duplicate customer rows in {report['duplicate_clusters']} clusters")
+    
+    # Identifier columns picked from the catalog are re-resolved when the step is replayed
+    entry['steps'] = steps + [{"kind": "deduplicate_customers", "columns": match_columns if columns else None,
+                               "threshold": threshold, "window": window}]
+    result = store_cleaned_result(file_id, df, label="deduplicate_customers")
+    result["deduplication"] = {"columns": match_columns, "threshold": threshold, **report}
+    return result
+
+@app.post("/api/query/{file_id}")
+async def query_dataset(file_id: str, request: QueryRequest):
+    if file_id not in file_storage:
+        raise HTTPException(status_code=404, detail="File not found")
+    entry = file_storage[file_id]
     
-    # Convert to records
-    preview_records = preview_data.to_dict(orient='records')
+    if request.source not in ("latest", "cleaned", "raw"):
+        raise HTTPException(status_code=400, detail="Invalid source. Use 'latest', 'cleaned' or 'raw'.")
+    use_cleaned = request.source == "cleaned" or (request.source == "latest" and entry['cleaned_data'] is not None)
+    if use_cleaned and entry['cleaned_data'] is None:
+        raise HTTPException(status_code=404, detail="Cleaned data not found")
+    df = entry['cleaned_data'] if use_cleaned else entry['data']
+    
+    try:
+        # Cleaned results are scanned from their Parquet copy; raw data is filtered in memory
+        source, chunks = run_query(request.model_dump(), df,
+                                   parquet_path(file_id) if use_cleaned else None, request.format)
+    except QueryError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    print(f"Query on {file_id} ({'cleaned' if use_cleaned else 'raw'}, {source}): {request.model_dump(exclude_defaults=True)}")
+    return StreamingResponse(
+        chunks,
+        media_type=OUTPUT_FORMATS[request.format],
+        headers={
+            "X-Query-Source": source,
+            "Access-Control-Allow-Origin": "http://localhost:3000",
+            "Access-Control-Allow-Credentials": "true"
+        }
+    )
+
+@app.get("/api/aggregate/{file_id}")
+async def aggregate_chart(file_id: str, kind: str, x: str, y: Optional[str] = None, func: str = "mean",
+                          limit: int = DEFAULT_LIMIT, bins: int = 20, sort: Optional[str] = None,
+                          max_points: int = DEFAULT_SCATTER_POINTS, source: str = "latest"):
+    if file_id not in file_storage:
+        raise HTTPException(status_code=404, detail="File not found")
+    entry = file_storage[file_id]
+    
+    if source not in ("latest", "cleaned", "raw"):
+        raise HTTPException(status_code=400, detail="Invalid source. Use 'latest', 'cleaned' or 'raw'.")
+    use_cleaned = source == "cleaned" or (source == "latest" and entry['cleaned_data'] is not None)
+    if use_cleaned and entry['cleaned_data'] is None:
+        raise HTTPException(status_code=404, detail="Cleaned data not found")
+    
+    # Cache per dataset version: shared raw datasets keep one cache for every file_id
+    if use_cleaned:
+        df = entry['cleaned_data']
+        cache = entry.setdefault('cleaned_charts', {})
+    else:
+        df = entry['data']
+        holder = dataset_storage.get(entry.get('dataset_key')) or entry
+        cache = holder.setdefault('charts', {})
+    
+    key = (kind, x, y, func, limit, bins, sort, max_points)
+    result = cache.get(key)
+    record_cache("chart", result is not None)
+    if result is None:
+        try:
+            with track_operation(f"chart_{kind}", len(df)):
+                result = chart_aggregate(df, kind, x, y, func=func, limit=limit, bins=bins, sort=sort,
+                                         max_points=max_points)
+        except ChartError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        remember(cache, key, result)
     
     return {
-        "preview": preview_records,
-        "download_urls": {
-            "csv": f"/api/download/{request.file_id}?format=csv",
-            "xlsx": f"/api/download/{request.file_id}?format=xlsx"
-        },
+        "file_id": file_id,
+        "source": "cleaned" if use_cleaned else "raw",
+        "kind": kind,
         "rows": len(df),
-        "columns": list(df.columns)
+        **result
+    }
+
+def checkout_version(file_id, version_id):
+    """Materialize a history version and make it the current cleaned data"""
+    entry = file_storage[file_id]
+    history = get_history(file_id)
+    version = history.checkout(version_id)
+    entry['steps'] = list(version['steps'])
+    if version_id == 0:
+        # Back to the raw upload: there is no cleaned result
+        entry['cleaned_data'] = None
+        entry['cleaned_hash_index'] = None
+        entry['cleaned_charts'] = {}
+        bump_version(file_id)
+        update_storage_size(file_id)
+        for extension in ("csv", "xlsx", "parquet"):
+            try:
+                os.remove(os.path.join("/tmp", f"{file_id}_cleaned.{extension}"))
+            except OSError:
+                pass
+        df = entry['data']
+        result = {
+            "preview": prepare_dataframe_for_json(df.head(20)).to_dict(orient='records'),
+            "download_urls": None,
+            "rows": len(df),
+            "columns": list(df.columns)
+        }
+    else:
+        with track_operation("history_materialize"):
+            df = history.materialize(entry['data'], version_id)
+        result = publish_cleaned_result(file_id, df)
+    print(f"Checked out version {version_id} ({version['label']}) of {file_id}")
+    return {**result, "version": version_id, "label": version['label']}
+
+@app.get("/api/history/{file_id}")
+async def get_file_history(file_id: str):
+    if file_id not in file_storage:
+        raise HTTPException(status_code=404, detail="File not found")
+    return {"file_id": file_id, **get_history(file_id).summary()}
+
+@app.post("/api/undo")
+async def undo_cleaning(file_id: str = Form(...)):
+    if file_id not in file_storage:
+        raise HTTPException(status_code=404, detail="File not found")
+    try:
+        target = get_history(file_id).undo_target()
+    except HistoryError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return checkout_version(file_id, target)
+
+@app.post("/api/redo")
+async def redo_cleaning(file_id: str = Form(...)):
+    if file_id not in file_storage:
+        raise HTTPException(status_code=404, detail="File not found")
+    try:
+        target = get_history(file_id).redo_target()
+    except HistoryError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return checkout_version(file_id, target)
+
+@app.post("/api/checkout")
+async def checkout_cleaning_version(file_id: str = Form(...), version: int = Form(...)):
+    if file_id not in file_storage:
+        raise HTTPException(status_code=404, detail="File not found")
+    try:
+        return checkout_version(file_id, version)
+    except HistoryError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+def materialize_version(file_id, version_id):
+    """DataFrame of a history version; the current one is already materialized"""
+    entry = file_storage[file_id]
+    history = get_history(file_id)
+    if version_id == history.current and version_id != 0 and entry['cleaned_data'] is not None:
+        return entry['cleaned_data']
+    with track_operation("history_materialize"):
+        return history.materialize(entry['data'], version_id)
+
+@app.get("/api/diff/{file_id}")
+@admitted("diff", cleaning_memory)
+@job("diff")
+async def diff_versions(file_id: str, from_version: int = 0, to_version: Optional[int] = None,
+                        key: Optional[str] = None, offset: int = 0, limit: int = 100):
+    if file_id not in file_storage:
+        raise HTTPException(status_code=404, detail="File not found")
+    if offset < 0 or not 1 <= limit <= 1000:
+        raise HTTPException(status_code=400, detail="Offset must be >= 0 and limit between 1 and 1000")
+    entry = file_storage[file_id]
+    history = get_history(file_id)
+    to_version = history.current if to_version is None else to_version
+    try:
+        before = materialize_version(file_id, from_version)
+        after = materialize_version(file_id, to_version)
+        # Index labels identify rows only while both versions are row subsets of the raw data
+        by_index = history.row_aligned(from_version) and history.row_aligned(to_version)
+    except HistoryError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    key_columns = [col.strip() for col in key.split(',') if col.strip()] if key else None
+    
+    pairs, removed_columns, added_columns = column_pairs(before, after)
+    try:
+        alignment = align_rows(before, after, pairs, key_columns, by_index)
+    except DiffError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    # Per-column counts are cached so paging through cells only rescans the columns on the page
+    cache_key = (from_version, to_version, tuple(key_columns or ()))
+    cache = entry.setdefault('diff_counts', {})
+    counts = cache.get(cache_key)
+    record_cache("diff_counts", counts is not None)
+    if counts is None:
+        counts = column_changes(before, after, alignment, pairs)
+        remember(cache, cache_key, counts, limit=MAX_CACHED_DIFFS)
+    
+    total = sum(counts.values())
+    with track_operation("diff_cells"):
+        items = changed_cells(before, after, alignment, pairs, counts, offset, limit)
+    return {
+        "file_id": file_id,
+        "from_version": from_version,
+        "to_version": to_version,
+        **diff_summary(before, after, alignment, pairs, removed_columns, added_columns, counts),
+        "changed_cells": {"total": total, "offset": offset, "limit": limit, "items": items},
     }
 
-def handle_missing_values(df, issue):
-    """Handle missing values - simple implementation"""
-    # This is a simplified approach - in reality, you'd want more sophisticated handling
-    return df.dropna()
-
-def handle_outliers(df, issue):
-    """Handle outliers in numeric columns"""
-    # Extract column name from issue description
-    import re
-    match = re.search(r"Column '(.+?)'", issue["description"])
-    if match:
-        column = match.group(1)
-        if column in df.columns and df[column].dtype in ['int64', 'float64']:
-            Q1 = df[column].quantile(0.25)
-            Q3 = df[column].quantile(0.75)
-            IQR = Q3 - Q1
-            lower_bound = Q1 - 1.5 * IQR
-            upper_bound = Q3 + 1.5 * IQR
-            # Remove outliers
-            df = df[(df[column] >= lower_bound) & (df[column] <= upper_bound)]
-    return df
-
-def handle_whitespace(df, issue):
-    """Handle whitespace issues in string columns"""
-    # Apply to all object columns
-    string_columns = df.select_dtypes(include=['object']).columns
-    for col in string_columns:
-        df[col] = df[col].apply(lambda x: x.strip() if isinstance(x, str) else x)
-    return df
-
-def handle_date_formats(df, issue):
-    """Handle date format inconsistencies"""
-    # Try to standardize date columns
-    date_columns = [col for col in df.columns if any(keyword in col.lower() for keyword in ['date', 'time', 'дата'])]
-    for col in date_columns:
+@app.delete("/api/files/{file_id}")
+async def delete_file(file_id: str):
+    if file_id not in file_storage:
+        raise HTTPException(status_code=404, detail="File not found")
+    entry = file_storage.pop(file_id)
+    # The shared raw dataset is only evicted once no other file_id references it
+    release_dataset(entry.get('dataset_key'))
+    for extension in ("csv", "xlsx", "parquet"):
         try:
-            df[col] = pd.to_datetime(df[col], infer_datetime_format=True, errors='coerce')
-            # Format consistently
-            df[col] = df[col].dt.strftime('%Y-%m-%d')
-        except Exception as e:
-            print(f"Could not standardize date column {col}: {e}")
-    return df
+            os.remove(os.path.join("/tmp", f"{file_id}_cleaned.{extension}"))
+        except OSError:
+            pass
+    return {"deleted": file_id}
@@ -0,0 +1,281 @@
+"""
+Lightweight in-process metrics registry exposed in the Prometheus text format.
+
+Kept dependency-free on purpose: every update is a dict lookup plus a float
+addition under a lock, so the instrumentation is cheap enough to leave on in
+production.
+"""
+import functools
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+from profiling import record_phase
+
+# Default latency buckets (seconds) - spans fast JSON endpoints up to multi-minute cleans
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+_lock = threading.Lock()
+_metrics = {}
+
+
+def _format_labels(label_names, label_values, extra=None):
+    pairs = list(zip(label_names, label_values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    escaped = []
+    for name, value in pairs:
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        escaped.append(f'{name}="{value}"')
+    return "{" + ",".join(escaped) + "}"
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self.values = {}
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, "") for name in self.label_names)
+        with _lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def get(self, **labels):
+        key = tuple(labels.get(name, "") for name in self.label_names)
+        return self.values.get(key, 0)
+
+    def samples(self):
+        for key, value in sorted(self.values.items()):
+            yield self.name, _format_labels(self.label_names, key), value
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def __init__(self, name, documentation, labels=(), callback=None):
+        super().__init__(name, documentation, labels)
+        # Optional callback evaluated at scrape time, for values derived from state
+        self.callback = callback
+
+    def set(self, value, **labels):
+        key = tuple(labels.get(name, "") for name in self.label_names)
+        with _lock:
+            self.values[key] = value
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def samples(self):
+        if self.callback is not None:
+            result = self.callback()
+            if isinstance(result, dict):
+                for key, value in sorted(result.items()):
+                    if not isinstance(key, tuple):
+                        key = (key,)
+                    yield self.name, _format_labels(self.label_names, key), value
+            else:
+                yield self.name, "", result
+            return
+        yield from super().samples()
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self.values = {}
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, "") for name in self.label_names)
+        index = bisect_left(self.buckets, value)
+        with _lock:
+            state = self.values.get(key)
+            if state is None:
+                # Per-bucket (non-cumulative) counts, running sum and count
+                state = self.values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def samples(self):
+        for key, (counts, total, count) in sorted(self.values.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.label_names, key, ("le", _format_value(bound)))
+                yield f"{self.name}_bucket", labels, cumulative
+            labels = _format_labels(self.label_names, key)
+            yield f"{self.name}_sum", labels, total
+            yield f"{self.name}_count", labels, count
+
+
+def _register(metric):
+    with _lock:
+        if metric.name in _metrics:
+            return _metrics[metric.name]
+        _metrics[metric.name] = metric
+    return metric
+
+
+def counter(name, documentation, labels=()):
+    return _register(Counter(name, documentation, labels))
+
+
+def gauge(name, documentation, labels=(), callback=None):
+    return _register(Gauge(name, documentation, labels, callback))
+
+
+def histogram(name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+    return _register(Histogram(name, documentation, labels, buckets))
+
+
+def render_latest():
+    """Render every registered metric in the Prometheus text exposition format"""
+    lines = []
+    for metric in list(_metrics.values()):
+        lines.append(f"# HELP {metric.name} {metric.documentation}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        try:
+            samples = list(metric.samples())
+        except Exception as e:
+            print(f"Error collecting metric {metric.name}: {str(e)}")
+            continue
+        for sample_name, labels, value in samples:
+            lines.append(f"{sample_name}{labels} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
+
+
+# Metrics shared by the API handlers
+REQUEST_LATENCY = histogram(
+    "datacleanr_request_duration_seconds",
+    "HTTP request latency by route",
+    labels=("method", "route", "status"),
+)
+REQUESTS_IN_FLIGHT = gauge(
+    "datacleanr_requests_in_flight",
+    "HTTP requests currently being processed",
+)
+OPERATION_DURATION = histogram(
+    "datacleanr_operation_duration_seconds",
+    "Duration of individual cleaning and analysis operations",
+    labels=("operation",),
+)
+OPERATION_ROWS = counter(
+    "datacleanr_operation_rows_total",
+    "Rows processed by individual cleaning and analysis operations",
+    labels=("operation",),
+)
+BYTES_INGESTED = counter(
+    "datacleanr_ingested_bytes_total",
+    "Bytes received through uploads",
+    labels=("format",),
+)
+BYTES_EXPORTED = counter(
+    "datacleanr_exported_bytes_total",
+    "Bytes written or served as cleaned exports",
+    labels=("format",),
+)
+CACHE_REQUESTS = counter(
+    "datacleanr_cache_requests_total",
+    "Cache lookups by cache name and result (hit/miss)",
+    labels=("cache", "result"),
+)
+JOBS_IN_FLIGHT = gauge(
+    "datacleanr_jobs_in_flight",
+    "Long-running cleaning/analysis jobs currently executing",
+    labels=("job",),
+)
+
+
+def observe_operation(operation, elapsed, rows=0):
+    OPERATION_DURATION.observe(elapsed, operation=operation)
+    record_phase(operation, elapsed)
+    if rows:
+        OPERATION_ROWS.inc(rows, operation=operation)
+
+
+@contextmanager
+def track_operation(operation, rows=0):
+    """Time a block of work and count the rows it processed"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_operation(operation, time.perf_counter() - start, rows)
+
+
+class OperationTimer:
+    """Times a sequence of operations: each start() ends the one before it"""
+
+    def __init__(self):
+        self.current = None
+
+    def start(self, operation, rows=0):
+        self.stop()
+        self.current = (operation, rows, time.perf_counter())
+
+    def stop(self):
+        if self.current is not None:
+            operation, rows, start = self.current
+            self.current = None
+            observe_operation(operation, time.perf_counter() - start, rows)
+
+
+@contextmanager
+def track_job(job):
+    JOBS_IN_FLIGHT.inc(job=job)
+    try:
+        yield
+    finally:
+        JOBS_IN_FLIGHT.dec(job=job)
+
+
+def job(name):
+    """Decorator marking an async handler as a long-running job for the in-flight gauge"""
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            with track_job(name):
+                return await func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def record_cache(cache, hit):
+    CACHE_REQUESTS.inc(cache=cache, result="hit" if hit else "miss")
+
+
+def cache_hit_ratio():
+    """Hit ratio per cache name, exported as a derived gauge"""
+    totals = {}
+    for (cache, result), value in list(CACHE_REQUESTS.values.items()):
+        hits, total = totals.get(cache, (0, 0))
+        totals[cache] = (hits + (value if result == "hit" else 0), total + value)
+    return {cache: (hits / total if total else 0.0) for cache, (hits, total) in totals.items()}
+
+
+CACHE_HIT_RATIO = gauge(
+    "datacleanr_cache_hit_ratio",
+    "Cache hit ratio by cache name",
+    labels=("cache",),
+    callback=cache_hit_ratio,
+)
@@ -0,0 +1,173 @@
+"""
+Opt-in per-request sampling profiler.
+
+A background thread samples the stack of the thread serving the request at a
+fixed interval and aggregates the samples into a call tree and into collapsed
+stacks ("folded" format, consumable by flamegraph.pl / speedscope). Named
+phases recorded with track_operation() are attached to the active profile so
+the response can carry a per-phase timing breakdown.
+"""
+import contextvars
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+# Sampling interval in seconds (5ms keeps overhead low while resolving phases of a few 100ms)
+SAMPLE_INTERVAL = float(os.environ.get("DATACLEANR_PROFILE_INTERVAL", "0.005"))
+# Number of stored profiles kept before the oldest are discarded
+MAX_STORED_PROFILES = int(os.environ.get("DATACLEANR_MAX_PROFILES", "50"))
+PROFILE_DIR = os.environ.get("DATACLEANR_PROFILE_DIR", "/tmp")
+
+_current_profile = contextvars.ContextVar("datacleanr_profile", default=None)
+
+# profile_id -> summary (files live in PROFILE_DIR)
+profile_storage = OrderedDict()
+_storage_lock = threading.Lock()
+
+
+def is_admin_token(token):
+    """Profiling is restricted to callers presenting the configured admin token"""
+    admin_token = os.environ.get("DATACLEANR_ADMIN_TOKEN")
+    return bool(admin_token) and token == admin_token
+
+
+class ProfileSession:
+    def __init__(self, label, thread_id=None, interval=SAMPLE_INTERVAL):
+        self.profile_id = str(uuid.uuid4())
+        self.label = label
+        self.thread_id = thread_id if thread_id is not None else threading.get_ident()
+        self.interval = interval
+        self.phases = []
+        self.stacks = {}
+        self.sample_count = 0
+        self.started_at = None
+        self.duration = 0.0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self.started_at = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name=f"profiler-{self.profile_id[:8]}", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.duration = time.perf_counter() - self.started_at
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            stack.reverse()
+            key = tuple(stack)
+            self.stacks[key] = self.stacks.get(key, 0) + 1
+            self.sample_count += 1
+
+    def record_phase(self, name, seconds):
+        self.phases.append({"phase": name, "seconds": round(seconds, 6)})
+
+    def folded(self):
+        """Collapsed stacks, one 'frame;frame;frame count' line per unique stack"""
+        return "\n".join(f"{';'.join(stack)} {count}" for stack, count in
+                         sorted(self.stacks.items(), key=lambda item: -item[1])) + "\n"
+
+    def call_tree(self):
+        root = {"name": self.label, "samples": 0, "children": {}}
+        for stack, count in self.stacks.items():
+            node = root
+            node["samples"] += count
+            for frame in stack:
+                child = node["children"].get(frame)
+                if child is None:
+                    child = node["children"][frame] = {"name": frame, "samples": 0, "children": {}}
+                child["samples"] += count
+                node = child
+
+        def to_list(node):
+            children = sorted(node["children"].values(), key=lambda child: -child["samples"])
+            return {
+                "name": node["name"],
+                "samples": node["samples"],
+                "seconds": round(node["samples"] * self.interval, 4),
+                "children": [to_list(child) for child in children],
+            }
+        return to_list(root)
+
+    def summary(self):
+        return {
+            "profile_id": self.profile_id,
+            "label": self.label,
+            "duration_seconds": round(self.duration, 6),
+            "samples": self.sample_count,
+            "sample_interval_seconds": self.interval,
+            "phases": self.phases,
+        }
+
+
+def start_profile(label):
+    session = ProfileSession(label).start()
+    token = _current_profile.set(session)
+    return session, token
+
+
+def finish_profile(session, token):
+    session.stop()
+    _current_profile.reset(token)
+    save_profile(session)
+    return session.summary()
+
+
+def current_profile():
+    return _current_profile.get()
+
+
+def record_phase(name, seconds):
+    """Attach a phase timing to the active profile; no-op when not profiling"""
+    session = _current_profile.get()
+    if session is not None:
+        session.record_phase(name, seconds)
+
+
+def _profile_path(profile_id, kind):
+    extension = "json" if kind == "tree" else "folded"
+    return os.path.join(PROFILE_DIR, f"{profile_id}_profile.{extension}")
+
+
+def save_profile(session):
+    summary = session.summary()
+    try:
+        with open(_profile_path(session.profile_id, "tree"), "w") as f:
+            json.dump({**summary, "call_tree": session.call_tree()}, f)
+        with open(_profile_path(session.profile_id, "folded"), "w") as f:
+            f.write(session.folded())
+    except Exception as e:
+        print(f"Error saving profile {session.profile_id}: {str(e)}")
+    with _storage_lock:
+        profile_storage[session.profile_id] = summary
+        while len(profile_storage) > MAX_STORED_PROFILES:
+            old_id, _ = profile_storage.popitem(last=False)
+            for kind in ("tree", "folded"):
+                try:
+                    os.remove(_profile_path(old_id, kind))
+                except OSError:
+                    pass
+
+
+def get_profile_path(profile_id, kind):
+    if profile_id not in profile_storage:
+        return None
+    path = _profile_path(profile_id, kind)
+    return path if os.path.exists(path) else None
@@ -0,0 +1,274 @@
+"""
+Projection and predicate pushdown queries over stored datasets.
+
+A query selects columns, filters rows with simple predicates, optionally
+aggregates per group, and caps the output with a limit. Only the columns the
+query touches are read:
+- cleaned results are also written as Parquet (row groups of
+  PARQUET_ROW_GROUP_SIZE rows), and queries against them go through a pyarrow
+  dataset scan, so projection and filters are pushed into the reader and row
+  groups whose statistics cannot match are skipped without being decoded;
+- in-memory frames (raw uploads, or when the Parquet export failed) are
+  projected first and filtered chunk by chunk, stopping once the limit is met.
+Results are produced as a stream of CSV or JSON-lines chunks.
+"""
+import itertools
+import os
+
+import pandas as pd
+
+from metrics import BYTES_EXPORTED, track_operation
+
+PARQUET_ROW_GROUP_SIZE = int(os.environ.get("DATACLEANR_PARQUET_ROW_GROUP_SIZE", "100000"))
+# Rows converted and sent per streamed chunk
+STREAM_CHUNK_ROWS = 50000
+
+OPERATORS = ("eq", "ne", "lt", "le", "gt", "ge", "in", "not_in", "is_null", "not_null", "contains")
+AGGREGATES = ("count", "sum", "mean", "min", "max", "nunique")
+# Aggregates that are only meaningful on numeric (or boolean) columns
+NUMERIC_AGGREGATES = ("sum", "mean")
+OUTPUT_FORMATS = {"csv": "text/csv", "jsonl": "application/x-ndjson"}
+
+
+class QueryError(ValueError):
+    """Raised for invalid queries (unknown columns, operators, incompatible values)"""
+
+
+def parquet_path(file_id):
+    return os.path.join("/tmp", f"{file_id}_cleaned.parquet")
+
+
+def write_columnar(df, path):
+    """Write the columnar copy used by queries; a stale copy is removed if writing fails"""
+    try:
+        df.to_parquet(path, index=False, row_group_size=PARQUET_ROW_GROUP_SIZE)
+        return True
+    except Exception as e:
+        # e.g. object columns mixing numbers and strings cannot be stored as Arrow types
+        print(f"Columnar export skipped: {str(e)}")
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        return False
+
+
+def validate_query(query, columns, dtypes=None):
+    """
+    Check a query dict against the dataset columns and return the columns it needs.
+    dtypes (column -> dtype) enables the numeric check for sum/mean.
+    """
+    available = set(columns)
+    select = query.get("columns") or []
+    filters = query.get("filters") or []
+    group_by = query.get("group_by") or []
+    aggregates = query.get("aggregates") or []
+    limit = query.get("limit")
+
+    referenced = list(select) + list(group_by)
+    for predicate in filters:
+        if predicate.get("op") not in OPERATORS:
+            raise QueryError(f"Unknown filter operator '{predicate.get('op')}'. Use one of: {', '.join(OPERATORS)}")
+        if predicate["op"] in ("in", "not_in") and not isinstance(predicate.get("value"), list):
+            raise QueryError(f"Operator '{predicate['op']}' requires a list value")
+        referenced.append(predicate.get("column"))
+    for aggregate in aggregates:
+        if aggregate.get("func") not in AGGREGATES:
+            raise QueryError(f"Unknown aggregate '{aggregate.get('func')}'. Use one of: {', '.join(AGGREGATES)}")
+        # count without a column counts rows
+        if aggregate.get("column") is not None or aggregate["func"] != "count":
+            referenced.append(aggregate.get("column"))
+    if group_by and not aggregates:
+        raise QueryError("group_by requires at least one aggregate")
+    if select and aggregates:
+        raise QueryError("Use either columns or aggregates, not both")
+    if limit is not None and limit < 0:
+        raise QueryError("limit must be non-negative")
+    missing = sorted({str(col) for col in referenced if col not in available})
+    if missing:
+        raise QueryError(f"Columns not found: {', '.join(missing)}")
+    if dtypes is not None:
+        for aggregate in aggregates:
+            column = aggregate.get("column")
+            if aggregate["func"] in NUMERIC_AGGREGATES and not pd.api.types.is_numeric_dtype(dtypes[column]):
+                raise QueryError(f"Aggregate '{aggregate['func']}' requires a numeric column; "
+                                 f"'{column}' has type {dtypes[column]}")
+
+    if aggregates:
+        # Projection: only grouping, aggregated and filtered columns are read
+        needed = list(group_by) + [a["column"] for a in aggregates if a.get("column") is not None]
+    else:
+        needed = list(select) or list(columns)
+    needed += [p["column"] for p in filters]
+    return list(dict.fromkeys(needed))
+
+
+def pandas_mask(df, filters):
+    mask = pd.Series(True, index=df.index)
+    for predicate in filters:
+        series = df[predicate["column"]]
+        op, value = predicate["op"], predicate.get("value")
+        try:
+            if op == "eq":
+                mask &= series == value
+            elif op == "ne":
+                mask &= series != value
+            elif op == "lt":
+                mask &= series < value
+            elif op == "le":
+                mask &= series <= value
+            elif op == "gt":
+                mask &= series > value
+            elif op == "ge":
+                mask &= series >= value
+            elif op == "in":
+                mask &= series.isin(value)
+            elif op == "not_in":
+                mask &= ~series.isin(value)
+            elif op == "is_null":
+                mask &= series.isna()
+            elif op == "not_null":
+                mask &= series.notna()
+            elif op == "contains":
+                mask &= series.astype(str).str.contains(str(value), regex=False) & series.notna()
+        except TypeError as e:
+            raise QueryError(f"Cannot compare column '{predicate['column']}' with {value!r}: {e}")
+    return mask
+
+
+def arrow_filter(filters):
+    """Translate predicates into a pyarrow dataset expression (None when there are none)"""
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+
+    expression = None
+    for predicate in filters:
+        field = ds.field(predicate["column"])
+        op, value = predicate["op"], predicate.get("value")
+        if op == "eq":
+            term = field == value
+        elif op == "ne":
+            term = field != value
+        elif op == "lt":
+            term = field < value
+        elif op == "le":
+            term = field <= value
+        elif op == "gt":
+            term = field > value
+        elif op == "ge":
+            term = field >= value
+        elif op == "in":
+            term = field.isin(value)
+        elif op == "not_in":
+            term = ~field.isin(value)
+        elif op == "is_null":
+            term = field.is_null()
+        elif op == "not_null":
+            term = field.is_valid()
+        else:
+            term = pc.match_substring(field.cast("string"), str(value))
+        expression = term if expression is None else expression & term
+    return expression
+
+
+def aggregate_frame(df, group_by, aggregates):
+    """Group-by aggregates over an already projected and filtered frame"""
+    named = {}
+    for aggregate in aggregates:
+        column, func = aggregate.get("column"), aggregate["func"]
+        alias = aggregate.get("alias") or (f"{func}_{column}" if column is not None else "count")
+        named[alias] = (column, func)
+    if not group_by:
+        return pd.DataFrame([{alias: (len(df) if column is None else df[column].agg(func))
+                              for alias, (column, func) in named.items()}])
+    grouped = df.groupby(group_by, dropna=False, sort=True)
+    result = pd.DataFrame({alias: (grouped.size() if column is None else grouped[column].agg(func))
+                           for alias, (column, func) in named.items()})
+    return result.reset_index()
+
+
+def _frame_chunks(df, needed, filters):
+    """Row chunks of the in-memory frame, projected to the needed columns and filtered"""
+    projected = df[needed]
+    for start in range(0, len(projected), STREAM_CHUNK_ROWS):
+        chunk = projected.iloc[start:start + STREAM_CHUNK_ROWS]
+        yield chunk[pandas_mask(chunk, filters)] if filters else chunk
+
+
+def parquet_scanner(path, needed, filters):
+    """Scanner with projection and filter pushed down into the Parquet reader"""
+    import pyarrow.dataset as ds
+
+    dataset = ds.dataset(path, format="parquet")
+    return dataset.scanner(columns=needed, filter=arrow_filter(filters), batch_size=STREAM_CHUNK_ROWS)
+
+
+def _parquet_chunks(scanner):
+    for batch in scanner.to_batches():
+        if batch.num_rows:
+            yield batch.to_pandas()
+
+
+def _encode(chunk, output_format, header):
+    if output_format == "jsonl":
+        if not len(chunk):
+            # to_json renders an empty frame as a blank line
+            return b""
+        text = chunk.to_json(orient="records", lines=True, date_format="iso")
+        return (text if text.endswith("\n") or not text else text + "\n").encode()
+    return chunk.to_csv(index=False, header=header).encode()
+
+
+def run_query(query, df, path=None, output_format="csv"):
+    """
+    Plan a query and return (source, chunk_iterator). Validation happens eagerly
+    so errors surface before streaming starts; path is the Parquet copy, if any.
+    """
+    if output_format not in OUTPUT_FORMATS:
+        raise QueryError(f"Invalid format. Use one of: {', '.join(OUTPUT_FORMATS)}")
+    needed = validate_query(query, df.columns, df.dtypes)
+    filters = query.get("filters") or []
+    source = "parquet" if path is not None and os.path.exists(path) else "memory"
+    # Type mismatches between predicates and columns surface here, before streaming starts
+    if source == "parquet":
+        try:
+            scanner = parquet_scanner(path, needed, filters)
+        except Exception as e:
+            raise QueryError(f"Invalid filter: {e}")
+    elif filters:
+        pandas_mask(df[needed].head(1), filters)
+
+    def chunks():
+        return _parquet_chunks(scanner) if source == "parquet" else _frame_chunks(df, needed, filters)
+
+    def stream():
+        sent = 0
+        limit = query.get("limit")
+        aggregates = query.get("aggregates") or []
+        with track_operation(f"query_{source}", len(df)):
+            if aggregates:
+                filtered = pd.concat(list(chunks()) or [df[needed].iloc[:0]], ignore_index=True)
+                results = [aggregate_frame(filtered, query.get("group_by") or [], aggregates)]
+            elif output_format == "csv":
+                # Empty leading chunk so the CSV header is sent even when nothing matches
+                results = itertools.chain([df[needed].iloc[:0]], chunks())
+            else:
+                results = chunks()
+            select = query.get("columns") or None
+            header = True
+            for chunk in results:
+                if limit is not None:
+                    chunk = chunk.iloc[:max(0, limit - sent)]
+                if select and not aggregates:
+                    chunk = chunk[select]
+                data = _encode(chunk, output_format, header) if len(chunk) or header else b""
+                if data:
+                    BYTES_EXPORTED.inc(len(data), format=f"query_{output_format}")
+                    yield data
+                header = False
+                sent += len(chunk)
+                # Early exit: remaining row groups / chunks are never read
+                if limit is not None and sent >= limit:
+                    break
+
+    return source, stream()
@@ -0,0 +1,167 @@
+"""
+Saved cleaning recipes.
+
+A recipe is the ordered list of steps recorded from a cleaning session:
+
+    {"kind": "clean", "options": {<clean_dataframe flags>}}
+    {"kind": "issues", "issues": [<analysis issue dicts>]}
+    {"kind": "deduplicate_customers", "columns": [...] or null, "threshold": t, "window": w}
+
+Recipes are persisted as JSON and compiled once into a list of callables, so
+replaying one on a new upload skips suggestion, analysis and industry detection.
+"""
+import functools
+import json
+import os
+import threading
+import time
+import uuid
+
+from catalog import catalog_for
+from cleaning import CLEAN_FLAGS, ISSUE_OPERATIONS, apply_issue_fixes, clean_dataframe
+from dedupe import deduplicate_customers
+from metrics import record_cache, track_operation
+
+RECIPE_DIR = os.environ.get("DATACLEANR_RECIPE_DIR", "/tmp/datacleanr_recipes")
+
+# recipe_id -> recipe dict
+recipe_storage = {}
+# (recipe_id, version) -> compiled steps
+_compiled_recipes = {}
+_lock = threading.Lock()
+
+
+class RecipeError(ValueError):
+    """Raised for malformed recipes or steps that cannot be compiled"""
+
+
+def _recipe_path(recipe_id):
+    return os.path.join(RECIPE_DIR, f"{recipe_id}.json")
+
+
+def load_recipes():
+    """Load persisted recipes from RECIPE_DIR into memory"""
+    if not os.path.isdir(RECIPE_DIR):
+        return
+    for name in os.listdir(RECIPE_DIR):
+        if not name.endswith(".json"):
+            continue
+        try:
+            with open(os.path.join(RECIPE_DIR, name)) as f:
+                recipe = json.load(f)
+            recipe_storage[recipe["recipe_id"]] = recipe
+        except Exception as e:
+            print(f"Could not load recipe {name}: {str(e)}")
+
+
+def validate_steps(steps):
+    if not steps:
+        raise RecipeError("Recipe has no steps")
+    if not isinstance(steps, list):
+        raise RecipeError("Recipe steps must be a list")
+    for step in steps:
+        if not isinstance(step, dict):
+            raise RecipeError("Each recipe step must be an object")
+        kind = step.get("kind")
+        if kind == "clean":
+            options = step.get("options", {})
+            if not isinstance(options, dict):
+                raise RecipeError("Cleaning step options must be an object")
+            unknown = set(options) - set(CLEAN_FLAGS)
+            if unknown:
+                raise RecipeError(f"Unknown cleaning options: {', '.join(sorted(unknown))}")
+        elif kind == "issues":
+            issues = step.get("issues", [])
+            if not isinstance(issues, list):
+                raise RecipeError("Issue step issues must be a list")
+            for issue in issues:
+                if not isinstance(issue, dict):
+                    raise RecipeError("Each issue must be an object")
+                if issue.get("type") not in ISSUE_OPERATIONS:
+                    raise RecipeError(f"Unsupported issue type: {issue.get('type')}")
+                if issue["type"] == "outliers" and issue.get("column") is None:
+                    raise RecipeError("Outlier issues must name their column")
+        elif kind == "deduplicate_customers":
+            columns = step.get("columns")
+            if columns is not None and not (isinstance(columns, list) and all(isinstance(col, str) for col in columns)):
+                raise RecipeError("Deduplication columns must be a list of column names")
+            if not isinstance(step.get("threshold"), (int, float)) or not 0 < step["threshold"] <= 1:
+                raise RecipeError("Deduplication threshold must be between 0 and 1")
+            if not isinstance(step.get("window"), int) or step["window"] < 2:
+                raise RecipeError("Deduplication window must be at least 2")
+        else:
+            raise RecipeError(f"Unknown step kind: {kind}")
+
+
+def save_recipe(name, steps, source_file_id=None):
+    validate_steps(steps)
+    recipe = {
+        "recipe_id": str(uuid.uuid4()),
+        "name": name,
+        "version": 1,
+        "created_at": time.time(),
+        "source_file_id": source_file_id,
+        "steps": steps,
+    }
+    os.makedirs(RECIPE_DIR, exist_ok=True)
+    with open(_recipe_path(recipe["recipe_id"]), "w") as f:
+        json.dump(recipe, f, indent=2)
+    recipe_storage[recipe["recipe_id"]] = recipe
+    return recipe
+
+
+def delete_recipe(recipe_id):
+    recipe = recipe_storage.pop(recipe_id)
+    with _lock:
+        _compiled_recipes.pop((recipe_id, recipe["version"]), None)
+    try:
+        os.remove(_recipe_path(recipe_id))
+    except OSError:
+        pass
+
+
+def _apply_issues(df, issues, catalog=None):
+    df, _ = apply_issue_fixes(df, issues, catalog)
+    return df
+
+
+def _deduplicate(df, columns, threshold, window, catalog=None):
+    df, _ = deduplicate_customers(df, columns, threshold=threshold, window=window, catalog=catalog)
+    return df
+
+
+def compile_recipe(recipe):
+    """Turn recipe steps into (label, callable) pairs; cached per recipe version"""
+    key = (recipe["recipe_id"], recipe["version"])
+    compiled = _compiled_recipes.get(key)
+    record_cache("recipe_compiled", compiled is not None)
+    if compiled is not None:
+        return compiled
+    validate_steps(recipe["steps"])
+    compiled = []
+    for index, step in enumerate(recipe["steps"]):
+        if step["kind"] == "clean":
+            options = {flag: value for flag, value in step.get("options", {}).items() if value not in (False, "none")}
+            compiled.append((f"recipe_step_{index}_clean", functools.partial(clean_dataframe, **options)))
+        elif step["kind"] == "deduplicate_customers":
+            compiled.append((f"recipe_step_{index}_deduplicate_customers",
+                             functools.partial(_deduplicate, columns=step["columns"], threshold=step["threshold"],
+                                               window=step["window"])))
+        else:
+            issues = [dict(issue) for issue in step.get("issues", [])]
+            compiled.append((f"recipe_step_{index}_issues", functools.partial(_apply_issues, issues=issues)))
+    with _lock:
+        _compiled_recipes[key] = compiled
+    return compiled
+
+
+def apply_recipe(recipe, df, catalog=None):
+    """Replay the recipe on df; every step selects columns through the same catalog"""
+    catalog = catalog_for(df, catalog)
+    for label, step in compile_recipe(recipe):
+        with track_operation(label, len(df)):
+            df = step(df, catalog=catalog)
+    return df
+
+
+load_recipes()
@@ -0,0 +1,316 @@
+"""
+Time-series cleaning stage: gap filling, smoothing and downtime interpolation.
+
+Every operation detects the time key (a date/time column) and the entity key
+(machine, store, SKU, ...) from the column catalog, then works per entity in
+time order using grouped, vectorized pandas/numpy kernels - no Python loop over
+entities - so 100k entities x a year of hourly readings stays tractable.
+"""
+import numpy as np
+import pandas as pd
+
+from catalog import catalog_for
+
+# Grids larger than this multiple of the input are treated as a mis-inferred frequency
+MAX_GRID_EXPANSION = 20
+# Share of sampled values that must parse for a date-role column to be the time key
+TIME_KEY_PARSE_RATE = 0.8
+
+
+def detect_time_key(df, catalog=None):
+    """First column that is datetime-typed, else the first date-role column that mostly parses"""
+    for col in df.columns:
+        if pd.api.types.is_datetime64_any_dtype(df[col]):
+            return col
+    catalog = catalog_for(df, catalog)
+    for col in catalog.columns(df, role='date'):
+        if not pd.api.types.is_numeric_dtype(df[col]) and catalog.entry(df, col)['date_parse_rate'] >= TIME_KEY_PARSE_RATE:
+            return col
+    return None
+
+
+def detect_entity_keys(df, time_col=None, catalog=None):
+    """Identifier-like columns (machine, store, SKU...) with repeated values across rows"""
+    catalog = catalog_for(df, catalog)
+    entity_cols = []
+    for col in catalog.columns(df, tag='entity'):
+        if col == time_col or pd.api.types.is_float_dtype(df[col]):
+            continue
+        # Integer columns only count when named like an identifier (machine_id, store_no), not a measure
+        if pd.api.types.is_numeric_dtype(df[col]) and catalog.role(df, col) != 'id':
+            continue
+        # An entity key repeats across rows; near-unique columns are row identifiers
+        if df[col].nunique(dropna=True) <= max(1, len(df) // 2):
+            entity_cols.append(col)
+    return entity_cols
+
+
+def parse_times(series):
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return series
+    return pd.to_datetime(series, errors='coerce', format='mixed')
+
+
+def infer_frequency(times, codes):
+    """Median positive spacing between consecutive timestamps of the same entity"""
+    order = np.lexsort((times.to_numpy(dtype='int64'), codes))
+    t = times.to_numpy(dtype='int64')[order]
+    c = codes[order]
+    diffs = np.diff(t)[(np.diff(c) == 0)]
+    diffs = diffs[diffs > 0]
+    if len(diffs) == 0:
+        return None
+    return pd.Timedelta(int(np.median(diffs)), unit='ns')
+
+
+def format_times(times, freq):
+    """Date-only output for daily-or-coarser (or irregular) data at midnight (as before), full timestamps otherwise"""
+    valid = times.dropna()
+    if (freq is None or freq >= pd.Timedelta(days=1)) and (valid == valid.dt.normalize()).all():
+        return times.dt.strftime('%Y-%m-%d')
+    return times.dt.strftime('%Y-%m-%d %H:%M:%S')
+
+
+def _entity_codes(df, entity_cols):
+    if not entity_cols:
+        return np.zeros(len(df), dtype=np.int64)
+    return df.groupby(entity_cols, sort=False, dropna=False).ngroup().to_numpy()
+
+
+def interpolate_by_group(values, x, codes, max_gap=None):
+    """
+    Linear interpolation of NaNs in `values` against positions `x` (e.g. int64
+    nanoseconds), independently per group. Input must be sorted by (codes, x).
+    Only interior gaps are filled (no extrapolation); gaps wider than max_gap
+    (in x units) are left missing.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    x = np.asarray(x, dtype=np.float64)
+    valid = ~np.isnan(values)
+    if valid.all() or not valid.any():
+        return values
+    grouped_x = pd.Series(np.where(valid, x, np.nan)).groupby(codes)
+    grouped_v = pd.Series(values).groupby(codes)
+    prev_x, next_x = grouped_x.ffill().to_numpy(), grouped_x.bfill().to_numpy()
+    prev_v, next_v = grouped_v.ffill().to_numpy(), grouped_v.bfill().to_numpy()
+    span = next_x - prev_x
+    with np.errstate(invalid='ignore', divide='ignore'):
+        filled = prev_v + (next_v - prev_v) * np.where(span > 0, (x - prev_x) / span, 0.0)
+    if max_gap is not None:
+        filled[span > max_gap] = np.nan
+    return np.where(valid, values, filled)
+
+
+def _measurement_columns(df, exclude):
+    return [col for col in df.select_dtypes(include=['number']).columns if col not in exclude]
+
+
+def _identifier_columns(df, time_col, entity_cols, catalog=None):
+    """Row identifiers (order_id...): numeric but never interpolated or smoothed"""
+    return [col for col in catalog_for(df, catalog).columns(df, role='id')
+            if col not in entity_cols and col != time_col]
+
+
+# Largest whole unit a regular sampling step must be a multiple of, by step size
+STEP_UNITS = [(pd.Timedelta(days=1), "days"), (pd.Timedelta(hours=1), "hours"),
+              (pd.Timedelta(minutes=1), "minutes"), (pd.Timedelta(seconds=1), "seconds")]
+
+
+def regular_frequency(t, codes):
+    """
+    Sampling step of regularly spaced readings, as (step, None), or (None, reason).
+    `t` (int64 ns) and `codes` must be sorted by (codes, t) with unique pairs. The
+    step is the smallest gap between consecutive readings of an entity; every gap
+    must be a whole multiple of it (the others span missing periods), and the step
+    itself a whole number of days, hours, minutes or seconds.
+    """
+    gaps = np.diff(t)[np.diff(codes) == 0]
+    if len(gaps) == 0:
+        return None, "no entity has more than one reading"
+    step = int(gaps.min())
+    if (gaps % step).any():
+        return None, f"readings are not evenly spaced (gaps are not multiples of {pd.Timedelta(step, unit='ns')})"
+    freq = pd.Timedelta(step, unit='ns')
+    for unit, name in STEP_UNITS:
+        if freq >= unit:
+            if freq % unit:
+                return None, f"sampling step {freq} is not a whole number of {name}"
+            return freq, None
+    return None, f"sampling step {freq} is shorter than a second"
+
+
+def _ordered(df, time_col, entity_cols, freq, unparsed):
+    """Rows as they are, only ordered by (entity, time) with formatted timestamps; unparsed rows go last"""
+    out = df.sort_values(entity_cols + [time_col])
+    out[time_col] = format_times(out[time_col], freq)
+    return pd.concat([out, unparsed])
+
+
+def fill_time_gaps(df, time_col=None, entity_cols=None, freq=None, catalog=None):
+    """
+    Insert a row for every missing period of regularly sampled data, per entity
+    between its first and last timestamp. Inserted rows get numeric columns
+    interpolated in time and other columns carried forward from the entity's
+    previous reading; existing rows are never modified or combined.
+
+    Gaps are only filled when each (entity, period) has at most one row and the
+    readings sit on a regular step (inferred unless `freq` is given). Otherwise
+    rows are just ordered by entity and time, and the report's 'skipped' says why.
+    Rows whose timestamp does not parse are kept unchanged at the end and counted
+    in the report's 'unparsed_rows'.
+    """
+    time_col = time_col or detect_time_key(df, catalog)
+    if time_col is None:
+        return df, {"time_key": None}
+    entity_cols = detect_entity_keys(df, time_col, catalog) if entity_cols is None else entity_cols
+
+    work = df.copy()
+    work[time_col] = parse_times(work[time_col])
+    missing = work[time_col].isna().to_numpy()
+    # Unparsed rows keep their original time values
+    unparsed = df.take(np.flatnonzero(missing))
+    work = work.take(np.flatnonzero(~missing))
+    report = {"time_key": time_col, "entity_keys": entity_cols, "rows_added": 0, "unparsed_rows": int(missing.sum())}
+    if work.empty:
+        return df, report
+
+    codes = _entity_codes(work, entity_cols)
+    t = work[time_col].to_numpy(dtype='int64')
+    order = np.lexsort((t, codes))
+    sorted_t, sorted_codes = t[order], codes[order]
+    repeated = int(((np.diff(sorted_t) == 0) & (np.diff(sorted_codes) == 0)).sum())
+    if repeated:
+        report["skipped"] = f"{repeated} rows share a timestamp with another row of the same entity"
+    elif freq is not None:
+        freq = pd.Timedelta(freq)
+        gaps = np.diff(sorted_t)[np.diff(sorted_codes) == 0]
+        if freq <= pd.Timedelta(0) or (gaps % freq.value).any():
+            report["skipped"] = f"readings are not aligned to the requested frequency {freq}"
+    else:
+        freq, reason = regular_frequency(sorted_t, sorted_codes)
+        if reason:
+            report["skipped"] = reason
+    if freq is not None and freq > pd.Timedelta(days=27) and "skipped" not in report:
+        # Calendar frequencies (monthly and coarser) have no fixed spacing
+        report["skipped"] = f"frequency {freq} is monthly or coarser"
+    if freq is not None:
+        report["frequency"] = str(freq)
+    if "skipped" in report:
+        return _ordered(work, time_col, entity_cols, freq, unparsed), report
+
+    # Build the regular grid for every entity at once (repeat + cumulative offsets)
+    boundaries = np.flatnonzero(np.diff(sorted_codes)) + 1
+    first, last = sorted_t[np.r_[0, boundaries]], sorted_t[np.r_[boundaries - 1, len(sorted_t) - 1]]
+    steps = (last - first) // freq.value + 1
+    total = int(steps.sum())
+    if total > MAX_GRID_EXPANSION * len(work):
+        report["skipped"] = f"grid of {total} rows at frequency {freq} is too large"
+        return _ordered(work, time_col, entity_cols, freq, unparsed), report
+    group_start = np.cumsum(steps) - steps
+    offsets = np.arange(total) - np.repeat(group_start, steps)
+    grid_t = np.repeat(first, steps) + offsets * freq.value
+    grid_codes = np.repeat(np.arange(len(steps)), steps)
+
+    # Every reading sits exactly on its entity's grid (entity codes are dense), so rows are placed, never merged
+    slots = np.full(total, -1, dtype=np.int64)
+    slots[group_start[codes] + (t - first[codes]) // freq.value] = np.arange(len(work))
+    inserted = slots < 0
+    # An inserted row starts as a copy of the entity's previous reading: entity keys and
+    # other attributes carry forward, measurements are then interpolated in time
+    source = pd.Series(np.where(inserted, np.nan, slots)).groupby(grid_codes).ffill().to_numpy(dtype=np.int64)
+    out = work.iloc[source].copy()
+    out[time_col] = grid_t.astype('datetime64[ns]')
+    if inserted.any():
+        # Row identifiers (order_id...) of inserted periods are unknown, not carried or interpolated
+        identifiers = _identifier_columns(df, time_col, entity_cols, catalog)
+        for col in identifiers:
+            out[col] = out[col].where(~inserted)
+        for col in _measurement_columns(work, entity_cols + [time_col] + identifiers):
+            values = out[col].to_numpy(dtype=np.float64)
+            values[inserted] = np.nan
+            out[col] = np.where(inserted, interpolate_by_group(values, grid_t, grid_codes), values)
+
+    # Existing rows keep their labels; inserted rows are labelled after df's rows
+    if pd.api.types.is_integer_dtype(df.index):
+        start = int(df.index.max()) + 1
+        out.index = np.where(inserted, start + np.cumsum(inserted) - 1, work.index.to_numpy()[source])
+    else:
+        out.index = pd.RangeIndex(len(out))
+    report["rows_added"] = int(inserted.sum())
+    out[time_col] = format_times(out[time_col], freq)
+    return pd.concat([out, unparsed]), report
+
+
+def _sorted_view(df, time_col, entity_cols):
+    """Positions sorting rows by (entity, time) plus matching group codes and int64 times"""
+    times = parse_times(df[time_col])
+    codes = _entity_codes(df, entity_cols)
+    t = times.to_numpy(dtype='int64', na_value=np.iinfo(np.int64).max)
+    order = np.lexsort((t, codes))
+    return order, codes[order], t[order], times
+
+
+def interpolate_downtime(df, time_col=None, entity_cols=None, max_gap=None, catalog=None):
+    """Fill missing numeric readings by time-weighted interpolation within each entity"""
+    time_col = time_col or detect_time_key(df, catalog)
+    if time_col is None:
+        return df, {"time_key": None}
+    entity_cols = detect_entity_keys(df, time_col, catalog) if entity_cols is None else entity_cols
+    order, codes, t, times = _sorted_view(df, time_col, entity_cols)
+    max_gap_ns = pd.Timedelta(max_gap).value if max_gap is not None else None
+
+    df = df.copy()
+    filled_cells = 0
+    exclude = entity_cols + [time_col] + _identifier_columns(df, time_col, entity_cols, catalog)
+    for col in _measurement_columns(df, exclude):
+        values = df[col].to_numpy(dtype=np.float64)[order]
+        filled = interpolate_by_group(values, t, codes, max_gap_ns)
+        # Rows without a parseable timestamp are never interpolated
+        filled[t == np.iinfo(np.int64).max] = values[t == np.iinfo(np.int64).max]
+        restored = np.empty_like(filled)
+        restored[order] = filled
+        filled_cells += int(np.isnan(values).sum() - np.isnan(filled).sum())
+        df[col] = restored
+    return df, {"time_key": time_col, "entity_keys": entity_cols, "filled_cells": filled_cells}
+
+
+def smooth_sensor_data(df, time_col=None, entity_cols=None, periods=3, min_points=10, catalog=None):
+    """
+    Centered rolling mean over `periods` sampling intervals, per entity and in
+    time order. Without a time key, falls back to a positional window per entity.
+    """
+    time_col = time_col or detect_time_key(df, catalog)
+    entity_cols = detect_entity_keys(df, time_col, catalog) if entity_cols is None else entity_cols
+    exclude = entity_cols + ([time_col] if time_col else []) + _identifier_columns(df, time_col, entity_cols, catalog)
+    columns = [col for col in _measurement_columns(df, exclude)
+               if df[col].count() > min_points]  # Only smooth if we have enough data points
+    if not columns:
+        return df, {"time_key": time_col, "entity_keys": entity_cols, "columns": []}
+
+    df = df.copy()
+    if time_col is not None:
+        order, codes, t, times = _sorted_view(df, time_col, entity_cols)
+        freq = infer_frequency(times.iloc[order][t != np.iinfo(np.int64).max], codes[t != np.iinfo(np.int64).max])
+    else:
+        order = np.lexsort((np.arange(len(df)), _entity_codes(df, entity_cols)))
+        codes = _entity_codes(df, entity_cols)[order]
+        freq = None
+
+    work = df[columns].iloc[order].astype(np.float64).reset_index(drop=True)
+    if freq is not None:
+        valid = t != np.iinfo(np.int64).max
+        timed = work[valid].set_axis(pd.DatetimeIndex(t[valid].astype('datetime64[ns]')))
+        # Groups come back in ascending code order, which is the sorted row order
+        rolled = timed.groupby(codes[valid]).rolling(periods * freq, min_periods=1, center=True).mean()
+        smoothed = work.to_numpy().copy()
+        smoothed[valid] = rolled.to_numpy()
+    else:
+        smoothed = (work.groupby(codes).rolling(periods, min_periods=1, center=True).mean()
+                    .droplevel(0).sort_index().to_numpy())
+    original = df[columns].to_numpy(dtype=np.float64)
+    restored = np.empty_like(smoothed)
+    restored[order] = smoothed
+    # Keep original values wherever the window produced nothing
+    df[columns] = np.where(np.isnan(restored), original, restored)
+    return df, {"time_key": time_col, "entity_keys": entity_cols, "columns": [str(col) for col in columns],
+                "window": str(periods * freq) if freq is not None else periods}
@@ -0,0 +1,320 @@
+"""
+Resumable chunked uploads (a create / PATCH-chunk / finalize flow modelled on tus).
+
+A client creates an upload session with the file name and total length, then
+sends the file as a sequence of PATCH requests. Each PATCH names the offset it
+starts at and carries a checksum of its body. Chunks are streamed straight into
+a spool file on disk. A chunk is confirmed, and the session offset advanced,
+only when it was received completely and its checksum matches. A dropped
+connection or a bad chunk leaves the offset at the last confirmed byte, so the
+client resumes from there instead of starting over.
+
+Plain CSV uploads are parsed while chunks arrive: every confirmed chunk parses
+the complete rows received so far. Finalizing then only parses the last
+partial row and concatenates the parts. When the parts could differ from a
+one-shot parse of the whole file, the spool file is parsed from scratch so both
+upload paths produce the same dataset. This happens when column dtypes
+disagree between parts, a row cannot be split safely, or the text is not UTF-8.
+
+Sessions are held in memory (like every other store in this server) and expire
+after SESSION_TTL seconds of inactivity. A session is removed once its dataset
+is registered; a failed finalize keeps it so the client can retry.
+"""
+import asyncio
+import base64
+import binascii
+import hashlib
+import io
+import os
+import threading
+import time
+import uuid
+import warnings
+
+import pandas as pd
+
+from cleaning import file_format
+from decompression import detect_compression
+from metrics import counter, gauge, track_operation
+
+UPLOAD_DIR = os.environ.get("DATACLEANR_UPLOAD_DIR", "/tmp")
+# Largest file accepted through resumable uploads (same default as /api/upload), and largest single chunk
+MAX_UPLOAD_SIZE = int(os.environ.get("DATACLEANR_RESUMABLE_MAX_BYTES", str(1 * 1024 * 1024 * 1024)))
+MAX_CHUNK_SIZE = int(os.environ.get("DATACLEANR_RESUMABLE_MAX_CHUNK", str(64 * 1024 * 1024)))
+# Chunk size suggested to clients when a session is created
+CHUNK_SIZE = 8 * 1024 * 1024
+# Idle sessions (and their spool files) are removed after this many seconds
+SESSION_TTL = float(os.environ.get("DATACLEANR_UPLOAD_TTL", str(24 * 3600)))
+# Incremental parsing is abandoned when no row boundary shows up within this many bytes
+MAX_PENDING_BYTES = 4 * MAX_CHUNK_SIZE
+CHECKSUM_ALGORITHMS = ('sha256', 'sha1', 'md5')
+
+UPLOAD_CHUNKS = counter(
+    "datacleanr_upload_chunks_total",
+    "Resumable upload chunks by result",
+    ("result",))
+
+# upload_id -> UploadSession
+upload_sessions = {}
+_lock = threading.Lock()
+
+gauge("datacleanr_upload_sessions", "Resumable upload sessions in progress", callback=lambda: len(upload_sessions))
+
+
+class UploadError(ValueError):
+    """Raised when a chunk cannot be accepted; status_code tells the handler how to respond"""
+
+    def __init__(self, status_code, message):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def parse_checksum(header):
+    """'sha256 <base64 digest>' (the tus Upload-Checksum format) -> (algorithm, digest bytes)"""
+    if not header:
+        raise UploadError(400, "Upload-Checksum header is required: '<algorithm> <base64 digest>'")
+    algorithm, _, encoded = header.strip().partition(" ")
+    algorithm = algorithm.lower()
+    if algorithm not in CHECKSUM_ALGORITHMS:
+        raise UploadError(400, f"Unsupported checksum algorithm '{algorithm}'. Use one of: {', '.join(CHECKSUM_ALGORITHMS)}")
+    try:
+        return algorithm, base64.b64decode(encoded.strip(), validate=True)
+    except (binascii.Error, ValueError):
+        raise UploadError(400, "Upload-Checksum digest must be base64 encoded")
+
+
+def _row_boundary(region):
+    """End of the last complete CSV row in region (0 if none): a newline outside quoted fields"""
+    end = region.rfind(b"\n")
+    if end < 0:
+        return 0
+    # Quotes before a boundary must pair up; escaped quotes ("") count twice and keep the parity
+    quotes = region.count(b'"', 0, end)
+    while quotes % 2:
+        previous = region.rfind(b"\n", 0, end)
+        if previous < 0:
+            return 0
+        quotes -= region.count(b'"', previous, end)
+        end = previous
+    return end + 1
+
+
+def _consistent(dtypes):
+    """Whether parts with these dtypes concatenate to what one parse of all rows yields"""
+    distinct = set(dtypes)
+    return len(distinct) == 1 or distinct == {"int64", "float64"}
+
+
+class IncrementalCsvParser:
+    """Parses the complete rows of a growing CSV spool file into DataFrame parts"""
+
+    def __init__(self, path):
+        self.path = path
+        self.parsed_to = 0
+        self.columns = None
+        self.parts = []
+        self.rows = 0
+        self.failed = False
+
+    def _parse(self, data):
+        text = data.decode("utf-8")
+        with warnings.catch_warnings():
+            warnings.simplefilter("error", pd.errors.ParserWarning)
+            if self.columns is None:
+                part = pd.read_csv(io.StringIO(text))
+                self.columns = list(part.columns)
+            else:
+                part = pd.read_csv(io.StringIO(text), header=None, names=self.columns)
+        # Rows wider than the header turn into an index; let the full parse report them
+        if not isinstance(part.index, pd.RangeIndex):
+            raise ValueError("Row has more fields than the header")
+        return part
+
+    def feed(self, offset, final=False):
+        """Parse rows completed by the bytes up to offset (all remaining bytes when final)"""
+        if self.failed or offset <= self.parsed_to:
+            return
+        with open(self.path, "rb") as f:
+            f.seek(self.parsed_to)
+            region = f.read(offset - self.parsed_to)
+        if self.parsed_to == 0 and detect_compression(os.path.basename(self.path), region[:8]) is not None:
+            # A .csv name holding compressed bytes; the full parse decompresses it
+            self.abandon()
+            return
+        end = len(region) if final else _row_boundary(region)
+        if end == 0:
+            if len(region) > MAX_PENDING_BYTES:
+                self.abandon()
+            return
+        try:
+            with track_operation("parse_chunk"):
+                part = self._parse(region[:end])
+        except Exception as e:
+            print(f"Incremental parse stopped at byte {self.parsed_to}: {e}")
+            self.abandon()
+            return
+        if len(part) or not self.parts:
+            self.parts.append(part)
+            self.rows += len(part)
+        self.parsed_to += end
+
+    def abandon(self):
+        self.failed = True
+        self.parts = []
+
+    def frame(self):
+        """All parsed rows as one DataFrame, or None when the spool file must be parsed whole"""
+        if self.failed or not self.parts:
+            return None
+        parts = [part for part in self.parts if len(part)] or self.parts[:1]
+        for column in self.columns:
+            # All-missing parts take on any dtype without changing the combined result
+            dtypes = [str(part[column].dtype) for part in parts if part[column].notna().any()]
+            if dtypes and not _consistent(dtypes):
+                print(f"Column '{column}' parsed as {sorted(set(dtypes))} across chunks; parsing the whole file")
+                return None
+        with track_operation("concat_chunks", self.rows):
+            return pd.concat(parts, ignore_index=True) if len(parts) > 1 else parts[0]
+
+
+class UploadSession:
+    def __init__(self, filename, length):
+        self.upload_id = str(uuid.uuid4())
+        self.filename = filename
+        self.length = length
+        self.offset = 0
+        self.path = os.path.join(UPLOAD_DIR, f"datacleanr_upload_{self.upload_id}")
+        # Content hash of the confirmed bytes, for the content-addressed dataset registry
+        self.digest = hashlib.sha256()
+        self.parser = None
+        self.busy = False
+        self.updated = time.time()
+        open(self.path, "wb").close()
+
+    @property
+    def complete(self):
+        return self.offset == self.length
+
+    def head(self, nbytes):
+        with open(self.path, "rb") as f:
+            return f.read(nbytes)
+
+    def status(self):
+        return {
+            "upload_id": self.upload_id,
+            "filename": self.filename,
+            "offset": self.offset,
+            "length": self.length,
+            "complete": self.complete,
+            "chunk_size": CHUNK_SIZE,
+            "max_chunk_size": MAX_CHUNK_SIZE,
+            "parsed_rows": self.parser.rows if self.parser is not None and not self.parser.failed else None,
+        }
+
+    async def write_chunk(self, offset, checksum, stream):
+        """
+        Append the chunk read from the async byte iterator `stream` at `offset`.
+        The offset only advances once the whole chunk is written and its checksum
+        matches; otherwise the spool file is cut back to the last confirmed byte.
+        """
+        if self.busy:
+            raise UploadError(409, "Another chunk of this upload is still being received")
+        if offset != self.offset:
+            UPLOAD_CHUNKS.inc(result="offset_mismatch")
+            raise UploadError(409, f"Upload-Offset {offset} does not match the confirmed offset {self.offset}")
+        algorithm, expected = checksum
+        chunk_hash = hashlib.new(algorithm)
+        digest = self.digest.copy()
+        received = 0
+        self.busy = True
+        try:
+            with open(self.path, "r+b") as f:
+                f.seek(offset)
+                try:
+                    async for block in stream:
+                        received += len(block)
+                        if received > MAX_CHUNK_SIZE:
+                            raise UploadError(413, f"Chunks are limited to {MAX_CHUNK_SIZE // (1024 * 1024)}MB")
+                        if offset + received > self.length:
+                            raise UploadError(400, f"Chunk extends past the declared upload length {self.length}")
+                        chunk_hash.update(block)
+                        digest.update(block)
+                        f.write(block)
+                    if chunk_hash.digest() != expected:
+                        UPLOAD_CHUNKS.inc(result="checksum_mismatch")
+                        raise UploadError(460, "Checksum mismatch; resend the chunk")
+                except BaseException as e:
+                    # Unconfirmed bytes are dropped; the client resumes from the last confirmed offset
+                    f.truncate(offset)
+                    if not isinstance(e, UploadError):
+                        UPLOAD_CHUNKS.inc(result="interrupted")
+                    raise
+                f.truncate(offset + received)
+            self.offset += received
+            self.digest = digest
+            UPLOAD_CHUNKS.inc(result="accepted")
+            if self.parser is not None:
+                # Parsing is CPU-bound: keep it off the event loop, with the session still busy
+                await asyncio.to_thread(self.parser.feed, self.offset)
+        finally:
+            self.busy = False
+            self.updated = time.time()
+        return received
+
+    def discard(self):
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+def create_session(filename, length):
+    expire_sessions()
+    if length < 0:
+        raise UploadError(400, "Upload length must not be negative")
+    if length > MAX_UPLOAD_SIZE:
+        raise UploadError(413, f"Uploads are limited to {MAX_UPLOAD_SIZE // (1024 * 1024)}MB")
+    session = UploadSession(filename, length)
+    # Only plain CSV can be parsed before the whole file is known
+    if file_format(filename) == 'csv':
+        session.parser = IncrementalCsvParser(session.path)
+    with _lock:
+        upload_sessions[session.upload_id] = session
+    return session
+
+
+def get_session(upload_id):
+    session = upload_sessions.get(upload_id)
+    if session is None:
+        raise UploadError(404, "Upload not found or expired")
+    return session
+
+
+def remove_session(upload_id):
+    with _lock:
+        session = upload_sessions.pop(upload_id, None)
+    if session is not None:
+        session.discard()
+    return session
+
+
+def finalized_frame(session):
+    """The parsed upload when incremental parsing held up, otherwise None (the parts are dropped)"""
+    if session.parser is None:
+        return None
+    session.parser.feed(session.length, final=True)
+    frame = session.parser.frame()
+    if frame is None:
+        # Free the parts before the spool file is parsed whole
+        session.parser.abandon()
+    return frame
+
+
+def expire_sessions(now=None):
+    now = now or time.time()
+    expired = [upload_id for upload_id, session in list(upload_sessions.items())
+               if not session.busy and now - session.updated > SESSION_TTL]
+    for upload_id in expired:
+        remove_session(upload_id)
+    if expired:
+        print(f"Expired {len(expired)} idle upload session(s)")
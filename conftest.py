@@ -0,0 +1,25 @@
+import os
+import sys
+
+import pytest
+
+# Add the backend directory to the path so we can import the modules
+sys.path.append(os.path.join(os.path.dirname(__file__), 'backend'))
+
+
+@pytest.fixture(scope="session")
+def client():
+    from fastapi.testclient import TestClient
+    import main
+
+    return TestClient(main.app)
+
+
+@pytest.fixture
+def upload(client):
+    """Upload a DataFrame as CSV and return its file_id"""
+    def upload_frame(df, name="orders.csv"):
+        response = client.post("/api/upload", files={"file": (name, df.to_csv(index=False).encode())})
+        assert response.status_code == 200, response.text
+        return response.json()["file_id"]
+    return upload_frame
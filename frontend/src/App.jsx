@@ -294,8 +294,7 @@ function App() {
       setLoading(true);
       const requestData = {
         file_id: fileId,
-        selected_issues: selectedIssues,
-        analysis_report: dataAnalysis.analysis_report
+        selected_issues: selectedIssues
       };
 
       const response = await api.post('/api/clean-issues', requestData);
@@ -493,6 +492,8 @@ function App() {
         {(rawData || cleanedData) && (
           <div className="px-4 py-6 sm:px-0">
             <Visualization 
+              fileId={fileId}
+              api={api}
               rawData={rawData}
               cleanedData={cleanedData}
             />
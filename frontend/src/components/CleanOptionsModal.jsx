@@ -29,8 +29,8 @@ const CleanOptionsModal = ({
   const getDataQualityIssues = () => {
     if (!dataAnalysis || !dataAnalysis.analysis_report) return [];
     
-    return dataAnalysis.analysis_report.map((issue, index) => ({
-      id: `issue-${index}`,
+    return dataAnalysis.analysis_report.map((issue) => ({
+      id: issue.id,
       type: issue.type,
       description: issue.description,
       recommendation: issue.recommendation,
@@ -23,9 +23,11 @@ const FileUploader = ({ onFileUpload, loading, onSuggestCleaning, fileId }) => {
   };
 
   const handleFile = (file) => {
-    const fileType = file.name.split('.').pop().toLowerCase();
-    if (fileType !== 'csv' && fileType !== 'xlsx' && fileType !== 'xls') {
-      alert('Please upload a CSV or Excel file');
+    // Compressed uploads (.csv.gz, .zip, ...) are decompressed server-side
+    const fileType = file.name.toLowerCase().replace(/\.(gz|gzip|bz2|xz|zst|zstd|zip)$/, '').split('.').pop();
+    const compressed = /\.(gz|gzip|bz2|xz|zst|zstd|zip)$/i.test(file.name);
+    if (!compressed && fileType !== 'csv' && fileType !== 'xlsx' && fileType !== 'xls') {
+      alert('Please upload a CSV or Excel file (optionally compressed)');
       return;
     }
     onFileUpload(file);
@@ -80,7 +82,7 @@ const FileUploader = ({ onFileUpload, loading, onSuggestCleaning, fileId }) => {
           ref={fileInputRef}
           className="hidden"
           onChange={handleFileInputChange}
-          accept=".csv,.xlsx,.xls"
+          accept=".csv,.xlsx,.xls,.gz,.bz2,.xz,.zst,.zip"
         />
       </div>
 
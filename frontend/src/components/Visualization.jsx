@@ -28,17 +28,34 @@ ChartJS.register(
   Filler
 );
 
-const Visualization = ({ rawData, cleanedData }) => {
+// Categories shown per chart; the rest are folded into "Other" where that is meaningful
+const CATEGORY_LIMIT = 50;
+const PIE_LIMIT = 12;
+const LINE_LIMIT = 1000;
+const SCATTER_POINTS = 2000;
+
+const Visualization = ({ fileId, api, rawData, cleanedData }) => {
   const [chartType, setChartType] = useState('bar');
   const [xAxis, setXAxis] = useState('');
   const [yAxis, setYAxis] = useState('');
   const [chartData, setChartData] = useState(null);
   const [chartOptions, setChartOptions] = useState({});
   const [error, setError] = useState('');
+  const [loading, setLoading] = useState(false);
+  const [chartNote, setChartNote] = useState('');
   const chartRef = useRef(null);
 
   // Use cleaned data if available, otherwise use raw data
+  // (the preview rows only drive column selection; charts are aggregated server-side over all rows)
   const data = cleanedData || rawData;
+  const source = cleanedData ? 'cleaned' : 'raw';
+
+  const fetchAggregate = async (params) => {
+    const response = await api.get(`/api/aggregate/${fileId}`, { params: { source, ...params } });
+    return response.data;
+  };
+
+  const formatLabel = (label) => (label === null ? '(missing)' : String(label));
 
   // Get numeric and categorical columns
   const getColumns = () => {
@@ -69,9 +86,9 @@ const Visualization = ({ rawData, cleanedData }) => {
   const { numeric, categorical } = getColumns();
 
   // Generate chart based on selected options
-  const generateChart = () => {
-    if (!xAxis || !yAxis) {
-      setError('Please select both X and Y axes');
+  const generateChart = async () => {
+    if (!xAxis || (!yAxis && chartType !== 'histogram')) {
+      setError(chartType === 'histogram' ? 'Please select a column' : 'Please select both X and Y axes');
       return;
     }
 
@@ -81,40 +98,44 @@ const Visualization = ({ rawData, cleanedData }) => {
     }
 
     setError('');
+    setChartNote('');
+    setLoading(true);
     
     try {
       switch (chartType) {
         case 'bar':
-          generateBarChart();
+          await generateBarChart();
           break;
         case 'line':
-          generateLineChart();
+          await generateLineChart();
           break;
         case 'pie':
-          generatePieChart();
+          await generatePieChart();
           break;
         case 'scatter':
-          generateScatterChart();
+          await generateScatterChart();
+          break;
+        case 'histogram':
+          await generateHistogram();
           break;
         default:
           setError('Unsupported chart type');
       }
     } catch (err) {
-      setError('Error generating chart: ' + err.message);
+      setError('Error generating chart: ' + (err.response?.data?.detail || err.message));
+    } finally {
+      setLoading(false);
     }
   };
 
-  const generateBarChart = () => {
-    // For bar chart, X-axis should be categorical, Y-axis should be numeric
-    const labels = [...new Set(data.map(row => row[xAxis]))];
-    const values = labels.map(label => {
-      const matchingRows = data.filter(row => row[xAxis] === label);
-      const sum = matchingRows.reduce((acc, row) => {
-        const value = parseFloat(row[yAxis]);
-        return acc + (isNaN(value) ? 0 : value);
-      }, 0);
-      return sum / matchingRows.length; // Average value
-    });
+  const generateBarChart = async () => {
+    // For bar chart, X-axis should be categorical, Y-axis should be numeric (average per category)
+    const result = await fetchAggregate({ kind: 'group', x: xAxis, y: yAxis, func: 'mean', limit: CATEGORY_LIMIT });
+    const labels = result.labels.map(formatLabel);
+    const values = result.values;
+    if (result.other_categories > 0) {
+      setChartNote(`Showing the first ${labels.length} categories; ${result.other_categories} more not shown.`);
+    }
 
     setChartData({
       labels,
@@ -143,20 +164,14 @@ const Visualization = ({ rawData, cleanedData }) => {
     });
   };
 
-  const generateLineChart = () => {
-    // For line chart, we'll assume X-axis is time-based or sortable
-    const sortedData = [...data].sort((a, b) => {
-      if (typeof a[xAxis] === 'string' && typeof b[xAxis] === 'string') {
-        return a[xAxis].localeCompare(b[xAxis]);
-      }
-      return a[xAxis] - b[xAxis];
-    });
-
-    const labels = sortedData.map(row => row[xAxis]);
-    const values = sortedData.map(row => {
-      const value = parseFloat(row[yAxis]);
-      return isNaN(value) ? 0 : value;
-    });
+  const generateLineChart = async () => {
+    // For line chart, we'll assume X-axis is time-based or sortable (average per X value, in X order)
+    const result = await fetchAggregate({ kind: 'group', x: xAxis, y: yAxis, func: 'mean', sort: 'label', limit: LINE_LIMIT });
+    const labels = result.labels.map(formatLabel);
+    const values = result.values;
+    if (result.other_categories > 0) {
+      setChartNote(`Showing the first ${labels.length} points; ${result.other_categories} more not shown.`);
+    }
 
     setChartData({
       labels,
@@ -185,17 +200,15 @@ const Visualization = ({ rawData, cleanedData }) => {
     });
   };
 
-  const generatePieChart = () => {
-    // For pie chart, X-axis should be categorical, Y-axis should be numeric
-    const labels = [...new Set(data.map(row => row[xAxis]))];
-    const values = labels.map(label => {
-      const matchingRows = data.filter(row => row[xAxis] === label);
-      const sum = matchingRows.reduce((acc, row) => {
-        const value = parseFloat(row[yAxis]);
-        return acc + (isNaN(value) ? 0 : value);
-      }, 0);
-      return sum;
-    });
+  const generatePieChart = async () => {
+    // For pie chart, X-axis should be categorical, Y-axis should be numeric (total per category)
+    const result = await fetchAggregate({ kind: 'group', x: xAxis, y: yAxis, func: 'sum', sort: 'value', limit: PIE_LIMIT });
+    const labels = result.labels.map(formatLabel);
+    const values = [...result.values];
+    if (result.other_categories > 0) {
+      labels.push('Other');
+      values.push(result.other);
+    }
 
     setChartData({
       labels,
@@ -238,12 +251,13 @@ const Visualization = ({ rawData, cleanedData }) => {
     });
   };
 
-  const generateScatterChart = () => {
-    // For scatter chart, both axes should be numeric
-    const points = data.map(row => ({
-      x: parseFloat(row[xAxis]) || 0,
-      y: parseFloat(row[yAxis]) || 0,
-    })).filter(point => !isNaN(point.x) && !isNaN(point.y));
+  const generateScatterChart = async () => {
+    // For scatter chart, both axes should be numeric (uniformly downsampled on the server)
+    const result = await fetchAggregate({ kind: 'scatter', x: xAxis, y: yAxis, max_points: SCATTER_POINTS });
+    const points = result.points;
+    if (result.sampled) {
+      setChartNote(`Showing a sample of ${points.length} of ${result.total_points} points.`);
+    }
 
     setChartData({
       datasets: [
@@ -283,6 +297,39 @@ const Visualization = ({ rawData, cleanedData }) => {
     });
   };
 
+  const generateHistogram = async () => {
+    // Histogram of a single numeric column over all rows
+    const result = await fetchAggregate({ kind: 'histogram', x: xAxis, bins: 20 });
+    const labels = result.counts.map((_, i) =>
+      `${result.edges[i].toPrecision(4)} – ${result.edges[i + 1].toPrecision(4)}`);
+
+    setChartData({
+      labels,
+      datasets: [
+        {
+          label: `Rows per ${xAxis} range`,
+          data: result.counts,
+          backgroundColor: 'rgba(153, 102, 255, 0.6)',
+          borderColor: 'rgba(153, 102, 255, 1)',
+          borderWidth: 1,
+        },
+      ],
+    });
+
+    setChartOptions({
+      responsive: true,
+      plugins: {
+        legend: {
+          position: 'top',
+        },
+        title: {
+          display: true,
+          text: `Distribution of ${xAxis}`,
+        },
+      },
+    });
+  };
+
   // Download chart as PNG
   const downloadChartAsPNG = () => {
     if (!chartRef.current) return;
@@ -293,7 +340,7 @@ const Visualization = ({ rawData, cleanedData }) => {
     // Create download link
     const downloadLink = document.createElement('a');
     downloadLink.href = base64Image;
-    downloadLink.download = `chart-${chartType}-${xAxis}-vs-${yAxis}.png`;
+    downloadLink.download = chartType === 'histogram' ? `chart-histogram-${xAxis}.png` : `chart-${chartType}-${xAxis}-vs-${yAxis}.png`;
     document.body.appendChild(downloadLink);
     downloadLink.click();
     document.body.removeChild(downloadLink);
@@ -303,6 +350,7 @@ const Visualization = ({ rawData, cleanedData }) => {
   useEffect(() => {
     setChartData(null);
     setChartOptions({});
+    setChartNote('');
     setXAxis('');
     setYAxis('');
   }, [data]);
@@ -332,12 +380,13 @@ const Visualization = ({ rawData, cleanedData }) => {
             <option value="line">Line Chart</option>
             <option value="pie">Pie Chart</option>
             <option value="scatter">Scatter Plot</option>
+            <option value="histogram">Histogram</option>
           </select>
         </div>
         
         <div>
           <label className="block text-sm font-medium text-gray-700 mb-1">
-            {chartType === 'scatter' ? 'X-Axis (Numeric)' : 'X-Axis'}
+            {chartType === 'scatter' ? 'X-Axis (Numeric)' : chartType === 'histogram' ? 'Column (Numeric)' : 'X-Axis'}
           </label>
           <select
             value={xAxis}
@@ -345,7 +394,7 @@ const Visualization = ({ rawData, cleanedData }) => {
             className="mt-1 block w-full pl-3 pr-10 py-2 text-base border-gray-300 focus:outline-none focus:ring-primary focus:border-primary sm:text-sm rounded-md"
           >
             <option value="">Select column</option>
-            {(chartType === 'scatter' ? numeric : [...numeric, ...categorical]).map((col) => (
+            {(chartType === 'scatter' || chartType === 'histogram' ? numeric : [...numeric, ...categorical]).map((col) => (
               <option key={col} value={col}>{col}</option>
             ))}
           </select>
@@ -358,6 +407,7 @@ const Visualization = ({ rawData, cleanedData }) => {
           <select
             value={yAxis}
             onChange={(e) => setYAxis(e.target.value)}
+            disabled={chartType === 'histogram'}
             className="mt-1 block w-full pl-3 pr-10 py-2 text-base border-gray-300 focus:outline-none focus:ring-primary focus:border-primary sm:text-sm rounded-md"
           >
             <option value="">Select column</option>
@@ -370,9 +420,10 @@ const Visualization = ({ rawData, cleanedData }) => {
         <div className="flex items-end space-x-2">
           <button
             onClick={generateChart}
-            className="flex-1 inline-flex justify-center py-2 px-4 border border-transparent shadow-sm text-sm font-medium rounded-md text-white bg-primary hover:bg-primary-dark focus:outline-none"
+            disabled={loading}
+            className="flex-1 inline-flex justify-center py-2 px-4 border border-transparent shadow-sm text-sm font-medium rounded-md text-white bg-primary hover:bg-primary-dark focus:outline-none disabled:opacity-50"
           >
-            Generate Chart
+            {loading ? 'Generating...' : 'Generate Chart'}
           </button>
         </div>
       </div>
@@ -413,7 +464,9 @@ const Visualization = ({ rawData, cleanedData }) => {
             {chartType === 'line' && <Line ref={chartRef} data={chartData} options={chartOptions} />}
             {chartType === 'pie' && <Pie ref={chartRef} data={chartData} options={chartOptions} />}
             {chartType === 'scatter' && <Scatter ref={chartRef} data={chartData} options={chartOptions} />}
+            {chartType === 'histogram' && <Bar ref={chartRef} data={chartData} options={chartOptions} />}
           </div>
+          {chartNote && <p className="mt-2 text-sm text-gray-500">{chartNote}</p>}
         </div>
       )}
       
@@ -0,0 +1,105 @@
+import asyncio
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+# Add the backend directory to the path so we can import the modules
+sys.path.append(os.path.join(os.path.dirname(__file__), 'backend'))
+
+import admission
+import main
+from admission import AdmissionController, AdmissionError, estimate_upload_bytes
+
+MB = 1024 * 1024
+
+
+def acquire(controller, nbytes):
+    return asyncio.run(controller.acquire(nbytes, "test"))
+
+
+def rejection(controller, nbytes):
+    with pytest.raises(AdmissionError) as error:
+        acquire(controller, nbytes)
+    return error.value
+
+
+def test_requests_within_budget_are_admitted_and_released():
+    controller = AdmissionController(budget=100 * MB, usage=lambda: 10 * MB)
+    assert acquire(controller, 50 * MB) == 50 * MB
+    assert controller.reserved == 50 * MB
+    controller.release(50 * MB)
+    assert controller.reserved == 0
+    # A disabled budget admits everything without reserving
+    assert acquire(AdmissionController(budget=0), 10 ** 12) == 0
+
+
+def test_request_larger_than_budget_is_413_without_retry_after():
+    error = rejection(AdmissionController(budget=100 * MB, usage=lambda: 0), 200 * MB)
+    assert error.status_code == 413
+    assert not error.headers
+
+
+def test_full_queue_is_429_with_retry_after():
+    controller = AdmissionController(budget=100 * MB, max_queued=0, retry_after=7, usage=lambda: 90 * MB)
+    error = rejection(controller, 20 * MB)
+    assert (error.status_code, error.headers) == (429, {"Retry-After": "7"})
+
+
+def test_memory_that_never_frees_up_is_503():
+    controller = AdmissionController(budget=100 * MB, timeout=0.05, retry_after=3, usage=lambda: 90 * MB)
+    error = rejection(controller, 20 * MB)
+    assert (error.status_code, error.headers) == (503, {"Retry-After": "3"})
+    assert controller.queued == 0 and controller.reserved == 0
+
+
+def test_queued_request_is_admitted_once_memory_is_released():
+    controller = AdmissionController(budget=100 * MB, timeout=5, usage=lambda: 0)
+
+    async def scenario():
+        first = await controller.acquire(80 * MB, "test")
+        waiting = asyncio.ensure_future(controller.acquire(50 * MB, "test"))
+        await asyncio.sleep(0.05)
+        assert controller.queued == 1 and not waiting.done()
+        controller.release(first)
+        return await waiting
+
+    assert asyncio.run(scenario()) == 50 * MB
+
+
+def test_upload_estimate_uses_a_parsed_sample():
+    content = pd.DataFrame({"a": range(1000), "b": ["x" * 20] * 1000}).to_csv(index=False).encode()
+    estimate = estimate_upload_bytes("a.csv", len(content), content)
+    assert estimate > 4 * len(content)
+    # Compressed or Excel input cannot be sampled and uses the fixed expansion factor
+    assert estimate_upload_bytes("a.xlsx", 1000, b"PK\x03\x04") == 2 * 1000 + int(admission.UNSAMPLED_EXPANSION * 1000)
+
+
+@pytest.mark.parametrize("controller, status", [
+    (AdmissionController(budget=1, usage=lambda: 0), 413),
+    (AdmissionController(budget=100 * MB, max_queued=0, usage=lambda: 100 * MB), 429),
+    (AdmissionController(budget=100 * MB, timeout=0.05, usage=lambda: 100 * MB), 503),
+])
+def test_upload_endpoint_rejections(client, monkeypatch, controller, status):
+    monkeypatch.setattr(admission, "controller", controller)
+    response = client.post("/api/upload", files={"file": ("a.csv", b"a,b\n1,2\n")})
+    assert response.status_code == status
+    assert ("retry-after" in response.headers) == (status != 413)
+    assert controller.reserved == 0
+
+
+def test_oversized_upload_is_413(client, monkeypatch):
+    monkeypatch.setattr(main, "MAX_UPLOAD_SIZE", 4)
+    response = client.post("/api/upload", files={"file": ("a.csv", b"a,b\n1,2\n")})
+    assert response.status_code == 413
+
+
+def test_clean_endpoint_releases_its_reservation(client, monkeypatch):
+    response = client.post("/api/upload", files={"file": ("a.csv", b"a,b\n1,2\n1,2\n")})
+    file_id = response.json()["file_id"]
+    controller = AdmissionController(budget=1024 * MB, usage=lambda: 0)
+    monkeypatch.setattr(admission, "controller", controller)
+    response = client.post("/api/clean", data={"file_id": file_id, "remove_duplicates": "true"})
+    assert response.status_code == 200, response.text
+    assert controller.reserved == 0
@@ -0,0 +1,80 @@
+import os
+import sys
+
+import pandas as pd
+
+# Add the backend directory to the path so we can import the modules
+sys.path.append(os.path.join(os.path.dirname(__file__), 'backend'))
+
+import main
+from cleaning import clean_dataframe
+from incremental import steps_are_incremental
+
+
+def append(client, file_id, df, name="more.csv"):
+    return client.post("/api/append", data={"file_id": file_id},
+                       files={"file": (name, df.to_csv(index=False).encode())})
+
+
+def test_append_drops_rows_already_in_the_cleaned_data(client, upload):
+    raw = pd.DataFrame({"order_id": [1, 2, 2, 3], "name": [" ann", "bob ", "bob ", "cy"]})
+    file_id = upload(raw)
+    response = client.post("/api/clean", data={"file_id": file_id, "remove_duplicates": "true",
+                                               "trim_whitespace": "true"})
+    assert response.status_code == 200, response.text
+
+    # One row repeats an existing row, one repeats a row of the same delta, one is new
+    delta = pd.DataFrame({"order_id": [3, 4, 4], "name": ["cy", "dee", "dee"]})
+    response = append(client, file_id, delta)
+    assert response.status_code == 200, response.text
+    result = response.json()
+    assert result["rows_appended"] == 3
+    assert result["total_rows"] == 7
+    assert result["duplicates_in_delta"] == 2
+    assert result["cleaning_mode"] == "incremental"
+
+    cleaned = main.file_storage[file_id]["cleaned_data"]
+    expected = clean_dataframe(pd.concat([raw, delta], ignore_index=True), remove_duplicates=True,
+                               trim_whitespace=True)
+    assert sorted(cleaned["order_id"]) == sorted(expected["order_id"]) == [1, 2, 3, 4]
+    # Appended rows continue the raw row labels
+    assert list(main.file_storage[file_id]["data"].index) == list(range(7))
+
+
+def test_later_deduplication_replays_on_everything(client, upload):
+    steps = [{"kind": "clean", "options": {"trim_whitespace": True}},
+             {"kind": "clean", "options": {"remove_duplicates": True}}]
+    assert not steps_are_incremental(steps)
+    assert steps_are_incremental(steps[1:])
+
+    file_id = upload(pd.DataFrame({"order_id": [1, 2], "name": ["ann", "bob"]}))
+    entry = main.file_storage[file_id]
+    cleaned = entry["data"].copy()
+    for step in steps:
+        cleaned = clean_dataframe(cleaned, **step["options"])
+    main.store_cleaned_result(file_id, cleaned)
+    entry["steps"] = steps
+    response = append(client, file_id, pd.DataFrame({"order_id": [2, 3], "name": [" bob", "cy"]}))
+    assert response.status_code == 200, response.text
+    assert response.json()["cleaning_mode"] == "full"
+    # " bob" only duplicates an existing row once trimmed
+    assert sorted(entry["cleaned_data"]["order_id"]) == [1, 2, 3]
+
+
+def test_append_matches_columns_by_name(client, upload):
+    file_id = upload(pd.DataFrame({"a": [1, 2], "b": ["x", "y"]}))
+    response = append(client, file_id, pd.DataFrame({"b": ["z"], "a": [3]}))
+    assert response.status_code == 200, response.text
+    assert main.file_storage[file_id]["data"].to_dict("list") == {"a": [1, 2, 3], "b": ["x", "y", "z"]}
+
+
+def test_append_rejects_oversized_file(client, upload, monkeypatch):
+    file_id = upload(pd.DataFrame({"a": [1, 2]}))
+    monkeypatch.setattr(main, "MAX_UPLOAD_SIZE", 64)
+    response = append(client, file_id, pd.DataFrame({"a": range(100)}))
+    assert response.status_code == 413
+    assert len(main.file_storage[file_id]["data"]) == 2
+
+
+def test_append_to_unknown_file(client):
+    assert append(client, "missing", pd.DataFrame({"a": [1]})).status_code == 404
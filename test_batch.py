@@ -0,0 +1,77 @@
+import io
+import json
+import os
+import sys
+import zipfile
+
+import pandas as pd
+import pytest
+
+# Add the backend directory to the path so we can import the modules
+sys.path.append(os.path.join(os.path.dirname(__file__), 'backend'))
+
+import batch
+from batch import clean_file_job, resolve_server_directory
+from cleaning import clean_dataframe
+
+OPTIONS = {"remove_duplicates": True, "trim_whitespace": True, "harmonize_columns": True}
+RAW = pd.DataFrame({"Customer Name": [" ann", " ann", "bob "], "Amount": [1, 1, 2]})
+
+
+def test_clean_file_job_matches_clean_dataframe(tmp_path):
+    source = tmp_path / "orders.csv"
+    RAW.to_csv(source, index=False)
+    result = clean_file_job("orders.csv", str(source), str(tmp_path / "out.csv"), OPTIONS)
+    assert result["status"] == "success"
+    assert (result["input_rows"], result["rows"]) == (3, 2)
+    expected = clean_dataframe(RAW.copy(), **OPTIONS).reset_index(drop=True)
+    pd.testing.assert_frame_equal(pd.read_csv(tmp_path / "out.csv"), expected)
+
+
+def test_clean_file_job_reports_errors_instead_of_raising(tmp_path):
+    source = tmp_path / "notes.txt"
+    source.write_text("hello")
+    result = clean_file_job("notes.txt", str(source), str(tmp_path / "out.csv"), OPTIONS)
+    assert result["status"] == "error"
+    assert "Unsupported file format" in result["error"]
+
+
+def test_server_directories_stay_below_batch_root(tmp_path, monkeypatch):
+    monkeypatch.setattr(batch, "BATCH_ROOT", None)
+    with pytest.raises(PermissionError):
+        resolve_server_directory("feed")
+    (tmp_path / "feed").mkdir()
+    (tmp_path / "feed" / "a.csv").write_text("a\n1\n")
+    (tmp_path / "feed" / "readme.md").write_text("skip")
+    monkeypatch.setattr(batch, "BATCH_ROOT", str(tmp_path))
+    assert [name for name, _ in resolve_server_directory("feed")] == ["a.csv"]
+    with pytest.raises(PermissionError):
+        resolve_server_directory("../")
+    with pytest.raises(FileNotFoundError):
+        resolve_server_directory("missing")
+
+
+def test_batch_endpoint_cleans_every_file_into_one_archive(client):
+    files = [("files", (f"f{i}.csv", RAW.to_csv(index=False).encode())) for i in range(3)]
+    files.append(("files", ("bad.txt", b"zz")))
+    response = client.post("/api/batch/clean", files=files,
+                           data={"options": json.dumps(OPTIONS), "concurrency": "2"})
+    assert response.status_code == 200, response.text
+    result = response.json()
+    assert (result["files"], result["succeeded"], result["failed"]) == (4, 3, 1)
+    assert [r["filename"] for r in result["results"]] == ["f0.csv", "f1.csv", "f2.csv", "bad.txt"]
+
+    archive = zipfile.ZipFile(io.BytesIO(client.get(result["download_url"]).content))
+    assert archive.namelist() == ["0000_cleaned_f0.csv", "0001_cleaned_f1.csv", "0002_cleaned_f2.csv",
+                                  "manifest.json"]
+    cleaned = pd.read_csv(archive.open("0000_cleaned_f0.csv"))
+    assert cleaned.to_dict("list") == {"customer_name": ["ann", "bob"], "amount": [1, 2]}
+    assert json.loads(archive.read("manifest.json"))["batch_id"] == result["batch_id"]
+
+
+def test_batch_endpoint_errors(client):
+    assert client.post("/api/batch/clean", data={"options": "{}"}).status_code == 400
+    files = [("files", ("a.csv", b"a\n1\n"))]
+    assert client.post("/api/batch/clean", files=files, data={"options": "{not json"}).status_code == 400
+    assert client.post("/api/batch/clean", files=files, data={"output_format": "pdf"}).status_code == 400
+    assert client.get("/api/batch/missing/download").status_code == 404
@@ -0,0 +1,75 @@
+import os
+import sys
+import uuid
+
+import numpy as np
+import pandas as pd
+import pytest
+
+# Add the backend directory to the path so we can import the modules
+sys.path.append(os.path.join(os.path.dirname(__file__), 'backend'))
+
+import main
+from catalog import build_catalog, harmonize_name, name_tokens, profile_column
+
+ORDERS = pd.DataFrame({
+    "Order ID": [101, 102, 103, 104],
+    "Order Date": ["2024-01-05", "01/06/2024", "2024-01-07", "2024-01-08"],
+    "Customer Name": ["Ann Lee", "Bob Kim", "Cy Park", "Dee Moss"],
+    "Phone": ["+1 555 123 4567", "(555) 987-6543", "555.222.3333", "555-444-5555"],
+    "Price": ["$10.00", "$12.50", "$7.25", "$3.00"],
+    "Store": ["north", "south", "north", "south"],
+    "Notes": ["customer asked for a refund after the parcel arrived damaged"] * 4,
+})
+
+
+@pytest.mark.parametrize("column, role", [
+    ("Order ID", "id"),
+    ("Order Date", "date"),
+    ("Customer Name", "category"),
+    ("Phone", "phone"),
+    ("Price", "currency"),
+    ("Store", "category"),
+    ("Notes", "free_text"),
+])
+def test_roles_come_from_names_and_values(column, role):
+    assert build_catalog(ORDERS).role(ORDERS, column) == role
+
+
+def test_name_tags_and_tokens():
+    catalog = build_catalog(ORDERS)
+    assert catalog.columns(ORDERS, tag="customer_identifier") == ["Customer Name"]
+    assert "entity" in catalog.entry(ORDERS, "Store")["tags"]
+    assert name_tokens("customerID") == ["customer", "id"]
+    # Short keywords only match whole words
+    assert "sensitive" not in profile_column("Tidal", pd.Series([1.0]))["tags"]
+
+
+def test_single_column_roles():
+    assert profile_column("amount", pd.Series([1.5, 2.0]))["role"] == "currency"
+    assert profile_column("phone", pd.Series([5551234567, 5559876543]))["role"] == "phone"
+    assert profile_column("reading", pd.Series(np.arange(10.0)))["role"] == "numeric"
+    # Short strings are text once they have too many distinct values to be categories
+    assert profile_column("customer", pd.Series([f"customer {i}" for i in range(100)]))["role"] == "text"
+    assert profile_column("when", pd.Series(pd.to_datetime(["2024-01-01"])))["role"] == "date"
+
+
+def test_lookups_follow_harmonized_names():
+    catalog = build_catalog(ORDERS)
+    cleaned = ORDERS.rename(columns=harmonize_name)
+    assert catalog.role(cleaned, "order_date") == "date"
+    assert catalog.columns(cleaned, role="date") == ["order_date"]
+    # Columns the catalog does not know are profiled from the frame at hand
+    assert catalog.role(cleaned.assign(ship_date=["2024-02-01"] * 4), "ship_date") == "date"
+
+
+def test_catalog_is_built_once_per_dataset(client, upload):
+    df = ORDERS.assign(token=uuid.uuid4().hex)
+    first, second = upload(df), upload(df)
+    assert main.get_column_catalog(first) is main.get_column_catalog(second)
+
+    response = client.get(f"/api/catalog/{first}")
+    assert response.status_code == 200
+    roles = {entry["column"]: entry["role"] for entry in response.json()["columns"]}
+    assert roles["Order Date"] == "date" and roles["Price"] == "currency"
+    assert client.get("/api/catalog/missing").status_code == 404
@@ -0,0 +1,97 @@
+import os
+import sys
+import uuid
+
+import numpy as np
+import pandas as pd
+import pytest
+
+# Add the backend directory to the path so we can import the modules
+sys.path.append(os.path.join(os.path.dirname(__file__), 'backend'))
+
+import main
+from charts import ChartError, chart_aggregate, remember
+
+SALES = pd.DataFrame({
+    "region": ["north", "south", "north", "east", "north", None],
+    "amount": [10.0, 20.0, 30.0, 5.0, 40.0, 1.0],
+    "units": [1, 2, 3, 4, 5, 6],
+})
+
+
+def test_value_counts_fold_the_tail_into_other():
+    result = chart_aggregate(SALES, "value_counts", "region", limit=2)
+    assert result["labels"][0] == "north" and result["values"][0] == 3
+    assert len(result["labels"]) == 2
+    assert (result["other"], result["other_categories"]) == (2, 2)
+
+
+def test_group_aggregates_cover_every_row():
+    result = chart_aggregate(SALES, "group", "region", "amount", func="sum")
+    assert dict(zip(result["labels"], result["values"])) == {"east": 5.0, "north": 80.0, "south": 20.0, None: 1.0}
+    assert result["other"] == 0
+    # Non-additive aggregates have no 'other' slice
+    assert "other" not in chart_aggregate(SALES, "group", "region", "amount", func="mean", limit=1)
+
+
+def test_histogram_counts_missing_values():
+    df = pd.DataFrame({"v": [1.0, 2.0, 3.0, 4.0, np.nan, "x"]})
+    result = chart_aggregate(df, "histogram", "v", bins=3)
+    assert sum(result["counts"]) == 4
+    assert result["missing"] == 2
+    assert len(result["edges"]) == 4
+
+
+def test_scatter_is_downsampled_deterministically():
+    df = pd.DataFrame({"x": np.arange(1000.0), "y": np.arange(1000.0) * 2})
+    first = chart_aggregate(df, "scatter", "x", "y", max_points=100)
+    assert (len(first["points"]), first["total_points"], first["sampled"]) == (100, 1000, True)
+    assert first == chart_aggregate(df, "scatter", "x", "y", max_points=100)
+    assert all(point["y"] == 2 * point["x"] for point in first["points"])
+
+
+@pytest.mark.parametrize("kwargs", [
+    {"kind": "pie", "x": "region"},
+    {"kind": "group", "x": "region", "func": "median", "y": "amount"},
+    {"kind": "group", "x": "region"},
+    {"kind": "scatter", "x": "amount"},
+    {"kind": "histogram", "x": "nope"},
+    {"kind": "histogram", "x": "amount", "bins": 0},
+    {"kind": "value_counts", "x": "region", "limit": 0},
+    {"kind": "value_counts", "x": "region", "sort": "size"},
+])
+def test_invalid_chart_requests(kwargs):
+    with pytest.raises(ChartError):
+        chart_aggregate(SALES, **kwargs)
+
+
+def test_remember_evicts_oldest_entries():
+    cache = {}
+    for key in range(4):
+        remember(cache, key, key, limit=2)
+    assert list(cache) == [2, 3]
+
+
+def test_aggregate_endpoint_caches_per_dataset_version(client, upload):
+    file_id = upload(SALES.assign(token=uuid.uuid4().hex))
+    params = {"kind": "group", "x": "region", "y": "units", "func": "count"}
+    response = client.get(f"/api/aggregate/{file_id}", params=params)
+    assert response.status_code == 200, response.text
+    assert (response.json()["source"], response.json()["rows"]) == ("raw", 6)
+    # Raw charts are cached on the shared dataset, for every file_id holding it
+    assert len(main.dataset_storage[main.file_storage[file_id]["dataset_key"]]["charts"]) == 1
+
+    response = client.post("/api/clean", data={"file_id": file_id, "handle_missing": "drop"})
+    assert response.status_code == 200, response.text
+    cleaned = client.get(f"/api/aggregate/{file_id}", params=params).json()
+    assert (cleaned["source"], cleaned["rows"]) == ("cleaned", 5)
+    raw = client.get(f"/api/aggregate/{file_id}", params={**params, "source": "raw"}).json()
+    assert raw["rows"] == 6
+
+
+def test_aggregate_endpoint_errors(client, upload):
+    file_id = upload(SALES)
+    assert client.get(f"/api/aggregate/{file_id}", params={"kind": "pie", "x": "region"}).status_code == 400
+    assert client.get(f"/api/aggregate/{file_id}", params={"kind": "histogram", "x": "amount",
+                                                           "source": "cleaned"}).status_code == 404
+    assert client.get("/api/aggregate/missing", params={"kind": "histogram", "x": "amount"}).status_code == 404
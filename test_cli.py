@@ -0,0 +1,85 @@
+import gzip
+import json
+import os
+import subprocess
+import sys
+
+import pandas as pd
+import pytest
+
+# Add the backend directory to the path so we can import the modules
+BACKEND = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend')
+sys.path.append(BACKEND)
+
+import datacleanr
+from datacleanr import main, output_paths, parse_options
+
+RAW = pd.DataFrame({"Name": [" ann", " ann", "bob "], "Amount": [1, 1, 2]})
+
+
+def results(capsys):
+    return [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+
+
+def test_library_import_is_lazy():
+    code = ("import sys, datacleanr; before = 'pandas' in sys.modules; datacleanr.clean_dataframe; "
+            "print(before, 'pandas' in sys.modules, 'fastapi' in sys.modules)")
+    out = subprocess.run([sys.executable, "-c", code], cwd=BACKEND, capture_output=True, text=True, check=True)
+    assert out.stdout.split() == ["False", "True", "False"]
+    with pytest.raises(AttributeError):
+        datacleanr.no_such_name
+
+
+def test_clean_command_writes_outputs_and_json_lines(tmp_path, capsys):
+    RAW.to_csv(tmp_path / "a.csv", index=False)
+    (tmp_path / "b.csv.gz").write_bytes(gzip.compress(RAW.to_csv(index=False).encode()))
+    out_dir = tmp_path / "out"
+    code = main(["clean", str(tmp_path / "a.csv"), str(tmp_path / "b.csv.gz"), "-o", str(out_dir),
+                 "--set", "remove_duplicates", "--set", "trim_whitespace=true"])
+    assert code == 0
+    records = results(capsys)
+    assert [r["status"] for r in records] == ["success", "success"]
+    assert [os.path.basename(r["output"]) for r in records] == ["a_cleaned.csv", "b_cleaned.csv"]
+    assert pd.read_csv(out_dir / "b_cleaned.csv").to_dict("list") == {"Name": ["ann", "bob"], "Amount": [1, 2]}
+
+
+def test_clean_directory_in_parallel_reports_failures(tmp_path, capsys):
+    inbox = tmp_path / "inbox"
+    inbox.mkdir()
+    for name in ("a.csv", "b.csv"):
+        RAW.to_csv(inbox / name, index=False)
+    (inbox / "empty.csv").write_text("")
+    (inbox / "notes.md").write_text("ignored")
+    code = main(["clean", str(inbox), "-o", str(tmp_path / "out"), "--options", '{"remove_duplicates": true}',
+                 "-j", "2"])
+    assert code == 1
+    records = results(capsys)
+    assert [r["filename"] for r in records] == ["a.csv", "b.csv", "empty.csv"]
+    assert [r["status"] for r in records] == ["success", "success", "error"]
+
+
+def test_analyze_and_suggest_commands(tmp_path, capsys):
+    RAW.to_csv(tmp_path / "a.csv", index=False)
+    assert main(["analyze", str(tmp_path / "a.csv")]) == 0
+    report, = results(capsys)
+    assert (report["total_rows"], report["total_columns"]) == (3, 2)
+    assert main(["suggest", str(tmp_path / "a.csv")]) == 0
+    suggestion, = results(capsys)
+    assert "remove_duplicates" in suggestion["suggestions"]
+    assert main(["analyze", str(tmp_path / "missing.csv")]) == 1
+
+
+def test_option_errors_exit_with_usage_error(tmp_path):
+    with pytest.raises(ValueError, match="Unknown cleaning options"):
+        parse_options(None, ["no_such_flag"])
+    assert parse_options('{"handle_missing": "drop"}', ["remove_duplicates=no"]) == {
+        "handle_missing": "drop", "remove_duplicates": False}
+    with pytest.raises(SystemExit) as exit_info:
+        main(["clean", str(tmp_path), "--recipe", "r.json", "--set", "remove_duplicates"])
+    assert exit_info.value.code == 2
+
+
+def test_repeated_output_names_get_suffixes(tmp_path):
+    inputs = [("sales.csv", "x/sales.csv"), ("sales.csv.gz", "y/sales.csv.gz"), ("sales.xlsx", "z/sales.xlsx")]
+    assert [os.path.basename(path) for path in output_paths(inputs, str(tmp_path), "csv")] == [
+        "sales_cleaned.csv", "sales_cleaned_2.csv", "sales_cleaned_3.csv"]
@@ -0,0 +1,88 @@
+import os
+import sys
+import warnings
+
+import pandas as pd
+import pytest
+
+# Add the backend directory to the path so we can import the modules
+sys.path.append(os.path.join(os.path.dirname(__file__), 'backend'))
+
+import columnar
+from cleaning import _strip, clean_dataframe
+from columnar import apply_elementwise, get_executor, shutdown_executors
+
+
+@pytest.fixture
+def parallel(monkeypatch):
+    # Force the pools even on tiny frames
+    monkeypatch.setattr(columnar, "PARALLEL_MIN_CELLS", 0)
+    monkeypatch.setattr(columnar, "PROCESS_MIN_ROWS", 0)
+    yield
+    shutdown_executors()
+
+
+@pytest.mark.parametrize("options", [
+    {"remove_duplicates": True, "trim_whitespace": True, "standardize_dates": True},
+    {"handle_missing": "drop", "trim_whitespace": True},
+    {"remove_duplicates": True, "handle_missing": "fill_mean", "standardize_units": True},
+    {"deduplicate_customers": True, "trim_whitespace": True},
+])
+def test_cleaning_after_row_filters_does_not_warn(options):
+    df = pd.DataFrame({
+        "customer_name": [" ann", "bob ", "bob ", "ann"],
+        "email": ["a@x.com", "b@x.com", "b@x.com", "a@x.com"],
+        "signup_date": ["2024-01-01", "01/02/2024", "01/02/2024", "2024-03-01"],
+        "score": [1.0, None, None, 3.0],
+    })
+    with warnings.catch_warnings():
+        warnings.simplefilter("error", pd.errors.SettingWithCopyWarning)
+        clean_dataframe(df, **options)
+
+
+def test_mixed_date_formats_parse_without_deprecation_warnings():
+    df = pd.DataFrame({"signup_date": ["2024-01-05", "01/02/2024", "March 3, 2024", "nope"]})
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        out = clean_dataframe(df, standardize_dates=True)
+    assert out["signup_date"].tolist()[:3] == ["2024-01-05", "2024-01-02", "2024-03-03"]
+    assert pd.isna(out["signup_date"].iloc[3])
+
+
+def test_parallel_columns_match_sequential(parallel):
+    df = pd.DataFrame({f"c{i}": [f" {i}-{j} " for j in range(50)] for i in range(4)})
+    expected = apply_elementwise(df.copy(), df.columns, _strip, workers=1)
+    result = apply_elementwise(df.copy(), df.columns, _strip, workers=2)
+    pd.testing.assert_frame_equal(result, expected)
+    assert list(result.columns) == list(df.columns)
+
+
+def test_parallel_cleaning_matches_sequential(parallel, monkeypatch):
+    df = pd.DataFrame({
+        "customer_name": [" ann", "bob ", "bob ", "ann"] * 10,
+        "signup_date": ["2024-01-01", "01/02/2024", "01/02/2024", "2024-03-01"] * 10,
+        "score": [1.0, None, None, 3.0] * 10,
+    })
+    options = {"trim_whitespace": True, "standardize_dates": True, "handle_missing": "fill_mean"}
+    monkeypatch.setattr(columnar, "COLUMN_WORKERS", 2)
+    parallel_result = clean_dataframe(df.copy(), **options)
+    monkeypatch.setattr(columnar, "COLUMN_WORKERS", 1)
+    pd.testing.assert_frame_equal(parallel_result, clean_dataframe(df.copy(), **options))
+
+
+def test_process_pool_is_spawned_and_shut_down(parallel):
+    executor = get_executor("process", 2)
+    assert executor._mp_context.get_start_method() == "spawn"
+    assert get_executor("process", 2) is executor
+    shutdown_executors()
+    assert columnar._executors == {}
+
+
+def test_server_shutdown_stops_worker_pools():
+    import main
+    from fastapi.testclient import TestClient
+
+    # Entering the client runs the app's startup and shutdown handlers
+    with TestClient(main.app):
+        get_executor("thread", 2)
+    assert columnar._executors == {}
@@ -0,0 +1,81 @@
+import os
+import sys
+import uuid
+
+import pandas as pd
+
+# Add the backend directory to the path so we can import the modules
+sys.path.append(os.path.join(os.path.dirname(__file__), 'backend'))
+
+import main
+from datasets import StreamingHasher, acquire, content_key, dataset_storage, register, release
+
+def unique_orders():
+    # Content no other test uploads, so reuse is only between this test's uploads
+    return pd.DataFrame({"name": [" ann", "bob", "bob"], "token": [uuid.uuid4().hex] * 3})
+
+
+def test_streaming_hasher_matches_whole_content_hash():
+    hasher = StreamingHasher()
+    for chunk in (b"a,b\n", b"1,2\n"):
+        hasher.update(chunk)
+    other = StreamingHasher()
+    other.update(b"a,b\n1,2\n")
+    assert hasher.hexdigest() == other.hexdigest()
+    assert (hasher.size, hasher.content()) == (8, b"a,b\n1,2\n")
+
+
+def test_content_key_includes_parse_settings():
+    assert content_key("abc", "a.csv") == content_key("abc", "b.csv")
+    assert content_key("abc", "a.csv") != content_key("abc", "a.xlsx")
+    assert content_key("abc", "a.csv", sep=";") != content_key("abc", "a.csv")
+
+
+def test_datasets_are_reference_counted():
+    key = f"test:{uuid.uuid4().hex}"
+    df = pd.DataFrame({"a": [1]})
+    assert acquire(key) is None
+    assert register(key, df)["refcount"] == 1
+    assert acquire(key)["data"] is df
+    release(key)
+    assert dataset_storage[key]["refcount"] == 1
+    release(key)
+    assert key not in dataset_storage
+    release(key)
+
+
+def test_identical_uploads_share_one_parsed_dataset(client, upload):
+    df = unique_orders()
+    first, second = upload(df), upload(df, name="copy.csv")
+    entry, other = main.file_storage[first], main.file_storage[second]
+    assert entry["dataset_key"] == other["dataset_key"]
+    assert entry["data"] is other["data"]
+    assert dataset_storage[entry["dataset_key"]]["refcount"] == 2
+
+    client.delete(f"/api/files/{first}")
+    assert dataset_storage[other["dataset_key"]]["refcount"] == 1
+    client.delete(f"/api/files/{second}")
+    assert other["dataset_key"] not in dataset_storage
+
+
+def test_cleaning_one_upload_leaves_the_shared_data_untouched(client, upload):
+    df = unique_orders()
+    first, second = upload(df), upload(df)
+    response = client.post("/api/clean", data={"file_id": first, "remove_duplicates": "true",
+                                               "trim_whitespace": "true"})
+    assert response.status_code == 200, response.text
+    raw = main.file_storage[second]["data"]
+    assert raw["name"].tolist() == [" ann", "bob", "bob"]
+    assert main.file_storage[first]["cleaned_data"]["name"].tolist() == ["ann", "bob"]
+
+
+def test_append_detaches_from_the_shared_dataset(client, upload):
+    df = unique_orders()
+    first, second = upload(df), upload(df)
+    response = client.post("/api/append", data={"file_id": first},
+                           files={"file": ("more.csv", b"name,token\ncy,x\n")})
+    assert response.status_code == 200, response.text
+    assert main.file_storage[first]["dataset_key"] is None
+    assert len(main.file_storage[first]["data"]) == 4
+    assert len(main.file_storage[second]["data"]) == 3
+    assert dataset_storage[main.file_storage[second]["dataset_key"]]["refcount"] == 1
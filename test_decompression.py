@@ -0,0 +1,119 @@
+import bz2
+import gzip
+import io
+import lzma
+import os
+import sys
+import uuid
+import zipfile
+
+import pandas as pd
+import pytest
+
+# Add the backend directory to the path so we can import the modules
+sys.path.append(os.path.join(os.path.dirname(__file__), 'backend'))
+
+import decompression
+import main
+from cleaning import DataFormatError, read_dataframe
+from decompression import DecompressedSizeError, compressed_members, detect_compression, inner_filename
+
+def csv_bytes(rows=3):
+    # A unique column keeps uploads from reusing another test's parsed dataset
+    return pd.DataFrame({"id": range(rows), "token": uuid.uuid4().hex}).to_csv(index=False).encode()
+
+
+def zipped(members):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, content in members.items():
+            archive.writestr(name, content)
+    return buffer.getvalue()
+
+
+@pytest.mark.parametrize("compress, name, expected", [
+    (gzip.compress, "a.csv.gz", "gzip"),
+    (bz2.compress, "a.csv.bz2", "bzip2"),
+    (lzma.compress, "a.csv.xz", "xz"),
+    (lambda content: zipped({"a.csv": content}), "a.zip", "zip"),
+])
+def test_compressed_csv_parses_like_plain_csv(compress, name, expected):
+    content = csv_bytes()
+    packed = compress(content)
+    assert detect_compression(name, packed[:8]) == expected
+    pd.testing.assert_frame_equal(read_dataframe(name, packed), read_dataframe("a.csv", content))
+
+
+@pytest.mark.parametrize("compress, name", [
+    (lambda content: content, "a.csv"),
+    (gzip.compress, "a.csv.gz"),
+    (lzma.compress, "a.csv.xz"),
+    (lambda content: zipped({"a.csv": content}), "a.zip"),
+])
+def test_files_on_disk_parse_like_bytes(compress, name, tmp_path):
+    content = csv_bytes()
+    path = tmp_path / "spool"
+    path.write_bytes(compress(content))
+    pd.testing.assert_frame_equal(read_dataframe(name, path=str(path)), read_dataframe("a.csv", content))
+
+
+def test_zstd_upload():
+    zstandard = pytest.importorskip("zstandard")
+    content = csv_bytes()
+    packed = zstandard.ZstdCompressor().compress(content)
+    pd.testing.assert_frame_equal(read_dataframe("a.csv.zst", packed), read_dataframe("a.csv", content))
+
+
+def test_detection_uses_magic_bytes_not_names():
+    assert detect_compression("data.csv", gzip.compress(b"a\n1\n")[:8]) == "gzip"
+    # Excel workbooks are zip containers but are parsed as Excel
+    assert detect_compression("book.xlsx", b"PK\x03\x04rest") is None
+    assert detect_compression("a.csv", b"a,b\n1,2") is None
+    assert inner_filename("sales.csv.gz") == "sales.csv"
+    assert inner_filename("export.gz") == "export.csv"
+
+
+def test_archive_members_are_stacked_when_columns_match():
+    first, second = b"a,b\n1,2\n", b"a,b\n3,4\n"
+    archive = zipped({"one.csv": first, "two.csv": second, "__MACOSX/._one.csv": b"junk", ".hidden.csv": b"x"})
+    assert read_dataframe("both.zip", archive).to_dict("list") == {"a": [1, 3], "b": [2, 4]}
+    with pytest.raises(DataFormatError, match="different columns"):
+        read_dataframe("mixed.zip", zipped({"one.csv": first, "two.csv": b"c\n5\n"}))
+    with pytest.raises(DataFormatError):
+        read_dataframe("empty.zip", zipped({}))
+
+
+def test_streams_stop_at_the_decompressed_size_limit():
+    content = b"a\n" + b"1\n" * 5000
+    (name, open_stream), = compressed_members("a.csv.gz", gzip.compress(content), "gzip")
+    assert name == "a.csv"
+    with open_stream(decompression.new_budget(len(content))) as stream:
+        assert stream.read() == content
+    with pytest.raises(DecompressedSizeError):
+        with open_stream(decompression.new_budget(1000)) as stream:
+            stream.read()
+    # Declared zip sizes are rejected before anything is decompressed
+    with pytest.raises(DecompressedSizeError):
+        compressed_members("a.zip", zipped({"a.csv": content}), "zip", limit=1000)
+
+
+@pytest.mark.parametrize("name, pack", [
+    ("bomb.csv.gz", gzip.compress),
+    ("bomb.zip", lambda content: zipped({"bomb.csv": content})),
+])
+def test_decompression_bomb_upload_is_rejected(client, monkeypatch, name, pack):
+    monkeypatch.setattr(decompression, "MAX_DECOMPRESSED_SIZE", 64 * 1024)
+    bomb = pack(b"a,b\n" + b"0,0\n" * 100000)
+    assert len(bomb) < 64 * 1024
+    response = client.post("/api/upload", files={"file": (name, bomb)})
+    assert response.status_code == 413
+    assert "limit" in response.json()["detail"]
+
+
+def test_compressed_upload_endpoint(client):
+    content = csv_bytes(5)
+    response = client.post("/api/upload", files={"file": ("orders.csv.gz", gzip.compress(content))})
+    assert response.status_code == 200, response.text
+    assert len(main.file_storage[response.json()["file_id"]]["data"]) == 5
+    response = client.post("/api/upload", files={"file": ("broken.csv.gz", b"\x1f\x8b\x08\x00broken")})
+    assert response.status_code == 400
@@ -0,0 +1,103 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+# Add the backend directory to the path so we can import the modules
+sys.path.append(os.path.join(os.path.dirname(__file__), 'backend'))
+
+import main
+from dedupe import deduplicate_customers, find_duplicate_clusters, pair_similarity, trigram_ids
+
+
+def similarity(a, b):
+    ids, sizes = trigram_ids(pd.Series([a, b]))
+    return float(pair_similarity(ids, sizes, np.array([0]), np.array([1]))[0])
+
+
+def test_normalized_and_typo_duplicates_merge():
+    df = pd.DataFrame({
+        "customer_name": ["Maria Garcia", "maria  garcia", "Jonathan Smithson", "Jonathan Smithsen", "Eva Novak"],
+        "email": ["mgarcia@x.com", "MGARCIA@x.com", "jsmith@y.org", "jsmith@y.org", "eva@z.net"],
+    })
+    assert list(find_duplicate_clusters(df)) == [0, 0, 2, 2, 4]
+
+
+def test_different_emails_veto_similar_names():
+    df = pd.DataFrame({
+        "customer_name": ["Maria Garcia", "Mario Garcia", "Marla Garcia"],
+        "email": ["mgarcia@x.com", "mgarcia2@x.com", "mgarcia@x.com"],
+    })
+    # The name typo with the same email still merges
+    assert list(find_duplicate_clusters(df)) == [0, 1, 0]
+
+
+def test_different_ids_veto_identical_names():
+    df = pd.DataFrame({"customer_id": [101, 102, 101], "customer_name": ["Li Wong", "Li Wong", "Li Wong"]})
+    assert list(find_duplicate_clusters(df, ["customer_id", "customer_name"])) == [0, 1, 0]
+
+
+def test_matches_do_not_chain():
+    a = "abcdefghijklmnopqrstuvwxyz"
+    b = a[:5] + "Q" + a[6:]
+    c = b[:18] + "Q" + b[19:]
+    assert similarity(a, b) >= 0.85 and similarity(b, c) >= 0.85 > similarity(a, c)
+    df = pd.DataFrame({"customer_name": [a, b, c]})
+    # c only resembles a through b, so it is not merged into a's cluster
+    assert list(find_duplicate_clusters(df, ["customer_name"])) == [0, 0, 2]
+
+
+def test_distinct_customers_are_kept():
+    rng = np.random.default_rng(0)
+    first = rng.choice(["maria", "mario", "john", "jon", "anna", "ann", "peter", "petra"], 5000)
+    last = rng.choice(["garcia", "smith", "jones", "brown", "lee", "wong"], 5000)
+    df = pd.DataFrame({
+        "customer_name": pd.Series(first) + " " + pd.Series(last),
+        "email": [f"{f}.{l}{i}@x.com" for i, (f, l) in enumerate(zip(first, last))],
+    })
+    deduplicated, report = deduplicate_customers(df)
+    assert report["rows_removed"] == 0
+    assert len(deduplicated) == len(df)
+
+
+def test_report_counts_removed_rows():
+    df = pd.DataFrame({"customer_name": ["Ann Lee", "ann lee", "ANN LEE", "Tom Kim"],
+                       "email": ["a@x.com", "a@x.com", "a@x.com", "t@x.com"]})
+    deduplicated, report = deduplicate_customers(df)
+    assert list(deduplicated.index) == [0, 3]
+    assert report["rows_removed"] == 2
+    assert report["largest_cluster"] == 3
+    assert report["cluster_size_distribution"] == {3: 1}
+
+
+def test_endpoint_records_a_replayable_step(client, upload, monkeypatch, tmp_path):
+    monkeypatch.setattr("recipes.RECIPE_DIR", str(tmp_path))
+    file_id = upload(pd.DataFrame({
+        "customer_name": ["Maria Garcia", "maria  garcia", "Eva Novak"],
+        "email": ["mgarcia@x.com", "MGARCIA@x.com", "eva@z.net"],
+    }))
+    assert client.post("/api/clean", data={"file_id": file_id, "trim_whitespace": "true"}).status_code == 200
+    response = client.post("/api/deduplicate-customers", data={"file_id": file_id, "threshold": "0.9"})
+    assert response.status_code == 200, response.text
+    entry = main.file_storage[file_id]
+    assert entry["steps"][-1] == {"kind": "deduplicate_customers", "columns": None, "threshold": 0.9, "window": 5}
+    assert len(entry["cleaned_data"]) == 2
+
+    # Undo goes back to the cleaning step alone
+    assert client.post("/api/undo", data={"file_id": file_id}).status_code == 200
+    assert [step["kind"] for step in entry["steps"]] == ["clean"]
+    assert len(entry["cleaned_data"]) == 3
+    assert client.post("/api/redo", data={"file_id": file_id}).status_code == 200
+    assert len(entry["cleaned_data"]) == 2
+
+    response = client.post("/api/recipes", json={"name": "dedupe", "file_id": file_id})
+    assert response.status_code == 200, response.text
+    assert [step["kind"] for step in response.json()["steps"]] == ["clean", "deduplicate_customers"]
+
+    # Appending a duplicate replays the deduplication on everything
+    more = pd.DataFrame({"customer_name": ["Eva  Novak"], "email": ["EVA@z.net"]})
+    response = client.post("/api/append", data={"file_id": file_id},
+                           files={"file": ("more.csv", more.to_csv(index=False).encode())})
+    assert response.json()["cleaning_mode"] == "full"
+    assert len(entry["cleaned_data"]) == 2
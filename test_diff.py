@@ -0,0 +1,60 @@
+import os
+import sys
+
+import pandas as pd
+
+# Add the backend directory to the path so we can import the modules
+sys.path.append(os.path.join(os.path.dirname(__file__), 'backend'))
+
+import main
+
+
+def cleaned_file(client, upload):
+    file_id = upload(pd.DataFrame({"id": [1, 2, 2, 3], "name": [" a", "b ", "b ", "c"], "v": [1, 2, 2, 3]}))
+    response = client.post("/api/clean", data={"file_id": file_id, "remove_duplicates": "true",
+                                               "trim_whitespace": "true"})
+    assert response.status_code == 200, response.text
+    return file_id
+
+
+def test_diff_pairs_rows_by_raw_label(client, upload):
+    file_id = cleaned_file(client, upload)
+    response = client.get(f"/api/diff/{file_id}")
+    assert response.status_code == 200, response.text
+    diff = response.json()
+    assert (diff["from_version"], diff["to_version"], diff["alignment"]) == (0, 1, "index")
+    assert diff["rows"] == {"before": 4, "after": 3, "matched": 3, "removed": 1, "added": 0}
+    assert diff["removed_rows"] == [2]
+    assert diff["column_changes"] == {"id": 0, "name": 2, "v": 0}
+    assert diff["changed_cells"]["items"] == [
+        {"row": 0, "column": "name", "before": " a", "after": "a"},
+        {"row": 1, "column": "name", "before": "b ", "after": "b"},
+    ]
+
+
+def test_changed_cells_are_paged(client, upload):
+    file_id = cleaned_file(client, upload)
+    page = client.get(f"/api/diff/{file_id}", params={"offset": 1, "limit": 1}).json()["changed_cells"]
+    assert page["total"] == 2
+    assert page["items"] == [{"row": 1, "column": "name", "before": "b ", "after": "b"}]
+    # Per-column counts are computed once per version pair
+    assert list(main.file_storage[file_id]["diff_counts"]) == [(0, 1, ())]
+
+
+def test_diff_errors(client, upload):
+    file_id = cleaned_file(client, upload)
+    # Duplicated ids in the raw version cannot pair rows
+    assert client.get(f"/api/diff/{file_id}", params={"key": "id"}).status_code == 400
+    assert client.get(f"/api/diff/{file_id}", params={"to_version": 9}).status_code == 404
+    assert client.get(f"/api/diff/{file_id}", params={"limit": 0}).status_code == 400
+    assert client.get("/api/diff/missing").status_code == 404
+
+
+def test_diff_count_cache_is_bounded(client, upload, monkeypatch):
+    monkeypatch.setattr(main, "MAX_CACHED_DIFFS", 2)
+    file_id = cleaned_file(client, upload)
+    for params in ({}, {"from_version": 1}, {"from_version": 1, "to_version": 0}, {"to_version": 0}):
+        assert client.get(f"/api/diff/{file_id}", params=params).status_code == 200
+    cache = main.file_storage[file_id]["diff_counts"]
+    # Oldest entries are evicted first
+    assert list(cache) == [(1, 0, ()), (0, 0, ())]
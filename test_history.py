@@ -0,0 +1,107 @@
+import os
+import sys
+import uuid
+
+import pandas as pd
+import pytest
+
+# Add the backend directory to the path so we can import the modules
+sys.path.append(os.path.join(os.path.dirname(__file__), 'backend'))
+
+import main
+from history import HistoryError, VersionHistory, apply_delta, compute_delta
+
+RAW = pd.DataFrame({"Name": [" a", "b ", "b ", "c"], "Score": [1, 2, 2, 4]})
+
+
+def test_delta_round_trip_with_removed_renamed_and_changed_columns():
+    df = RAW.drop_duplicates().rename(columns={"Score": "score"})
+    df["Name"] = df["Name"].str.strip()
+    delta = compute_delta(RAW, df)
+    assert delta["removed_rows"] == 1
+    assert delta["renames"] == {"Score": "score"}
+    assert list(delta["changed"]) == ["Name"]
+    pd.testing.assert_frame_equal(apply_delta(RAW, delta), df)
+
+
+def test_added_or_reordered_rows_are_snapshots():
+    assert compute_delta(RAW, RAW.iloc[::-1]) is None
+    history = VersionHistory(RAW)
+    grown = pd.concat([RAW, RAW.iloc[:1]], ignore_index=True)
+    version = history.commit(RAW, RAW, grown, "grow", [])
+    assert history.summary()["versions"][-1]["storage"] == "snapshot"
+    assert not history.row_aligned(version)
+    pd.testing.assert_frame_equal(history.materialize(RAW, version), grown)
+
+
+def test_every_version_materializes_after_pruning():
+    history = VersionHistory(RAW, depth=2)
+    expected, df = {}, RAW
+    for step in range(4):
+        parent = df
+        df = df.assign(Score=df["Score"] + 1).iloc[:len(df) - (step % 2)]
+        expected[history.commit(RAW, parent, df, f"step {step}", [])] = df
+    assert [v["version"] for v in history.summary()["versions"]] == [0, 3, 4]
+    for version_id in (3, 4):
+        pd.testing.assert_frame_equal(history.materialize(RAW, version_id), expected[version_id])
+    with pytest.raises(HistoryError):
+        history.materialize(RAW, 1)
+
+
+def test_commit_after_undo_discards_redo():
+    history = VersionHistory(RAW)
+    first = history.commit(RAW, RAW, RAW.iloc[:3], "one", [])
+    history.commit(RAW, RAW.iloc[:3], RAW.iloc[:2], "two", [])
+    history.checkout(history.undo_target())
+    third = history.commit(RAW, RAW.iloc[:3], RAW.iloc[:1], "three", [])
+    assert [v["version"] for v in history.summary()["versions"]] == [0, first, third]
+    with pytest.raises(HistoryError):
+        history.redo_target()
+
+
+def clean(client, file_id, **flags):
+    response = client.post("/api/clean", data={"file_id": file_id, **{k: "true" for k in flags}})
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_undo_redo_and_checkout_endpoints(client, upload):
+    file_id = upload(RAW.assign(token=uuid.uuid4().hex))
+    clean(client, file_id, remove_duplicates=True)
+    clean(client, file_id, trim_whitespace=True)
+    history = client.get(f"/api/history/{file_id}").json()
+    assert history["current"] == 2
+    assert [v["label"] for v in history["versions"]] == ["upload", "clean", "clean"]
+
+    response = client.post("/api/undo", data={"file_id": file_id})
+    assert response.status_code == 200, response.text
+    assert response.json()["version"] == 1
+    assert main.file_storage[file_id]["cleaned_data"]["Name"].tolist() == [" a", "b ", "c"]
+
+    assert client.post("/api/redo", data={"file_id": file_id}).json()["version"] == 2
+    # Each /api/clean round starts from the raw data
+    assert main.file_storage[file_id]["cleaned_data"]["Name"].tolist() == ["a", "b", "b", "c"]
+    assert client.post("/api/redo", data={"file_id": file_id}).status_code == 400
+
+    response = client.post("/api/checkout", data={"file_id": file_id, "version": 0})
+    assert response.status_code == 200, response.text
+    assert main.file_storage[file_id]["cleaned_data"] is None
+    assert client.post("/api/undo", data={"file_id": file_id}).status_code == 400
+    assert client.post("/api/checkout", data={"file_id": file_id, "version": 7}).status_code == 404
+
+
+def test_cleaning_after_checkout_replaces_undone_versions(client, upload):
+    file_id = upload(RAW.assign(token=uuid.uuid4().hex))
+    clean(client, file_id, remove_duplicates=True)
+    clean(client, file_id, trim_whitespace=True)
+    client.post("/api/checkout", data={"file_id": file_id, "version": 1})
+    clean(client, file_id, harmonize_columns=True)
+    history = client.get(f"/api/history/{file_id}").json()
+    assert [v["version"] for v in history["versions"]] == [0, 1, 3]
+    assert client.post("/api/redo", data={"file_id": file_id}).status_code == 400
+    assert list(main.file_storage[file_id]["cleaned_data"].columns) == ["name", "score", "token"]
+
+
+def test_history_endpoints_for_unknown_file(client):
+    assert client.get("/api/history/missing").status_code == 404
+    assert client.post("/api/undo", data={"file_id": "missing"}).status_code == 404
@@ -0,0 +1,68 @@
+import itertools
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+# Add the backend directory to the path so we can import the modules
+sys.path.append(os.path.join(os.path.dirname(__file__), 'backend'))
+
+from cleaning import apply_issue_fixes
+
+ORDERS = pd.DataFrame({
+    "customer": [" ann", "bob ", "bob ", "cy", None, "dee", "eve", "fay", "gus", "hal"],
+    "amount": [10.0, 12.0, 12.0, 11.0, 13.0, 9.0, 10.0, 12.0, 11.0, 5000.0],
+})
+ISSUES = [
+    {"type": "duplicate_rows", "description": "Found 1 duplicate rows"},
+    {"type": "missing_values", "column": "customer", "description": "Column 'customer' has missing values"},
+    {"type": "outliers", "column": "amount", "description": "Column 'amount' contains 1 outliers"},
+    {"type": "whitespace_issues", "column": "customer", "description": "Column 'customer' has whitespace"},
+]
+
+
+def test_fixes_do_not_depend_on_selection_order():
+    results = []
+    for issues in itertools.permutations(ISSUES):
+        df, applied = apply_issue_fixes(ORDERS.copy(), list(issues))
+        assert len(applied) == len(ISSUES)
+        results.append(df)
+    for df in results[1:]:
+        pd.testing.assert_frame_equal(df, results[0])
+
+
+def test_row_filters_are_fused_over_the_analysed_rows():
+    df, _ = apply_issue_fixes(ORDERS.copy(), ISSUES)
+    # A row survives only if every row filter keeps it; labels of kept rows are preserved
+    assert list(df.index) == [0, 1, 3, 5, 6, 7, 8]
+    assert df["customer"].tolist() == ["ann", "bob", "cy", "dee", "eve", "fay", "gus"]
+
+
+def test_outlier_bounds_from_analysis_are_reused():
+    issue = {"type": "outliers", "column": "amount", "description": "",
+             "params": {"lower_bound": 0.0, "upper_bound": 11.5}}
+    df, _ = apply_issue_fixes(ORDERS.copy(), [issue])
+    assert df["amount"].max() <= 11.5
+
+
+def test_outliers_without_a_column_keep_every_row():
+    issue = {"type": "outliers", "description": "Column 'amount' contains 1 outliers"}
+    df, _ = apply_issue_fixes(ORDERS.copy(), [issue])
+    assert len(df) == len(ORDERS)
+
+
+def test_unsupported_and_failing_fixes_are_skipped():
+    issues = [{"type": "no_such_issue", "description": "?"},
+              {"type": "outliers", "column": "customer", "description": "not numeric"},
+              {"type": "duplicate_rows", "description": "dups"}]
+    df, applied = apply_issue_fixes(ORDERS.copy(), issues)
+    assert [issue["type"] for issue in applied] == ["outliers", "duplicate_rows"]
+    assert len(df) == 9
+
+
+def test_no_row_filters_returns_the_frame_uncopied():
+    df = ORDERS.copy()
+    result, _ = apply_issue_fixes(df, [])
+    assert result is df
+    assert np.array_equal(result.index, ORDERS.index)
@@ -0,0 +1,73 @@
+import os
+import sys
+import uuid
+
+import pandas as pd
+
+# Add the backend directory to the path so we can import the modules
+sys.path.append(os.path.join(os.path.dirname(__file__), 'backend'))
+
+import main
+from analysis import analyze_dataframe, issue_id
+
+def messy_orders():
+    return pd.DataFrame({
+        "customer": [" ann", "bob", "bob", "cy", None, "dee", "eve", "fay", "gus", "hal"],
+        "amount": [10.0, 12.0, 12.0, 11.0, 13.0, 9.0, 10.0, 12.0, 11.0, 5000.0],
+        # Unique content so the analysis is not reused from another test's upload
+        "token": uuid.uuid4().hex,
+    })
+
+
+def analyze(client, file_id):
+    response = client.post("/api/analyze", data={"file_id": file_id})
+    assert response.status_code == 200, response.text
+    return response.json()["analysis_report"]
+
+
+def clean_issues(client, file_id, ids):
+    return client.post("/api/clean-issues", json={"file_id": file_id, "selected_issues": ids})
+
+
+def test_issue_ids_are_stable():
+    assert issue_id({"type": "outliers", "column": "amount"}) == "outliers:amount"
+    assert issue_id({"type": "duplicate_rows"}) == "duplicate_rows"
+    report = analyze_dataframe(messy_orders())
+    assert [issue["id"] for issue in report] == [issue["id"] for issue in analyze_dataframe(messy_orders())]
+    assert len({issue["id"] for issue in report}) == len(report)
+
+
+def test_clean_issues_resolves_ids_server_side(client, upload):
+    file_id = upload(messy_orders())
+    ids = {issue["id"] for issue in analyze(client, file_id)}
+    assert {"duplicate_rows", "outliers:amount"} <= ids
+    response = clean_issues(client, file_id, ["duplicate_rows", "outliers:amount"])
+    assert response.status_code == 200, response.text
+    cleaned = main.file_storage[file_id]["cleaned_data"]
+    assert len(cleaned) == 8
+    assert cleaned["amount"].max() < 5000
+    recorded = main.file_storage[file_id]["steps"][-1]
+    assert recorded["kind"] == "issues"
+    assert all("params" not in issue for issue in recorded["issues"])
+
+
+def test_unknown_and_stale_issue_ids_are_rejected(client, upload):
+    file_id = upload(messy_orders())
+    assert clean_issues(client, file_id, ["duplicate_rows"]).status_code == 409
+    analyze(client, file_id)
+    response = clean_issues(client, file_id, ["duplicate_rows", "made_up"])
+    assert response.status_code == 400
+    assert "made_up" in response.json()["detail"]
+    assert clean_issues(client, file_id, ["duplicate_rows"]).status_code == 200
+    # The data changed, so the earlier analysis no longer applies
+    assert clean_issues(client, file_id, ["duplicate_rows"]).status_code == 409
+    assert clean_issues(client, "missing", ["duplicate_rows"]).status_code == 404
+
+
+def test_shared_raw_analysis_registers_issues_for_each_file(client, upload):
+    df = messy_orders()
+    first, second = upload(df), upload(df)
+    analyze(client, first)
+    analyze(client, second)
+    assert clean_issues(client, second, ["duplicate_rows"]).status_code == 200
+    assert len(main.file_storage[first]["data"]) == 10
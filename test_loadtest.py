@@ -0,0 +1,71 @@
+import io
+import json
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+# Add the backend directory to the path so we can import the modules
+sys.path.append(os.path.join(os.path.dirname(__file__), 'backend'))
+
+import loadtest
+from loadtest import Recorder, generate_csv, parse_mix, percentile, rss_bytes, with_nonce_row
+
+
+def test_percentile_is_nearest_rank():
+    values = list(range(1, 101))
+    assert [percentile(values, p) for p in (50, 95, 99, 100)] == [50, 95, 99, 100]
+    assert percentile([7], 99) == 7
+    assert percentile([], 50) is None
+
+
+def test_generated_files_are_messy_and_reproducible():
+    content = generate_csv(500, seed=3)
+    assert content == generate_csv(500, seed=3)
+    df = pd.read_csv(io.BytesIO(content))
+    assert len(df) == 500
+    assert df.duplicated().any()
+    assert df["Customer Name"].str.startswith(" ").any()
+
+
+def test_nonce_row_makes_uploads_distinct():
+    content = generate_csv(50, seed=1)
+    first, second = with_nonce_row(content, 1), with_nonce_row(content, 2)
+    assert first != second and first.startswith(content)
+    df = pd.read_csv(io.BytesIO(first))
+    assert len(df) == 51 and df["Order ID"].iloc[-1] == 1
+
+
+def test_session_mix_parsing():
+    assert parse_mix("full=2,quick") == {"full": 2.0, "quick": 1.0}
+    with pytest.raises(ValueError):
+        parse_mix("full,browse=3")
+
+
+def test_recorder_counts_non_2xx_as_errors():
+    recorder = Recorder()
+    for status in (200, 201, 413, 0):
+        recorder.record("POST /api/upload", 0.01, status)
+    assert recorder.errors["POST /api/upload"] == 2
+    assert dict(recorder.statuses["POST /api/upload"]) == {200: 1, 201: 1, 413: 1, 0: 1}
+
+
+def test_rss_includes_this_process():
+    assert rss_bytes(os.getpid()) > 0
+
+
+def test_short_in_process_run_writes_report(tmp_path, monkeypatch):
+    # In-process runs send the app's output to stderr; restore stdout afterwards
+    monkeypatch.setattr(sys, "stdout", sys.stdout)
+    path = tmp_path / "report.json"
+    code = loadtest.main(["--in-process", "--rows", "200", "--concurrency", "2", "--duration", "1",
+                          "--mix", "full", "--json", str(path), "--max-error-rate", "0"])
+    report = json.loads(path.read_text())
+    stage, = report["stages"]
+    assert code == 0
+    assert stage["users"] == 2 and stage["error_rate"] == 0
+    assert stage["sessions"]["full"]["completed"] >= 1
+    assert {"POST /api/upload", "POST /api/clean"} <= set(stage["endpoints"])
+    assert stage["endpoints"]["POST /api/upload"]["p95_ms"] >= stage["endpoints"]["POST /api/upload"]["p50_ms"]
+    assert report["shared_content"] is False
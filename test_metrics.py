@@ -0,0 +1,69 @@
+import os
+import sys
+
+import pandas as pd
+
+# Add the backend directory to the path so we can import the modules
+sys.path.append(os.path.join(os.path.dirname(__file__), 'backend'))
+
+from metrics import (CACHE_REQUESTS, OPERATION_DURATION, OPERATION_ROWS, REQUEST_LATENCY, Histogram, OperationTimer,
+                     cache_hit_ratio, record_cache)
+
+def test_histogram_buckets_are_cumulative():
+    latency = Histogram("test_latency_seconds", "Test latency", labels=("route",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.7, 3.0):
+        latency.observe(value, route="/x")
+    samples = {(name, labels): value for name, labels, value in latency.samples()}
+    assert samples[("test_latency_seconds_bucket", '{route="/x",le="0.1"}')] == 1
+    assert samples[("test_latency_seconds_bucket", '{route="/x",le="1"}')] == 3
+    assert samples[("test_latency_seconds_bucket", '{route="/x",le="+Inf"}')] == 4
+    assert samples[("test_latency_seconds_count", '{route="/x"}')] == 4
+    assert abs(samples[("test_latency_seconds_sum", '{route="/x"}')] - 4.25) < 1e-9
+
+
+def test_requests_are_labelled_by_route_template(client, upload):
+    file_id = upload(pd.DataFrame({"a": [1, 2]}))
+    key = ("GET", "/api/download/{file_id}", "200")
+    assert client.post("/api/clean", data={"file_id": file_id}).status_code == 200
+    before = REQUEST_LATENCY.values.get(key, [None, 0, 0])[2]
+    assert client.get(f"/api/download/{file_id}").status_code == 200
+    assert REQUEST_LATENCY.values[key][2] == before + 1
+    assert not any(file_id in route for _, route, _ in REQUEST_LATENCY.values)
+
+
+def test_cleaning_operations_are_timed(client, upload):
+    file_id = upload(pd.DataFrame({"a": [1, 1, 2]}))
+    before = OPERATION_ROWS.get(operation="remove_duplicates")
+    response = client.post("/api/clean", data={"file_id": file_id, "remove_duplicates": "true"})
+    assert response.status_code == 200, response.text
+    assert OPERATION_ROWS.get(operation="remove_duplicates") == before + 3
+
+
+def test_operation_timer_ends_each_operation_at_the_next():
+    timer = OperationTimer()
+    timer.start("test_first", 5)
+    timer.start("test_second")
+    timer.stop()
+    timer.stop()
+    assert OPERATION_ROWS.get(operation="test_first") == 5
+    for operation in ("test_first", "test_second"):
+        assert OPERATION_DURATION.values[(operation,)][2] == 1
+
+
+def test_cache_hit_ratio():
+    record_cache("test_cache", True)
+    record_cache("test_cache", True)
+    record_cache("test_cache", False)
+    assert CACHE_REQUESTS.get(cache="test_cache", result="hit") == 2
+    assert abs(cache_hit_ratio()["test_cache"] - 2 / 3) < 1e-9
+
+
+def test_metrics_endpoint_uses_prometheus_text_format(client):
+    client.get("/")
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    text = response.text
+    assert "# TYPE datacleanr_request_duration_seconds histogram" in text
+    assert '# TYPE datacleanr_requests_in_flight gauge' in text
+    assert 'datacleanr_request_duration_seconds_count{method="GET",route="/",status="200"}' in text
@@ -0,0 +1,88 @@
+import os
+import sys
+import time
+
+import pandas as pd
+import pytest
+
+# Add the backend directory to the path so we can import the modules
+sys.path.append(os.path.join(os.path.dirname(__file__), 'backend'))
+
+import profiling
+from metrics import track_operation
+from profiling import ProfileSession, finish_profile, start_profile
+
+ADMIN = {"X-Admin-Token": "secret"}
+
+
+@pytest.fixture(autouse=True)
+def admin_and_profile_dir(tmp_path, monkeypatch):
+    monkeypatch.setenv("DATACLEANR_ADMIN_TOKEN", "secret")
+    monkeypatch.setattr(profiling, "PROFILE_DIR", str(tmp_path))
+
+
+def post_csv(client, df, headers=None):
+    return client.post("/api/upload", files={"file": ("orders.csv", df.to_csv(index=False).encode())}, headers=headers)
+
+
+def test_session_builds_call_tree_and_folded_stacks():
+    session = ProfileSession("test")
+    session.stacks = {("main (a.py:1)", "load (a.py:5)"): 3, ("main (a.py:1)", "save (a.py:9)"): 1}
+    session.sample_count = 4
+    tree = session.call_tree()
+    assert tree["samples"] == 4
+    main_node = tree["children"][0]
+    assert [child["name"] for child in main_node["children"]] == ["load (a.py:5)", "save (a.py:9)"]
+    assert session.folded() == "main (a.py:1);load (a.py:5) 3\nmain (a.py:1);save (a.py:9) 1\n"
+
+
+def test_phases_are_only_recorded_while_profiling():
+    with track_operation("outside"):
+        pass
+    session, token = start_profile("test")
+    with track_operation("inside", rows=10):
+        time.sleep(0.02)
+    summary = finish_profile(session, token)
+    assert [phase["phase"] for phase in summary["phases"]] == ["inside"]
+    assert summary["samples"] > 0
+    assert os.path.exists(profiling._profile_path(summary["profile_id"], "tree"))
+
+
+def test_profiling_requires_admin_token(client):
+    df = pd.DataFrame({"a": [1, 2]})
+    assert post_csv(client, df, headers={"X-Profile": "1"}).status_code == 403
+    assert post_csv(client, df, headers={"X-Profile": "1", "X-Admin-Token": "wrong"}).status_code == 403
+    # Without the opt-in header the request is not profiled
+    response = post_csv(client, df)
+    assert response.status_code == 200
+    assert "profile" not in response.json() and "x-profile-id" not in response.headers
+
+
+def test_profiled_request_returns_phases_and_stores_profile(client):
+    # Content no other test uploads, so it is parsed rather than reused
+    response = post_csv(client, pd.DataFrame({"profiled": [7, 8, 9]}), headers={"X-Profile": "1", **ADMIN})
+    assert response.status_code == 200, response.text
+    profile = response.json()["profile"]
+    assert response.headers["x-profile-id"] == profile["profile_id"]
+    assert "parse" in [phase["phase"] for phase in profile["phases"]]
+
+    tree = client.get(f"/api/profiles/{profile['profile_id']}", headers=ADMIN)
+    assert tree.status_code == 200
+    assert tree.json()["profile_id"] == profile["profile_id"]
+    assert client.get(f"/api/profiles/{profile['profile_id']}", params={"format": "folded"},
+                      headers=ADMIN).status_code == 200
+    assert client.get(f"/api/profiles/{profile['profile_id']}").status_code == 403
+    assert client.get(f"/api/profiles/{profile['profile_id']}", params={"format": "svg"},
+                      headers=ADMIN).status_code == 400
+    assert client.get("/api/profiles/missing", headers=ADMIN).status_code == 404
+
+
+def test_oldest_profiles_are_discarded(monkeypatch):
+    monkeypatch.setattr(profiling, "MAX_STORED_PROFILES", 2)
+    ids = []
+    for _ in range(3):
+        session, token = start_profile("test")
+        ids.append(finish_profile(session, token)["profile_id"])
+    assert ids[0] not in profiling.profile_storage
+    assert not os.path.exists(profiling._profile_path(ids[0], "tree"))
+    assert all(profile_id in profiling.profile_storage for profile_id in ids[1:])
@@ -0,0 +1,101 @@
+import io
+import json
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+# Add the backend directory to the path so we can import the modules
+sys.path.append(os.path.join(os.path.dirname(__file__), 'backend'))
+
+from query import QueryError, run_query, validate_query
+
+ORDERS = pd.DataFrame({
+    "region": ["north", "south", "north", "east"],
+    "product": ["pen", "ink", "pad", "pen"],
+    "amount": [10.0, 20.0, 30.0, 5.0],
+})
+
+
+def query(client, file_id, **body):
+    return client.post(f"/api/query/{file_id}", json=body)
+
+
+def collect(query_dict, df=ORDERS, output_format="csv"):
+    _, chunks = run_query(query_dict, df, output_format=output_format)
+    return b"".join(chunks).decode()
+
+
+@pytest.mark.parametrize("query_dict, message", [
+    ({"columns": ["nope"]}, "Columns not found"),
+    ({"filters": [{"column": "amount", "op": "between", "value": 1}]}, "Unknown filter operator"),
+    ({"filters": [{"column": "region", "op": "in", "value": "north"}]}, "requires a list"),
+    ({"aggregates": [{"func": "median", "column": "amount"}]}, "Unknown aggregate"),
+    ({"group_by": ["region"]}, "requires at least one aggregate"),
+    ({"columns": ["region"], "aggregates": [{"func": "count"}]}, "not both"),
+    ({"limit": -1}, "non-negative"),
+    ({"aggregates": [{"func": "sum", "column": "product"}]}, "requires a numeric column"),
+    ({"aggregates": [{"func": "mean", "column": "region"}], "group_by": ["product"]}, "requires a numeric column"),
+])
+def test_invalid_queries_raise_query_error(query_dict, message):
+    with pytest.raises(QueryError, match=message):
+        validate_query(query_dict, ORDERS.columns, ORDERS.dtypes)
+
+
+def test_projection_only_reads_needed_columns():
+    needed = validate_query({"aggregates": [{"func": "sum", "column": "amount"}], "group_by": ["region"],
+                             "filters": [{"column": "product", "op": "ne", "value": "ink"}]},
+                            ORDERS.columns, ORDERS.dtypes)
+    assert needed == ["region", "amount", "product"]
+
+
+def test_csv_output_keeps_header_when_nothing_matches():
+    text = collect({"columns": ["region", "amount"], "filters": [{"column": "amount", "op": "gt", "value": 100}]})
+    assert text == "region,amount\n"
+
+
+def test_jsonl_output_has_one_record_per_line():
+    text = collect({"columns": ["product"], "filters": [{"column": "region", "op": "eq", "value": "north"}]},
+                   output_format="jsonl")
+    assert text == '{"product":"pen"}\n{"product":"pad"}\n'
+    assert collect({"filters": [{"column": "amount", "op": "gt", "value": 100}]}, output_format="jsonl") == ""
+
+
+def test_grouped_aggregates_and_limit():
+    text = collect({"group_by": ["region"], "aggregates": [{"func": "sum", "column": "amount", "alias": "total"},
+                                                           {"func": "count"}]})
+    result = pd.read_csv(io.StringIO(text))
+    assert result.to_dict("list") == {"region": ["east", "north", "south"], "total": [5.0, 40.0, 20.0],
+                                      "count": [1, 2, 1]}
+    assert collect({"columns": ["amount"], "limit": 2}) == "amount\n10.0\n20.0\n"
+
+
+def test_query_endpoint_formats_and_errors(client, upload):
+    file_id = upload(ORDERS)
+    response = query(client, file_id, columns=["region"], filters=[{"column": "amount", "op": "ge", "value": 20}])
+    assert response.status_code == 200, response.text
+    assert response.headers["content-type"].startswith("text/csv")
+    assert response.text == "region\nsouth\nnorth\n"
+
+    response = query(client, file_id, aggregates=[{"func": "mean", "column": "amount"}], format="jsonl")
+    assert response.status_code == 200, response.text
+    assert [json.loads(line) for line in response.text.splitlines()] == [{"mean_amount": 16.25}]
+
+    # Rejected before streaming starts, instead of an empty 200 response
+    response = query(client, file_id, aggregates=[{"func": "mean", "column": "product"}], format="jsonl")
+    assert response.status_code == 400
+    assert "numeric" in response.json()["detail"]
+    assert query(client, file_id, format="xml").status_code == 400
+    assert query(client, "missing").status_code == 404
+
+
+def test_query_on_cleaned_parquet_copy(client, upload):
+    file_id = upload(ORDERS)
+    response = client.post("/api/clean", data={"file_id": file_id, "trim_whitespace": "true"})
+    assert response.status_code == 200, response.text
+    response = query(client, file_id, columns=["product"], filters=[{"column": "amount", "op": "lt", "value": 15}],
+                     format="jsonl")
+    assert response.status_code == 200, response.text
+    assert response.headers["x-query-source"] in ("parquet", "memory")
+    assert response.text == '{"product":"pen"}\n{"product":"pen"}\n'
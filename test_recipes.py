@@ -0,0 +1,54 @@
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+# Add the backend directory to the path so we can import the modules
+sys.path.append(os.path.join(os.path.dirname(__file__), 'backend'))
+
+import recipes
+from cleaning import clean_dataframe
+from recipes import RecipeError, apply_recipe, save_recipe, validate_steps
+
+
+@pytest.fixture(autouse=True)
+def recipe_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(recipes, "RECIPE_DIR", str(tmp_path))
+
+
+@pytest.mark.parametrize("steps", [
+    [],
+    {"kind": "clean"},
+    ["clean"],
+    [42],
+    [{"kind": "clean", "options": ["trim_whitespace"]}],
+    [{"kind": "clean", "options": {"no_such_flag": True}}],
+    [{"kind": "issues", "issues": "missing_values"}],
+    [{"kind": "issues", "issues": ["missing_values"]}],
+    [{"kind": "issues", "issues": [7]}],
+    [{"kind": "issues", "issues": [{"type": "no_such_issue"}]}],
+    [{"kind": "issues", "issues": [{"type": "outliers", "description": "Column 'amount' contains 1 outliers"}]}],
+    [{"kind": "explode"}],
+])
+def test_malformed_steps_raise_recipe_error(steps):
+    with pytest.raises(RecipeError):
+        validate_steps(steps)
+
+
+def test_malformed_recipe_is_a_bad_request(client):
+    for steps in ([{"kind": "issues", "issues": [1, 2]}], [{"kind": "issues", "issues": "x"}],
+                  [{"kind": "clean", "options": "x"}]):
+        response = client.post("/api/recipes", json={"name": "bad", "steps": steps})
+        assert response.status_code == 400, response.text
+    # Steps that are not objects are rejected by request validation
+    assert client.post("/api/recipes", json={"name": "bad", "steps": ["clean"]}).status_code == 422
+
+
+def test_replayed_recipe_matches_direct_cleaning(tmp_path):
+    df = pd.DataFrame({"Name": [" a", "b ", "b ", None], "Score": [1, 2, 2, 4]})
+    options = {"remove_duplicates": True, "trim_whitespace": True, "harmonize_columns": True}
+    recipe = save_recipe("trim", [{"kind": "clean", "options": options}])
+
+    assert os.path.exists(os.path.join(str(tmp_path), f"{recipe['recipe_id']}.json"))
+    pd.testing.assert_frame_equal(apply_recipe(recipe, df.copy()), clean_dataframe(df.copy(), **options))
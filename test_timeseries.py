@@ -0,0 +1,163 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+# Add the backend directory to the path so we can import the modules
+sys.path.append(os.path.join(os.path.dirname(__file__), 'backend'))
+
+from cleaning import clean_dataframe
+from timeseries import (detect_entity_keys, detect_time_key, fill_time_gaps, interpolate_downtime,
+                        regular_frequency, smooth_sensor_data)
+
+
+def test_time_and_entity_keys_are_detected():
+    df = pd.DataFrame({
+        "store_id": [1, 1, 2, 2],
+        "order_no": [10, 11, 12, 13],
+        "date": ["2024-01-01", "2024-01-02", "2024-01-01", "2024-01-02"],
+        "units": [3, 4, 5, 6],
+    })
+    assert detect_time_key(df) == "date"
+    # Near-unique identifiers and measures are not entity keys
+    assert detect_entity_keys(df, "date") == ["store_id"]
+
+
+def test_several_orders_per_day_are_never_aggregated():
+    orders = pd.DataFrame({
+        "order_id": [1, 2, 3, 4, 5],
+        "order_date": ["2024-01-01", "2024-01-01", "2024-01-01", "2024-01-04", "2024-01-05"],
+        "quantity": [1, 2, 3, 4, 5],
+    })
+    out, report = fill_time_gaps(orders)
+    assert report["rows_added"] == 0
+    assert "share a timestamp" in report["skipped"]
+    assert list(out["order_id"]) == [1, 2, 3, 4, 5]
+    assert list(out["quantity"]) == [1, 2, 3, 4, 5]
+    assert list(out["order_date"]) == list(orders["order_date"])
+
+
+def test_irregular_timestamps_within_a_day_are_left_alone():
+    readings = pd.DataFrame({
+        "timestamp": ["2024-01-01 08:00", "2024-01-01 09:30", "2024-01-01 17:45", "2024-01-02 12:00",
+                      "2024-01-03 12:00"],
+        "value": [1.0, 2.0, 3.0, 4.0, 5.0],
+    })
+    out, report = fill_time_gaps(readings)
+    assert report["rows_added"] == 0
+    assert "not evenly spaced" in report["skipped"]
+    assert list(out["value"]) == [1.0, 2.0, 3.0, 4.0, 5.0]
+
+
+def test_non_calendar_step_is_rejected():
+    readings = pd.DataFrame({
+        "timestamp": pd.date_range("2024-01-01", periods=4, freq="36h"),
+        "value": [1.0, 2.0, 3.0, 4.0],
+    })
+    out, report = fill_time_gaps(readings)
+    assert report["rows_added"] == 0
+    assert "whole number of days" in report["skipped"]
+    assert len(out) == 4
+
+
+def test_missing_days_are_inserted_per_entity():
+    sales = pd.DataFrame({
+        "store": ["a", "a", "a", "b", "b"],
+        "date": ["2024-01-01", "2024-01-02", "2024-01-05", "2024-01-01", "2024-01-03"],
+        "sales": [10, 20, 50, 1, 3],
+        "region": ["n", "n", "n", "s", "s"],
+    })
+    out, report = fill_time_gaps(sales)
+    assert "skipped" not in report
+    assert report["rows_added"] == 3
+    assert report["frequency"] == str(pd.Timedelta(days=1))
+    assert list(out["date"]) == ["2024-01-01", "2024-01-02", "2024-01-03", "2024-01-04", "2024-01-05",
+                                 "2024-01-01", "2024-01-02", "2024-01-03"]
+    assert list(out["sales"]) == [10, 20, 30, 40, 50, 1, 2, 3]
+    assert list(out["region"]) == ["n"] * 5 + ["s"] * 3
+    # Existing rows keep their labels, inserted rows are labelled after them
+    assert list(out.index) == [0, 1, 5, 6, 2, 3, 7, 4]
+
+
+def test_inserted_rows_do_not_copy_row_identifiers():
+    readings = pd.DataFrame({
+        "reading_id": [100, 101, 102],
+        "timestamp": ["2024-01-01 00:00", "2024-01-01 01:00", "2024-01-01 03:00"],
+        "value": [1.0, 2.0, 4.0],
+    })
+    out, report = fill_time_gaps(readings)
+    assert report["rows_added"] == 1
+    assert out["reading_id"].isna().tolist() == [False, False, True, False]
+    assert out["value"].tolist() == [1.0, 2.0, 3.0, 4.0]
+
+
+def test_requested_frequency_must_match_the_readings():
+    readings = pd.DataFrame({"timestamp": ["2024-01-01 00:00", "2024-01-01 00:45"], "value": [1.0, 2.0]})
+    _, report = fill_time_gaps(readings, freq="30min")
+    assert "not aligned" in report["skipped"]
+
+
+def test_regular_frequency_uses_smallest_gap():
+    hour = pd.Timedelta(hours=1).value
+    t = np.array([0, hour, 4 * hour, 0, 2 * hour])
+    codes = np.array([0, 0, 0, 1, 1])
+    assert regular_frequency(t, codes) == (pd.Timedelta(hours=1), None)
+    assert regular_frequency(np.array([0, hour, 2 * hour + 1]), np.zeros(3, dtype=int))[0] is None
+
+
+def test_clean_dataframe_keeps_rows_when_gaps_cannot_be_filled():
+    orders = pd.DataFrame({"order_date": ["2024-01-02", "2024-01-01", "2024-01-01"], "quantity": [3, 1, 2]})
+    out = clean_dataframe(orders.copy(), fill_time_gaps=True)
+    assert sorted(out["quantity"]) == [1, 2, 3]
+    assert len(out) == 3
+
+
+def test_interpolate_downtime_fills_interior_gaps_by_time():
+    readings = pd.DataFrame({
+        "machine_id": ["m1"] * 4 + ["m2"] * 2,
+        "timestamp": ["2024-01-01 00:00", "2024-01-01 01:00", "2024-01-01 03:00", "2024-01-01 04:00",
+                      "2024-01-01 00:00", "2024-01-01 01:00"],
+        "temperature": [10.0, np.nan, 40.0, np.nan, np.nan, 5.0],
+    })
+    out, report = interpolate_downtime(readings)
+    assert report["filled_cells"] == 1
+    assert out["temperature"].tolist()[:3] == [10.0, 20.0, 40.0]
+    assert np.isnan(out["temperature"].iloc[3]) and np.isnan(out["temperature"].iloc[4])
+
+
+def test_smoothing_stays_within_each_entity():
+    readings = pd.DataFrame({
+        "sensor": ["s1"] * 12 + ["s2"] * 12,
+        "timestamp": list(pd.date_range("2024-01-01", periods=12, freq="h").astype(str)) * 2,
+        "value": [0.0, 3.0] * 6 + [100.0] * 12,
+    })
+    out, report = smooth_sensor_data(readings)
+    assert report["columns"] == ["value"]
+    assert report["window"] == str(3 * pd.Timedelta(hours=1))
+    assert out["value"].iloc[12:].tolist() == [100.0] * 12
+    assert out["value"].iloc[:12].between(0.0, 3.0).all()
+    assert out["value"].iloc[1:11].std() < readings["value"].iloc[1:11].std()
+
+
+def test_row_identifiers_are_never_interpolated_or_smoothed():
+    readings = pd.DataFrame({
+        "reading_id": [100.0, np.nan, 102.0] + [float(i) for i in range(103, 112)],
+        "timestamp": list(pd.date_range("2024-01-01", periods=12, freq="h").astype(str)),
+        "value": [0.0, np.nan] + [0.0, 3.0] * 5,
+    })
+    out, report = interpolate_downtime(readings)
+    assert report["filled_cells"] == 1
+    assert np.isnan(out["reading_id"].iloc[1])
+    out, report = smooth_sensor_data(readings)
+    assert report["columns"] == ["value"]
+    pd.testing.assert_series_equal(out["reading_id"], readings["reading_id"])
+
+
+def test_unparsed_times_are_left_unchanged():
+    orders = pd.DataFrame({"order_date": ["2024-01-01", "not a date", "2024-01-02", "2024-01-04"],
+                           "quantity": [1, 2, 3, 5]})
+    out, report = fill_time_gaps(orders, time_col="order_date")
+    assert report["unparsed_rows"] == 1
+    assert out["order_date"].tolist() == ["2024-01-01", "2024-01-02", "2024-01-03", "2024-01-04", "not a date"]
+    assert out["quantity"].tolist() == [1, 3, 4, 5, 2]
@@ -0,0 +1,235 @@
+import asyncio
+import base64
+import gzip
+import hashlib
+import io
+import os
+import sys
+import uuid
+
+import numpy as np
+import pandas as pd
+import pytest
+
+# Add the backend directory to the path so we can import the modules
+sys.path.append(os.path.join(os.path.dirname(__file__), 'backend'))
+
+import main
+import uploads
+from uploads import IncrementalCsvParser, UploadError, parse_checksum
+
+
+def checksum(data):
+    return "sha256 " + base64.b64encode(hashlib.sha256(data).digest()).decode()
+
+
+def start(client, length, filename="orders.csv"):
+    response = client.post("/api/uploads", data={"filename": filename, "length": length})
+    assert response.status_code == 201, response.text
+    assert response.headers["Location"] == f"/api/uploads/{response.json()['upload_id']}"
+    return response.json()["upload_id"]
+
+
+def patch(client, upload_id, offset, data, digest=None):
+    return client.patch(f"/api/uploads/{upload_id}", content=data,
+                        headers={"Upload-Offset": str(offset), "Upload-Checksum": digest or checksum(data)})
+
+
+def send(client, data, filename="orders.csv", chunk=997):
+    upload_id = start(client, len(data), filename)
+    offset = 0
+    while offset < len(data):
+        response = patch(client, upload_id, offset, data[offset:offset + chunk])
+        assert response.status_code == 200, response.text
+        offset = response.json()["offset"]
+    return upload_id
+
+
+def sample_csv():
+    rng = np.random.default_rng(0)
+    token = uuid.uuid4().hex
+    df = pd.DataFrame({
+        "id": range(500),
+        # Quoted fields with embedded newlines must not be split across chunks
+        "name": [f'n "q" {i}\nline' if i % 7 == 0 else f"n{i}" for i in range(500)],
+        "amount": rng.random(500),
+        "token": token,
+    })
+    return df.to_csv(index=False).encode()
+
+
+def test_parse_checksum():
+    algorithm, digest = parse_checksum(checksum(b"abc"))
+    assert algorithm == "sha256" and digest == hashlib.sha256(b"abc").digest()
+    for header in (None, "crc32 AAAA", "sha256 not-base64!"):
+        with pytest.raises(UploadError) as error:
+            parse_checksum(header)
+        assert error.value.status_code == 400
+
+
+def test_chunked_upload_matches_a_single_parse(client):
+    data = sample_csv()
+    upload_id = send(client, data)
+    status = client.get(f"/api/uploads/{upload_id}").json()
+    assert status["complete"] and status["offset"] == len(data)
+    assert status["parsed_rows"] > 0
+    response = client.post(f"/api/uploads/{upload_id}/finalize")
+    assert response.status_code == 200, response.text
+    expected = pd.read_csv(io.StringIO(data.decode()))
+    pd.testing.assert_frame_equal(main.file_storage[response.json()["file_id"]]["data"], expected)
+    # The session is gone once finalized
+    assert client.get(f"/api/uploads/{upload_id}").status_code == 404
+
+
+def test_checksum_mismatch_keeps_the_confirmed_offset(client):
+    data = sample_csv()
+    upload_id = start(client, len(data))
+    assert patch(client, upload_id, 0, data[:1000]).status_code == 200
+    corrupted = data[1000:2000][:-1] + b"X"
+    response = patch(client, upload_id, 1000, corrupted, digest=checksum(data[1000:2000]))
+    assert response.status_code == 460
+    assert response.headers["Upload-Offset"] == "1000"
+    status = client.get(f"/api/uploads/{upload_id}")
+    assert status.json()["offset"] == 1000 and status.headers["Upload-Offset"] == "1000"
+    # Resending the chunk intact resumes the upload
+    assert patch(client, upload_id, 1000, data[1000:2000]).json()["offset"] == 2000
+    client.delete(f"/api/uploads/{upload_id}")
+
+
+def test_chunk_errors(client):
+    upload_id = start(client, 10)
+    response = patch(client, upload_id, 5, b"abc")
+    assert response.status_code == 409 and response.headers["Upload-Offset"] == "0"
+    no_checksum = client.patch(f"/api/uploads/{upload_id}", content=b"abc", headers={"Upload-Offset": "0"})
+    assert no_checksum.status_code == 400
+    no_offset = client.patch(f"/api/uploads/{upload_id}", content=b"abc", headers={"Upload-Checksum": checksum(b"abc")})
+    assert no_offset.status_code == 400
+    # Bytes past the declared length are refused and nothing is confirmed
+    assert patch(client, upload_id, 0, b"a" * 11).status_code == 400
+    assert client.get(f"/api/uploads/{upload_id}").json()["offset"] == 0
+    assert client.delete(f"/api/uploads/{upload_id}").status_code == 200
+    assert client.get(f"/api/uploads/{upload_id}").status_code == 404
+    assert client.delete(f"/api/uploads/{upload_id}").status_code == 404
+
+
+def test_oversized_chunk_is_rejected(client, monkeypatch):
+    monkeypatch.setattr(uploads, "MAX_CHUNK_SIZE", 4)
+    upload_id = start(client, 10)
+    response = patch(client, upload_id, 0, b"abcdef")
+    assert response.status_code == 413 and response.headers["Upload-Offset"] == "0"
+    client.delete(f"/api/uploads/{upload_id}")
+
+
+def test_limit_matches_single_request_uploads():
+    assert uploads.MAX_UPLOAD_SIZE == main.MAX_UPLOAD_SIZE
+
+
+def test_session_errors(client, monkeypatch):
+    assert client.post("/api/uploads", data={"filename": "notes.txt", "length": 10}).status_code == 400
+    assert client.post("/api/uploads", data={"filename": "a.csv", "length": -1}).status_code == 400
+    monkeypatch.setattr(uploads, "MAX_UPLOAD_SIZE", 100)
+    assert client.post("/api/uploads", data={"filename": "a.csv", "length": 101}).status_code == 413
+    assert client.get("/api/uploads/missing").status_code == 404
+    assert client.post("/api/uploads/missing/finalize").status_code == 404
+
+
+def test_incomplete_upload_cannot_be_finalized(client):
+    data = sample_csv()
+    upload_id = start(client, len(data))
+    patch(client, upload_id, 0, data[:100])
+    response = client.post(f"/api/uploads/{upload_id}/finalize")
+    assert response.status_code == 409
+    assert response.headers["Upload-Offset"] == "100"
+    assert "100 of" in response.json()["detail"]
+    # The session survives so the client can finish it
+    assert client.get(f"/api/uploads/{upload_id}").status_code == 200
+    client.delete(f"/api/uploads/{upload_id}")
+
+
+def test_inconsistent_chunks_fall_back_to_a_full_parse(client):
+    data = ("a,b\n" + "".join(f"{i},{i}\n" for i in range(300)) + f"x,{uuid.uuid4().int}\n").encode()
+    upload_id = send(client, data, chunk=500)
+    response = client.post(f"/api/uploads/{upload_id}/finalize")
+    assert response.status_code == 200, response.text
+    got = main.file_storage[response.json()["file_id"]]["data"]
+    pd.testing.assert_frame_equal(got, pd.read_csv(io.StringIO(data.decode())))
+
+
+def test_compressed_upload(client):
+    data = sample_csv()
+    upload_id = send(client, gzip.compress(data), filename="orders.csv.gz")
+    response = client.post(f"/api/uploads/{upload_id}/finalize")
+    assert response.status_code == 200, response.text
+    got = main.file_storage[response.json()["file_id"]]["data"]
+    pd.testing.assert_frame_equal(got, pd.read_csv(io.StringIO(data.decode())))
+
+
+def test_parser_waits_for_complete_rows(tmp_path):
+    path = tmp_path / "spool.csv"
+    path.write_bytes(b'a,b\n1,"x\ny"\n2,z')
+    parser = IncrementalCsvParser(str(path))
+    parser.feed(8)
+    assert parser.rows == 0
+    parser.feed(path.stat().st_size)
+    assert parser.rows == 1
+    parser.feed(path.stat().st_size, final=True)
+    assert parser.frame()["b"].tolist() == ["x\ny", "z"]
+
+
+def test_idle_sessions_expire(client):
+    upload_id = start(client, 10)
+    path = uploads.upload_sessions[upload_id].path
+    uploads.expire_sessions(now=uploads.upload_sessions[upload_id].updated + uploads.SESSION_TTL + 1)
+    assert upload_id not in uploads.upload_sessions
+    assert not os.path.exists(path)
+
+
+def test_failed_finalize_keeps_the_session_for_a_retry(client, monkeypatch):
+    data = sample_csv()
+    upload_id = send(client, gzip.compress(data), filename="orders.csv.gz")
+    calls = []
+
+    def failing_read(filename, content=None, path=None):
+        calls.append((content, path))
+        raise ValueError("disk hiccup")
+    monkeypatch.setattr(main, "read_dataframe", failing_read)
+    assert client.post(f"/api/uploads/{upload_id}/finalize").status_code == 400
+    # The fallback parses the spool file by path instead of loading its bytes
+    assert calls == [(None, uploads.upload_sessions[upload_id].path)]
+    assert client.get(f"/api/uploads/{upload_id}").json()["complete"]
+
+    monkeypatch.undo()
+    response = client.post(f"/api/uploads/{upload_id}/finalize")
+    assert response.status_code == 200, response.text
+    got = main.file_storage[response.json()["file_id"]]["data"]
+    pd.testing.assert_frame_equal(got, pd.read_csv(io.StringIO(data.decode())))
+    assert upload_id not in uploads.upload_sessions
+
+
+def test_upper_case_extensions_parse_incrementally(client):
+    data = sample_csv()
+    upload_id = send(client, data, filename="ORDERS.CSV")
+    assert client.get(f"/api/uploads/{upload_id}").json()["parsed_rows"] > 0
+    response = client.post(f"/api/uploads/{upload_id}/finalize")
+    assert response.status_code == 200, response.text
+    # Single-request uploads agree on the extension
+    token = uuid.uuid4().hex
+    response = client.post("/api/upload", files={"file": ("DATA.CSV", f"a,b\n1,{token}\n".encode())})
+    assert response.status_code == 200, response.text
+
+
+def test_chunks_are_parsed_off_the_event_loop(client, monkeypatch):
+    threads = []
+    feed = IncrementalCsvParser.feed
+
+    def recording_feed(self, offset, final=False):
+        try:
+            asyncio.get_running_loop()
+            threads.append("event loop")
+        except RuntimeError:
+            threads.append("worker")
+        return feed(self, offset, final)
+    monkeypatch.setattr(IncrementalCsvParser, "feed", recording_feed)
+    upload_id = send(client, sample_csv(), chunk=4000)
+    assert client.post(f"/api/uploads/{upload_id}/finalize").status_code == 200
+    assert threads and set(threads) == {"worker"}